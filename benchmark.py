@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+"""
+基準測試
+
+生成重度用戶規模的合成數據，測量監測器熱點路徑的耗時:
+  - ccusage blocks / daily 的表格和 JSON 輸出 (預設各 10,000 行) 的解析
+  - clean_ansi_codes、彙總索引和 create_bar_chart、畫面構建和渲染
+  - 合成的 ~/.claude/projects JSONL 記錄 (預設 100 MB) 的完整掃描、多進程彙總和增量刷新
+  - 使用假 ccusage 可執行檔和內建讀取器的完整監測周期
+
+所有數據生成在臨時目錄中，運行期間 HOME 指向該目錄，不會讀寫真實的
+對話記錄和快取。結果輸出為 JSON，可以用 --compare 比較兩個版本:
+
+  python3 benchmark.py --output before.json
+  python3 benchmark.py --output after.json
+  python3 benchmark.py --compare before.json after.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+
+RESULTS_VERSION = 1
+MODELS = ['claude-opus-4-20250514', 'claude-sonnet-4-20250514', 'claude-3-5-haiku-20241022']
+
+# ccusage 表格的顏色代碼，讓 clean_ansi_codes 有實際工作可做
+GREEN, YELLOW, GRAY, RESET = '\033[32m', '\033[33m', '\033[90m', '\033[39m'
+
+
+def log(*args):
+    """進度輸出到標準錯誤，標準輸出只留給 JSON 結果"""
+    print(*args, file=sys.stderr, flush=True)
+
+
+def measure(func, repeat=5, warmup=1):
+    """運行 func 多次，返回耗時統計 (毫秒)"""
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return {
+        'min_ms': min(times),
+        'median_ms': statistics.median(times),
+        'mean_ms': statistics.fmean(times),
+        'repeat': repeat
+    }
+
+
+def block_starts(rows, now):
+    """從現在往前每 6 小時一個區塊，最後一個是進行中的區塊"""
+    current = now.replace(minute=0, second=0, microsecond=0)
+    return [current - timedelta(hours=6 * (rows - 1 - i)) for i in range(rows)]
+
+
+def make_blocks_table(rows, now, seed=1):
+    rng = random.Random(seed)
+    lines = [
+        "╭──────────────────────────────────────────────────────╮",
+        "│          Claude Code Token Usage Report - Session Blocks          │",
+        "╰──────────────────────────────────────────────────────╯",
+        "┌─────────────────────┬──────────────────┬──────────────┬──────────────┬────────────┐",
+        "│ Block Start         │ Duration/Status  │ Models       │       Tokens │       Cost │",
+        "├─────────────────────┼──────────────────┼──────────────┼──────────────┼────────────┤",
+    ]
+    starts = block_starts(rows, now)
+    for index, start in enumerate(starts):
+        active = index == rows - 1
+        tokens = rng.randint(10_000, 90_000_000)
+        cost = tokens / 1_000_000 * rng.uniform(0.5, 8)
+        model = MODELS[index % len(MODELS)].split('-')[1] + '-4'
+        status = f"{GREEN}ACTIVE{RESET} (2h 10m elapsed, 2h 50m remaining)" if active else "5h 0m"
+        lines.append(f"│ {start.strftime('%Y/%m/%d %H:%M:%S')} │ {status} │ {GRAY}- {model}{RESET} │ "
+                     f"{tokens:>12,} │ {YELLOW}{f'${cost:.2f}':>10}{RESET} │")
+        if index % 10 == 5:
+            lines.append(f"│ {GRAY}(1h gap){RESET}            │ gap              │ -            │            - │          - │")
+    lines.append(f"│ {GRAY}PROJECTED{RESET}           │ 5h 0m            │              │  120,000,000 │ $   300.00 │")
+    lines.append("└─────────────────────┴──────────────────┴──────────────┴──────────────┴────────────┘")
+    return '\n'.join(lines) + '\n'
+
+
+def make_blocks_json(rows, now, seed=1, recent_days=None):
+    """recent_days 不為 None 時只保留最近幾天的區塊，與 ccusage blocks --recent 相同"""
+    rng = random.Random(seed)
+    blocks = []
+    cutoff = None if recent_days is None else now - timedelta(days=recent_days)
+    for index, start in enumerate(block_starts(rows, now)):
+        tokens = rng.randint(10_000, 90_000_000)
+        start_utc = start.astimezone(timezone.utc)
+        blocks.append({
+            'id': start_utc.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'startTime': start_utc.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'endTime': (start_utc + timedelta(hours=5)).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'isActive': index == rows - 1,
+            'isGap': False,
+            'entries': rng.randint(1, 500),
+            'tokenCounts': {
+                'inputTokens': tokens // 100,
+                'outputTokens': tokens // 50,
+                'cacheCreationInputTokens': tokens // 10,
+                'cacheReadInputTokens': tokens - tokens // 100 - tokens // 50 - tokens // 10
+            },
+            'totalTokens': tokens,
+            'costUSD': tokens / 1_000_000 * rng.uniform(0.5, 8),
+            'models': [MODELS[index % len(MODELS)]]
+        })
+        if cutoff is not None and start < cutoff:
+            blocks.pop()
+    return json.dumps({'blocks': blocks}, indent=2)
+
+
+def daily_dates(rows, now):
+    today = now.date()
+    return [today - timedelta(days=rows - 1 - i) for i in range(rows)]
+
+
+def make_daily_table(rows, now, seed=2):
+    rng = random.Random(seed)
+    lines = [
+        "┌──────────┬────────────────┬──────────┬──────────┬────────────┬────────────┬──────────────┬────────────┐",
+        "│ Date     │ Models         │    Input │   Output │ Cache Cre… │ Cache Read │ Total Tokens │ Cost (USD) │",
+        "├──────────┼────────────────┼──────────┼──────────┼────────────┼────────────┼──────────────┼────────────┤",
+    ]
+    for day in daily_dates(rows, now):
+        tokens = rng.randint(100_000, 200_000_000)
+        cost = tokens / 1_000_000 * rng.uniform(0.5, 8)
+        lines.append(f"│ {day.year} {day.strftime('%m-%d')} │ {GRAY}- opus-4{RESET}       │ {tokens // 100:>8,} │ "
+                     f"{tokens // 50:>8,} │ {tokens // 10:>10,} │ {tokens // 2:>10,} │ {tokens:>12,} │ "
+                     f"{YELLOW}{f'${cost:.2f}':>10}{RESET} │")
+        # 同一天的第二個模型只佔一行，沒有日期
+        lines.append(f"│            │ {GRAY}- sonnet-4{RESET}     │          │          │"
+                     f"            │            │              │            │")
+    lines.append("├──────────┼────────────────┼──────────┼──────────┼────────────┼────────────┼──────────────┼────────────┤")
+    lines.append("│ Total    │                │          │          │            │            │              │ $99999.99  │")
+    lines.append("└──────────┴────────────────┴──────────┴──────────┴────────────┴────────────┴──────────────┴────────────┘")
+    return '\n'.join(lines) + '\n'
+
+
+def make_daily_json(rows, now, seed=2):
+    rng = random.Random(seed)
+    daily = []
+    for day in daily_dates(rows, now):
+        tokens = rng.randint(100_000, 200_000_000)
+        daily.append({
+            'date': day.isoformat(),
+            'inputTokens': tokens // 100,
+            'outputTokens': tokens // 50,
+            'cacheCreationTokens': tokens // 10,
+            'cacheReadTokens': tokens - tokens // 100 - tokens // 50 - tokens // 10,
+            'totalTokens': tokens,
+            'totalCost': tokens / 1_000_000 * rng.uniform(0.5, 8),
+            'modelsUsed': MODELS[:2]
+        })
+    return json.dumps({'daily': daily, 'totals': {}}, indent=2)
+
+
+def make_corpus(projects_dir, size_mb, now, days=90, projects=20, seed=3):
+    """生成約 size_mb 的 JSONL 對話記錄，返回 (檔案數, 總字節數, 用量記錄數)"""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    text = 'x' * 600
+    files = []
+    for project in range(projects):
+        directory = os.path.join(projects_dir, f"-Users-bench-project-{project}")
+        os.makedirs(directory, exist_ok=True)
+        for session in range(5):
+            files.append(open(os.path.join(directory, f"session-{session:04d}.jsonl"), 'w'))
+
+    written = 0
+    records = 0
+    span = days * 86400
+    start = now.astimezone(timezone.utc) - timedelta(seconds=span)
+    try:
+        while written < target:
+            # 時間戳按順序遞增，最後的記錄落在當前小時內
+            offset = span * written / target
+            timestamp = (start + timedelta(seconds=offset)).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+            handle = files[rng.randrange(len(files))]
+            user = json.dumps({
+                'type': 'user', 'timestamp': timestamp, 'sessionId': 'bench',
+                'message': {'role': 'user', 'content': text[:rng.randint(50, 600)]}
+            })
+            assistant = json.dumps({
+                'type': 'assistant', 'timestamp': timestamp, 'requestId': f"req_{records}",
+                'message': {
+                    'id': f"msg_{records}", 'model': MODELS[records % len(MODELS)], 'role': 'assistant',
+                    'content': [{'type': 'text', 'text': text[:rng.randint(100, 600)]}],
+                    'usage': {
+                        'input_tokens': rng.randint(1, 5000),
+                        'output_tokens': rng.randint(1, 8000),
+                        'cache_creation_input_tokens': rng.randint(0, 20000),
+                        'cache_read_input_tokens': rng.randint(0, 200000)
+                    }
+                }
+            })
+            chunk = f"{user}\n{assistant}\n"
+            if records % 4 == 0:
+                # 工具結果和貼上的內容: 很長但沒有用量欄位
+                tool_result = json.dumps({
+                    'type': 'user', 'timestamp': timestamp, 'sessionId': 'bench',
+                    'message': {'role': 'user', 'content': [{
+                        'type': 'tool_result', 'tool_use_id': f"toolu_{records}",
+                        'content': text * rng.randint(4, 60)
+                    }]}
+                })
+                chunk += f"{tool_result}\n"
+            if records % 20 == 0:
+                # Claude Code 會重複寫入同一個回覆，需要去重
+                chunk += f"{assistant}\n"
+            handle.write(chunk)
+            written += len(chunk)
+            records += 1
+    finally:
+        for handle in files:
+            handle.close()
+    return len(files), written, records
+
+
+FAKE_CCUSAGE = '''#!{python}
+import sys
+data = {data!r}
+if '--version' in sys.argv:
+    print('ccusage 0.0.0-bench')
+    sys.exit(0)
+kind = 'blocks' if 'blocks' in sys.argv else 'daily'
+suffix = '.json' if '--json' in sys.argv else '.txt'
+if '--recent' in sys.argv:
+    suffix = '.recent' + suffix
+with open(data + '/' + kind + suffix, encoding='utf-8') as f:
+    sys.stdout.write(f.read())
+'''
+
+
+def write_fake_ccusage(directory, outputs):
+    """寫入一個輸出預先生成數據的假 ccusage 可執行檔"""
+    for name, text in outputs.items():
+        with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+            f.write(text)
+    path = os.path.join(directory, 'ccusage')
+    with open(path, 'w') as f:
+        f.write(FAKE_CCUSAGE.format(python=sys.executable, data=directory))
+    os.chmod(path, 0o755)
+    return path
+
+
+def git_revision():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                timeout=5, cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def run_benchmarks(rows, corpus_mb, repeat, workdir):
+    """生成數據並運行所有基準測試，返回結果字典"""
+    # 所有路徑 (對話記錄、快取、檢查點) 都指向臨時目錄
+    os.environ['HOME'] = workdir
+    os.environ['XDG_CACHE_HOME'] = os.path.join(workdir, '.cache')
+    os.environ.pop('CLAUDE_CONFIG_DIR', None)
+
+    from claude_monitor import NetworkMonitor
+    from ccusage_client import CcusageLauncher, parse_blocks_json, parse_current_block, parse_daily_json
+    from renderer import FrameRenderer
+    from usage_reader import UsageReader, backfill, PARALLEL_MIN_BYTES, USAGE_MARKER
+    import pricing
+    from checkpoint import CheckpointStore
+
+    now = datetime.now().astimezone()
+    results = {}
+
+    def record(name, stats, **extra):
+        stats.update(extra)
+        results[name] = stats
+        detail = ''.join(f"  {key}={value}" for key, value in extra.items())
+        log(f"  {name:<26} median {stats['median_ms']:>10.3f}ms  min {stats['min_ms']:>10.3f}ms{detail}")
+
+    log(f"🧪 生成 {rows:,} 行 ccusage 輸出...")
+    outputs = {
+        'blocks.txt': make_blocks_table(rows, now),
+        'blocks.json': make_blocks_json(rows, now),
+        'blocks.recent.json': make_blocks_json(rows, now, recent_days=3),
+        'daily.txt': make_daily_table(rows, now),
+        'daily.json': make_daily_json(rows, now),
+    }
+
+    monitor = NetworkMonitor()
+    monitor.checkpoint = None
+
+    log("⏱️  解析")
+    record('blocks_table_parse', measure(lambda: monitor.parse_blocks_table(outputs['blocks.txt']), repeat), rows=rows)
+    record('blocks_json_parse', measure(lambda: parse_blocks_json(outputs['blocks.json']), repeat), rows=rows)
+    record('blocks_json_current', measure(lambda: parse_current_block(outputs['blocks.json']), repeat), rows=rows)
+    recent_rows = outputs['blocks.recent.json'].count('"isActive"')
+    record('blocks_json_recent', measure(lambda: parse_current_block(outputs['blocks.recent.json']), repeat),
+           rows=recent_rows)
+    record('daily_table_parse', measure(lambda: monitor.parse_daily_table(outputs['daily.txt']), repeat), rows=rows)
+    record('daily_json_parse', measure(lambda: parse_daily_json(outputs['daily.json']), repeat), rows=rows)
+    table_lines = outputs['blocks.txt'].split('\n')
+    record('clean_ansi_codes', measure(lambda: [monitor.clean_ansi_codes(line) for line in table_lines], repeat),
+           calls=len(table_lines))
+
+    log("⏱️  顯示")
+    # 用完整日期作為鍵，讓圖表需要排序全部 rows 天
+    daily_costs = {item.date.strftime('%Y-%m-%d'): item.cost for item in parse_daily_json(outputs['daily.json'])}
+    monitor.daily_costs = daily_costs
+    monitor.total_cost = sum(daily_costs.values())
+    monitor.session_count = rows
+    record('rollup_build', measure(lambda: (setattr(monitor, 'rollup_source', None), monitor.update_rollup()),
+                                   repeat), days=len(daily_costs))
+    record('create_bar_chart', measure(monitor.create_bar_chart, repeat), days=len(daily_costs))
+    record('create_bar_chart_365d', measure(lambda: monitor.create_bar_chart('365d'), repeat))
+
+    monitor.renderer = FrameRenderer(stream=io.StringIO(), budget_ms=1.0)
+    frame_args = (True, "良好", "12.3ms")
+    record('build_frame', measure(lambda: monitor.build_frame(*frame_args, now.strftime("%Y-%m-%d %H:%M:%S")), repeat))
+
+    def render_full():
+        monitor.renderer.reset()
+        monitor.display_status(*frame_args, datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
+
+    def render_diff():
+        monitor.display_status(*frame_args, datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
+
+    record('display_status_full', measure(render_full, repeat))
+    record('display_status_diff', measure(render_diff, repeat))
+
+    log(f"🧪 生成約 {corpus_mb} MB 的 JSONL 對話記錄...")
+    projects_dir = os.path.join(workdir, '.claude', 'projects')
+    started = time.perf_counter()
+    file_count, size, usage_records = make_corpus(projects_dir, corpus_mb, now)
+    log(f"   {file_count} 個檔案，{size / 1024 / 1024:.1f} MB，{usage_records:,} 條用量記錄 "
+          f"({time.perf_counter() - started:.1f}秒)")
+    # 包含 "usage" 的行需要解碼，其餘的行只做位元組搜索
+    decoded_bytes = 0
+    for path in UsageReader([projects_dir]).find_files():
+        with open(path, 'rb') as f:
+            decoded_bytes += sum(len(line) for line in f if USAGE_MARKER in line)
+
+    log("⏱️  對話記錄")
+    reader = UsageReader([projects_dir])
+
+    def cold_scan():
+        reader.reset()
+        reader.refresh()
+
+    cold = measure(cold_scan, repeat=max(1, repeat // 2), warmup=0)
+    record('corpus_scan_cold', cold, mb=round(size / 1024 / 1024, 1),
+           mb_per_s=round(size / 1024 / 1024 / (cold['median_ms'] / 1000), 1), records=reader.record_count)
+    def json_loads_scan():
+        # 對照: 逐行讀取並對每一行調用 json.loads 的普通做法
+        naive = UsageReader([projects_dir])
+        for path in naive.find_files():
+            with open(path, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    naive.add_entry(entry)
+
+    baseline = measure(json_loads_scan, repeat=max(1, repeat // 2), warmup=0)
+    record('corpus_scan_json_loads', baseline,
+           speedup=round(baseline['median_ms'] / cold['median_ms'], 2),
+           skipped_share=round(1 - decoded_bytes / size, 2))
+    # 進程數為 1、2 和 CPU 核心數時的彙總時間；speedup 相對單線程讀取，
+    # 只有進程數不超過核心數且記錄超過 PARALLEL_MIN_BYTES 時才會並行
+    cores = os.cpu_count() or 1
+    for workers in sorted({1, 2, cores}):
+        parallel = measure(lambda: backfill(UsageReader([projects_dir]), workers),
+                           repeat=max(1, repeat // 2), warmup=0)
+        record('corpus_backfill' if workers == cores else f'corpus_backfill_{workers}w', parallel,
+               workers=workers, cores=cores, parallel=workers > 1 and size >= PARALLEL_MIN_BYTES,
+               speedup=round(cold['median_ms'] / parallel['median_ms'], 2))
+    record('corpus_refresh_warm', measure(reader.refresh, repeat))
+    record('recompute_costs', measure(reader.recompute_costs, repeat),
+           buckets=sum(len(bucket['models']) for bucket in reader.hourly.values()),
+           engine='numpy' if pricing.numpy is not None else 'python')
+    record('burn_rate_rebuild', measure(reader.rebuild_burn_rate, repeat))
+    record('corpus_summary', measure(lambda: (reader.get_session_summary(), reader.get_daily_costs(),
+                                              reader.get_blocks()), repeat))
+
+    store = CheckpointStore(os.path.join(workdir, 'checkpoint.sqlite3'))
+
+    def save_full():
+        reader.rebuilt = True
+        store.save(reader)
+
+    record('checkpoint_save_full', measure(save_full, max(1, repeat // 2), warmup=0))
+    record('checkpoint_load', measure(lambda: store.load(UsageReader([projects_dir])), max(1, repeat // 2), warmup=0))
+    store.close()
+
+    log("⏱️  完整監測周期 (不含網絡探測)")
+    fake_dir = os.path.join(workdir, 'fake-ccusage')
+    os.makedirs(fake_dir, exist_ok=True)
+    fake_path = write_fake_ccusage(fake_dir, outputs)
+
+    def tick(monitor):
+        async def once():
+            await monitor.get_ccusage_info()
+            await monitor.analyze_daily_costs()
+            monitor.display_status(*frame_args, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        asyncio.run(once())
+
+    ccusage_monitor = NetworkMonitor()
+    ccusage_monitor.checkpoint = None
+    ccusage_monitor.use_native_reader = False
+    ccusage_monitor.renderer = FrameRenderer(stream=io.StringIO())
+    # 不使用快照: 每個周期都實際運行一次假 ccusage
+    ccusage_monitor.ccusage = CcusageLauncher(os.path.join(workdir, 'ccusage.json'), cache_ttl=0)
+    ccusage_monitor.ccusage.snapshots.max_stale = 0
+    ccusage_monitor.ccusage.path = fake_path
+    record('monitor_tick_ccusage_json', measure(lambda: tick(ccusage_monitor), repeat))
+    ccusage_monitor.use_json_output = False
+    record('monitor_tick_ccusage_table', measure(lambda: tick(ccusage_monitor), repeat))
+
+    native_monitor = NetworkMonitor()
+    native_monitor.checkpoint = None
+    native_monitor.usage_reader = reader
+    native_monitor.renderer = FrameRenderer(stream=io.StringIO())
+    record('monitor_tick_native', measure(lambda: tick(native_monitor), repeat))
+
+    return results
+
+
+def compare(before_path, after_path, threshold=0.1):
+    """比較兩個結果檔案，中位數變慢超過 threshold 的項目標記為退步，返回退步數量"""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"📊 {before.get('revision') or before_path} → {after.get('revision') or after_path}")
+    regressions = 0
+    for name, new in after['results'].items():
+        old = before['results'].get(name)
+        if old is None:
+            print(f"  {name:<26} {new['median_ms']:>10.3f}ms  (新增)")
+            continue
+        ratio = new['median_ms'] / old['median_ms'] if old['median_ms'] else float('inf')
+        if ratio > 1 + threshold:
+            marker = "🔴"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            marker = "🟢"
+        else:
+            marker = "  "
+        print(f"{marker}{name:<26} {old['median_ms']:>10.3f}ms → {new['median_ms']:>10.3f}ms  ({ratio:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Claude Code 監測器基準測試")
+    parser.add_argument('--rows', type=int, default=10_000, help="ccusage 輸出的行數 (預設 10000)")
+    parser.add_argument('--corpus-mb', type=float, default=100, help="JSONL 對話記錄的大小 (預設 100 MB)")
+    parser.add_argument('--repeat', type=int, default=5, help="每項測試的重複次數")
+    parser.add_argument('--quick', action='store_true', help="小規模快速運行 (1000 行，5 MB)")
+    parser.add_argument('--output', metavar='FILE', help="把結果寫入 JSON 檔案 (預設輸出到標準輸出)")
+    parser.add_argument('--keep', action='store_true', help="保留生成的數據目錄")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="比較兩個結果檔案")
+    parser.add_argument('--threshold', type=float, default=0.1, help="比較時視為退步的變慢比例 (預設 0.1)")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) else 0)
+
+    if args.quick:
+        args.rows, args.corpus_mb = 1000, 5
+    workdir = tempfile.mkdtemp(prefix='claude-monitor-bench-')
+    home = os.environ.get('HOME')
+    try:
+        results = run_benchmarks(args.rows, args.corpus_mb, args.repeat, workdir)
+    finally:
+        if home is not None:
+            os.environ['HOME'] = home
+        if args.keep:
+            log(f"📁 數據保留在 {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'version': RESULTS_VERSION,
+        'revision': git_revision(),
+        'time': datetime.now().astimezone().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {'rows': args.rows, 'corpus_mb': args.corpus_mb, 'repeat': args.repeat},
+        'results': results
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        log(f"💾 結果已寫入 {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
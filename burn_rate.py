@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+對話區塊的消耗速度和預測
+
+每筆用量到達時用指數衰減更新 Token / 分鐘和美元 / 小時的估計，更新只需
+O(1)，不保存也不重新掃描歷史記錄。對不規則到達的用量，時間 t 的速度為
+
+    rate(t) = Σ x_i · exp(-(t - t_i) / τ) / τ
+
+新用量到達時把舊值按經過的時間衰減再加上 x / τ 即可；用量穩定時結果等於
+實際速度，停止使用後速度隨時間自然下降。τ 為時間常數，預設 10 分鐘。
+
+預測: 區塊結束時的用量 = 已用量 + 速度 × 剩餘時間；設置了預算時，按當前
+速度估計用完預算的時間，在區塊結束前不會用完時為 None。
+"""
+import math
+
+
+DEFAULT_TAU = 600
+# 從小時桶重建時只使用最近 τ 的這個倍數以內的用量，更早的權重可以忽略
+REBUILD_HORIZON = 8
+
+
+class BurnRate:
+    def __init__(self, tau=DEFAULT_TAU):
+        self.tau = tau
+        self.reset()
+
+    @property
+    def horizon(self):
+        return self.tau * REBUILD_HORIZON
+
+    def reset(self):
+        self.time = None        # 最近一筆用量的時間 (epoch 秒)
+        self.tokens = 0.0       # self.time 時的 Token / 秒
+        self.cost = 0.0         # self.time 時的美元 / 秒
+
+    def add(self, timestamp, tokens, cost):
+        """加入一筆用量"""
+        if self.time is None:
+            self.time = timestamp
+        if timestamp >= self.time:
+            decay = math.exp((self.time - timestamp) / self.tau)
+            self.tokens = self.tokens * decay + tokens / self.tau
+            self.cost = self.cost * decay + cost / self.tau
+            self.time = timestamp
+        else:
+            # 較早的用量 (多個檔案交錯讀取時)，按到 self.time 為止的衰減加入
+            weight = math.exp((timestamp - self.time) / self.tau) / self.tau
+            self.tokens += tokens * weight
+            self.cost += cost * weight
+
+    def add_span(self, start, end, tokens, cost):
+        """加入在 start 到 end 之間均勻分佈的用量 (例如一個小時桶)"""
+        length = end - start
+        if length <= 0:
+            self.add(end, tokens, cost)
+            return
+        # 均勻分佈的用量在 end 時的權重，等於在 end 時加入 factor 倍的用量
+        factor = self.tau * -math.expm1(-length / self.tau) / length
+        self.add(end, tokens * factor, cost * factor)
+
+    def rates(self, now):
+        """返回 now 時的 (Token / 秒, 美元 / 秒)"""
+        if self.time is None:
+            return 0.0, 0.0
+        decay = math.exp(min(0.0, self.time - now) / self.tau)
+        return self.tokens * decay, self.cost * decay
+
+    def project(self, tokens, cost, end, now, cost_budget=None, token_budget=None):
+        """根據區塊的已用量 (tokens, cost) 和結束時間 end 預測區塊結束時的用量和用完預算的時間"""
+        token_rate, cost_rate = self.rates(now)
+        remaining = max(0.0, end - now)
+        budgets = []
+        for kind, limit, used, rate in (('cost', cost_budget, cost, cost_rate),
+                                        ('tokens', token_budget, tokens, token_rate)):
+            if not limit:
+                continue
+            if used >= limit:
+                hit_time = now
+            elif rate > 0 and (limit - used) / rate <= remaining:
+                hit_time = now + (limit - used) / rate
+            else:
+                hit_time = None
+            budgets.append({'kind': kind, 'limit': limit, 'used': used,
+                            'exceeded': used >= limit, 'hit_time': hit_time})
+        return {
+            'tokens_per_minute': token_rate * 60,
+            'cost_per_hour': cost_rate * 3600,
+            'projected_tokens': int(tokens + token_rate * remaining),
+            'projected_cost': cost + cost_rate * remaining,
+            'end': end,
+            'budgets': budgets
+        }
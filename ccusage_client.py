@@ -0,0 +1,585 @@
+#!/usr/bin/env python3
+"""
+ccusage 客戶端
+
+只解析一次已安裝的 ccusage 可執行檔並固定其版本，解析結果保存在快取
+目錄中供下次啟動使用。之後直接執行該檔案，不再每次通過
+`npx --yes ccusage@latest` 向 npm registry 查詢最新版本。
+只有在明確要求或到達定期檢查時間時才更新版本。
+
+ccusage 的 --json 輸出會被逐個元素解析成帶類型的記錄，
+取代按 `│` 切割表格的做法。監測器每次只需要當前的區塊: 用
+`blocks --json --recent` 只取得最近 3 天的區塊，parse_current_block()
+逐個解碼，遇到進行中的區塊即停止。
+
+同一命令的結果保存在帶 TTL 的快照快取中，過期後先返回舊快照並在
+後台刷新；同時請求同一命令的調用者共用一個正在運行的子進程。
+
+監測器中的調用都通過 asyncio 子進程進行: 每個子進程在自己的進程組中
+運行，超時或被取消時結束整個進程組，npx 啟動的 node 不會被遺留。
+"""
+import asyncio
+import glob
+import json
+import os
+import re
+import shutil
+import signal
+import subprocess
+import time
+from collections import namedtuple
+from datetime import date, datetime
+
+from checkpoint import user_cache_dir
+
+
+# 定期檢查 ccusage 新版本的間隔 (秒)
+UPDATE_CHECK_INTERVAL = 24 * 3600
+
+# 找不到 ccusage 時重新解析的等待時間 (秒): 每次失敗加倍，直到上限
+RESOLVE_RETRY_INTERVAL = 60
+RESOLVE_RETRY_MAX = 3600
+
+# 舊版 ccusage 拒絕 --json 時的錯誤訊息
+UNKNOWN_OPTION = re.compile(r'unknown (?:option|flag|argument)|unrecognized|unexpected argument', re.IGNORECASE)
+
+# ccusage --json 輸出解析後的記錄: Token 為 int，費用為 float，時間為 datetime (本地時區)
+BlockRecord = namedtuple('BlockRecord', 'start end is_active is_gap tokens cost models')
+DailyRecord = namedtuple('DailyRecord', 'date tokens cost models')
+
+
+def node_env():
+    """設置環境變量，確保 node 可以正常運行"""
+    env = os.environ.copy()
+    env['PATH'] = f"/usr/local/bin:/usr/bin:/bin:/usr/sbin:/sbin:/opt/homebrew/bin:{env.get('PATH', '')}"
+    return env
+
+
+def is_executable(path):
+    return bool(path) and os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def find_npx_path():
+    """尋找 npx 命令的完整路徑"""
+    path = shutil.which('npx', path=node_env()['PATH'])
+    if path:
+        return path
+
+    # 嘗試常見的 npx 位置
+    possible_paths = [
+        os.path.expanduser('~/.nvm/versions/node/*/bin/npx'),
+        os.path.expanduser('~/n/*/bin/npx'),
+    ]
+    for pattern in possible_paths:
+        for match in sorted(glob.glob(pattern), reverse=True):
+            if is_executable(match):
+                return match
+    return None
+
+
+def find_ccusage_binaries():
+    """列出所有已安裝的 ccusage 可執行檔，全局安裝優先，其次是 npx 快取"""
+    candidates = []
+    path = shutil.which('ccusage', path=node_env()['PATH'])
+    if path:
+        candidates.append(path)
+
+    patterns = [
+        os.path.expanduser('~/.npm-global/bin/ccusage'),
+        os.path.expanduser('~/.nvm/versions/node/*/bin/ccusage'),
+        os.path.expanduser('~/.bun/bin/ccusage'),
+        os.path.expanduser('~/.npm/_npx/*/node_modules/.bin/ccusage'),
+    ]
+    for pattern in patterns:
+        # npx 快取中可能有多個版本，最近安裝的優先
+        matches = sorted(glob.glob(pattern), key=lambda p: os.path.getmtime(p), reverse=True)
+        candidates.extend(m for m in matches if m not in candidates)
+    return [c for c in candidates if is_executable(c)]
+
+
+async def kill_process_group(proc, grace=1.0):
+    """結束子進程所在的整個進程組，先 SIGTERM，寬限期後 SIGKILL"""
+    def send(sig):
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(proc.pid, sig)
+            elif proc.returncode is None:
+                proc.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    send(getattr(signal, 'SIGTERM', None))
+    try:
+        await asyncio.wait_for(proc.wait(), grace)
+    except asyncio.TimeoutError:
+        send(getattr(signal, 'SIGKILL', None))
+        await proc.wait()
+
+
+async def run_process(cmd, timeout=None):
+    """在新的進程組中運行命令並收集輸出，返回 subprocess.CompletedProcess
+
+    超時時結束進程組並拋出 subprocess.TimeoutExpired；任務被取消時同樣
+    先結束進程組再把取消傳遞下去。
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        env=node_env(), start_new_session=True)
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        await kill_process_group(proc)
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    except asyncio.CancelledError:
+        await kill_process_group(proc)
+        raise
+    return subprocess.CompletedProcess(cmd, proc.returncode,
+                                       stdout.decode('utf-8', 'replace'), stderr.decode('utf-8', 'replace'))
+
+
+class SnapshotCache:
+    """按命令參數快取結果，支持 stale-while-revalidate 和 single-flight
+
+    在事件循環中使用: loader 是協程函數，刷新以任務形式運行。
+    """
+
+    def __init__(self, ttl=10, max_stale=None):
+        self.ttl = ttl                  # 快照在這段時間內視為最新 (秒)
+        self.max_stale = max_stale      # 超過這個時間的舊快照不再使用，None 表示一直可用
+        self.entries = {}               # key -> (value, 獲取時間)
+        self.inflight = {}              # key -> 正在運行的刷新任務
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    async def get(self, key, loader, is_valid=None):
+        """返回 key 的快照；loader 負責實際獲取，is_valid 決定結果是否可以快取"""
+        entry = self.entries.get(key)
+        age = time.time() - entry[1] if entry else None
+        if entry and age < self.ttl:
+            self.hits += 1
+            return entry[0]
+        if entry and (self.max_stale is None or age < self.max_stale):
+            # 先返回舊快照，同時在後台刷新
+            self.stale_hits += 1
+            if key not in self.inflight:
+                self.start_flight(key, loader, is_valid)
+            return entry[0]
+
+        self.misses += 1
+        flight = self.inflight.get(key) or self.start_flight(key, loader, is_valid)
+        # 某個等待者被取消 (例如探測超時) 時不影響其他等待者共用的刷新
+        return await asyncio.shield(flight)
+
+    def start_flight(self, key, loader, is_valid):
+        flight = asyncio.ensure_future(self.load(key, loader, is_valid))
+        # 後台刷新的錯誤沒有人等待，在這裡取出以免事件循環報告未處理的異常
+        flight.add_done_callback(lambda task: task.cancelled() or task.exception())
+        self.inflight[key] = flight
+        return flight
+
+    async def load(self, key, loader, is_valid):
+        """運行 loader，把結果交給所有等待的調用者"""
+        try:
+            value = await loader()
+            if is_valid is None or is_valid(value):
+                self.entries[key] = (value, time.time())
+            return value
+        finally:
+            self.inflight.pop(key, None)
+
+    async def close(self):
+        """取消所有正在運行的刷新"""
+        flights = list(self.inflight.values())
+        for flight in flights:
+            flight.cancel()
+        await asyncio.gather(*flights, return_exceptions=True)
+
+    def invalidate(self, key=None):
+        if key is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
+
+
+class CcusageLauncher:
+    def __init__(self, cache_path=None, cache_ttl=10):
+        self.cache_path = cache_path or os.path.join(user_cache_dir(), 'ccusage.json')
+        self.path = None            # 固定使用的 ccusage 可執行檔
+        self.version = None         # 固定的版本號
+        self.npx_path = None        # 找不到可執行檔時使用 npx 運行固定版本
+        self.last_update_check = 0
+        self.used = False
+        self.resolve_failures = 0       # 連續解析失敗的次數
+        self.retry_resolve_at = 0.0     # 失敗後下次重新解析的時間 (monotonic)
+        self.resolving = None           # 正在進行的非同步解析任務
+        # 每次調用的耗時統計 (秒)
+        self.call_count = 0
+        self.total_time = 0.0
+        self.last_duration = None
+        self.startup_overhead = None
+        self.snapshots = SnapshotCache(ttl=cache_ttl)
+        self.load_cache()
+
+    def load_cache(self):
+        """讀取上次保存的解析結果"""
+        try:
+            with open(self.cache_path) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return
+        if is_executable(cache.get('path')):
+            self.path = cache['path']
+        if is_executable(cache.get('npx_path')):
+            self.npx_path = cache['npx_path']
+        self.version = cache.get('version')
+        self.last_update_check = cache.get('last_update_check', 0)
+
+    def save_cache(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(self.cache_path, 'w') as f:
+                json.dump({
+                    'path': self.path,
+                    'npx_path': self.npx_path,
+                    'version': self.version,
+                    'last_update_check': self.last_update_check
+                }, f)
+        except OSError:
+            pass
+
+    def is_resolved(self):
+        return bool(self.path or (self.npx_path and self.version))
+
+    def resolve(self, force=False):
+        """解析 ccusage 可執行檔，返回命令前綴；找不到時返回 None
+
+        首次解析可能需要通過 npx 安裝，會阻塞最多 120 秒，只在事件循環
+        之外使用；事件循環中使用 resolve_async()。
+        """
+        if not force and self.is_resolved():
+            return self.command_prefix()
+        if not force and time.monotonic() < self.retry_resolve_at:
+            return None
+
+        binaries = find_ccusage_binaries()
+        if binaries:
+            self.path = binaries[0]
+            self.version = self.read_version([self.path])
+            return self.finish_resolve()
+
+        # 沒有已安裝的 ccusage: 通過 npx 安裝一次，記下版本後固定使用
+        self.path = None
+        self.npx_path = find_npx_path()
+        if self.npx_path:
+            self.version = self.read_version([self.npx_path, '--yes', 'ccusage@latest'], timeout=120)
+            self.last_update_check = time.time()
+            binaries = find_ccusage_binaries()
+            if binaries:
+                self.path = binaries[0]
+        return self.finish_resolve()
+
+    async def resolve_async(self, force=False):
+        """resolve() 的非同步版本，同時調用的協程共用一次解析"""
+        if not force and self.is_resolved():
+            return self.command_prefix()
+        if not force and time.monotonic() < self.retry_resolve_at:
+            return None
+        if self.resolving is None:
+            self.resolving = asyncio.ensure_future(self.resolve_once())
+            self.resolving.add_done_callback(lambda task: setattr(self, 'resolving', None))
+        # 某個調用者被取消 (例如探測超時) 時解析繼續進行
+        return await asyncio.shield(self.resolving)
+
+    async def resolve_once(self):
+        binaries = find_ccusage_binaries()
+        if binaries:
+            self.path = binaries[0]
+            self.version = await self.read_version_async([self.path])
+            return self.finish_resolve()
+
+        self.path = None
+        self.npx_path = find_npx_path()
+        if self.npx_path:
+            self.version = await self.read_version_async([self.npx_path, '--yes', 'ccusage@latest'], timeout=120)
+            self.last_update_check = time.time()
+            binaries = find_ccusage_binaries()
+            if binaries:
+                self.path = binaries[0]
+        return self.finish_resolve()
+
+    def finish_resolve(self):
+        """保存解析結果並返回命令前綴；失敗時記住結果，等待退避時間後才重試"""
+        if self.path or self.version:
+            self.resolve_failures = 0
+            self.retry_resolve_at = 0.0
+            self.save_cache()
+            return self.command_prefix()
+        if self.npx_path:
+            self.save_cache()
+        self.resolve_failures += 1
+        delay = min(RESOLVE_RETRY_MAX, RESOLVE_RETRY_INTERVAL * 2 ** (self.resolve_failures - 1))
+        self.retry_resolve_at = time.monotonic() + delay
+        return None
+
+    def command_prefix(self):
+        if self.path:
+            return [self.path]
+        return [self.npx_path, '--yes', '--prefer-offline', f"ccusage@{self.version}"]
+
+    def read_version(self, prefix, timeout=30):
+        """執行 --version 並返回版本號"""
+        try:
+            result = subprocess.run(prefix + ['--version'], capture_output=True, text=True,
+                                    timeout=timeout, env=node_env())
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        if result.returncode != 0:
+            return None
+        return result.stdout.strip().split()[-1] if result.stdout.strip() else None
+
+    def run(self, args, timeout=60):
+        """直接運行固定的 ccusage，找不到 ccusage 時返回 None"""
+        prefix = self.resolve()
+        if not prefix:
+            return None
+        self.used = True
+        started = time.perf_counter()
+        try:
+            return subprocess.run(prefix + args, capture_output=True, text=True,
+                                  timeout=timeout, env=node_env())
+        finally:
+            self.last_duration = time.perf_counter() - started
+            self.call_count += 1
+            self.total_time += self.last_duration
+
+    async def run_async(self, args, timeout=60):
+        """在事件循環中運行固定的 ccusage，找不到 ccusage 時返回 None"""
+        prefix = await self.resolve_async()
+        if not prefix:
+            return None
+        self.used = True
+        started = time.perf_counter()
+        try:
+            return await run_process(prefix + args, timeout)
+        finally:
+            self.last_duration = time.perf_counter() - started
+            self.call_count += 1
+            self.total_time += self.last_duration
+
+    async def run_cached(self, args, timeout=60):
+        """通過快照快取運行 ccusage，只快取成功的結果"""
+        return await self.snapshots.get(
+            tuple(args),
+            lambda: self.run_async(args, timeout),
+            lambda result: result is not None and result.returncode == 0)
+
+    async def read_version_async(self, prefix, timeout=30):
+        """在事件循環中執行 --version 並返回版本號"""
+        try:
+            result = await run_process(prefix + ['--version'], timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        if result.returncode != 0:
+            return None
+        return result.stdout.strip().split()[-1] if result.stdout.strip() else None
+
+    async def update(self):
+        """更新 ccusage 到最新版本並重新固定，返回新版本號；失敗時返回 None"""
+        npx_path = self.npx_path or find_npx_path()
+        if not npx_path:
+            return None
+        self.npx_path = npx_path
+        self.last_update_check = time.time()
+        version = await self.read_version_async([npx_path, '--yes', 'ccusage@latest'], timeout=120)
+        if not version:
+            self.save_cache()
+            return None
+
+        if version != self.version:
+            self.snapshots.invalidate()
+            # 優先使用剛安裝到 npx 快取中的新版本
+            self.path = None
+            self.version = version
+            for binary in find_ccusage_binaries():
+                if await self.read_version_async([binary]) == version:
+                    self.path = binary
+                    break
+        self.save_cache()
+        return version
+
+    async def maybe_update(self):
+        """定期檢查新版本；只有實際使用過 ccusage 時才檢查"""
+        if not self.used or time.time() - self.last_update_check < UPDATE_CHECK_INTERVAL:
+            return None
+        return await self.update()
+
+    def measure_startup(self, samples=3):
+        """測量每次調用 ccusage 的啟動開銷 (毫秒)，取中位數"""
+        prefix = self.resolve()
+        if not prefix:
+            return None
+        durations = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            try:
+                subprocess.run(prefix + ['--version'], capture_output=True, timeout=30, env=node_env())
+            except (OSError, subprocess.TimeoutExpired):
+                return None
+            durations.append((time.perf_counter() - started) * 1000)
+        durations.sort()
+        self.startup_overhead = durations[len(durations) // 2]
+        return self.startup_overhead
+
+    def average_call_time(self):
+        """平均每次調用耗時 (毫秒)"""
+        if not self.call_count:
+            return None
+        return self.total_time / self.call_count * 1000
+
+
+def iter_json_array(text, key):
+    """逐個解析 JSON 頂層物件中 key 對應陣列的元素，不必先建立整個陣列
+
+    輸出不是 JSON 或不完整時拋出 ValueError。
+    """
+    decoder = json.JSONDecoder()
+    start = text.find('{')
+    if start < 0 or text[:start].strip():
+        raise ValueError('not a JSON object')
+    index = text.find(f'"{key}"', start)
+    if index < 0:
+        return
+    index = text.index('[', index) + 1
+    length = len(text)
+    while True:
+        while index < length and text[index] in ' \t\r\n,':
+            index += 1
+        if index >= length:
+            raise ValueError('unterminated array')
+        if text[index] == ']':
+            return
+        item, index = decoder.raw_decode(text, index)
+        yield item
+
+
+def parse_datetime(value):
+    """解析 ISO 8601 時間並轉為本地時間 (不帶時區)"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone().replace(tzinfo=None)
+
+
+def token_total(item, counts_key, keys):
+    total = item.get('totalTokens')
+    if total is not None:
+        return int(total)
+    counts = item.get(counts_key) or item
+    return sum(int(counts.get(k) or 0) for k in keys)
+
+
+def block_record(item):
+    """把 ccusage blocks --json 的一個元素轉為 BlockRecord"""
+    return BlockRecord(
+        start=parse_datetime(item.get('startTime')),
+        end=parse_datetime(item.get('endTime')),
+        is_active=bool(item.get('isActive')),
+        is_gap=bool(item.get('isGap')),
+        tokens=token_total(item, 'tokenCounts', (
+            'inputTokens', 'outputTokens', 'cacheCreationInputTokens', 'cacheReadInputTokens')),
+        cost=float(item.get('costUSD') or 0.0),
+        models=tuple(item.get('models') or ())
+    )
+
+
+def parse_blocks_json(text):
+    """解析 ccusage blocks --json，返回 BlockRecord 列表；輸出不是 JSON 時返回 None"""
+    try:
+        return [block_record(item) for item in iter_json_array(text, 'blocks')]
+    except ValueError:
+        return None
+
+
+def parse_current_block(text):
+    """返回監測器顯示的區塊: 進行中的區塊，沒有時為最後一個有用量的區塊
+
+    逐個解碼區塊，遇到進行中的區塊即停止。沒有這樣的區塊時返回 None；
+    輸出不是 JSON 或不完整時拋出 ValueError。
+    """
+    latest = None
+    for item in iter_json_array(text, 'blocks'):
+        if not isinstance(item, dict) or item.get('isGap'):
+            continue
+        if item.get('isActive'):
+            return block_record(item)
+        if token_total(item, 'tokenCounts', (
+                'inputTokens', 'outputTokens', 'cacheCreationInputTokens', 'cacheReadInputTokens')) > 0:
+            latest = item
+    return block_record(latest) if latest is not None else None
+
+
+def json_unsupported(result):
+    """判斷 ccusage 是否不支持 --json: 選項被拒絕，或被忽略而輸出了表格
+
+    其他失敗 (例如輸出被截斷) 只影響這一次，不代表不支持。
+    """
+    if result.returncode != 0:
+        return bool(UNKNOWN_OPTION.search(f"{result.stderr}\n{result.stdout}"))
+    text = result.stdout.lstrip()
+    return bool(text) and text[0] not in '{['
+
+
+def parse_daily_json(text):
+    """解析 ccusage daily --json，返回 DailyRecord 列表；輸出不是 JSON 時返回 None"""
+    records = []
+    try:
+        for item in iter_json_array(text, 'daily'):
+            records.append(DailyRecord(
+                date=date.fromisoformat(item['date']),
+                tokens=token_total(item, None, (
+                    'inputTokens', 'outputTokens', 'cacheCreationTokens', 'cacheReadTokens')),
+                cost=float(item.get('totalCost', item.get('costUSD')) or 0.0),
+                models=tuple(item.get('modelsUsed') or ())
+            ))
+    except (KeyError, ValueError):
+        return None
+    return records
+
+
+def compare_parse_time(repeat=5):
+    """用本機 ccusage 的實際輸出比較 JSON 解析與表格解析的耗時"""
+    from claude_monitor import NetworkMonitor
+
+    monitor = NetworkMonitor()
+    launcher = monitor.ccusage
+    table = launcher.run(['blocks', '--mode', 'calculate'], timeout=120)
+    data = launcher.run(['blocks', '--json', '--mode', 'calculate'], timeout=120)
+    recent = launcher.run(['blocks', '--json', '--recent', '--mode', 'calculate'], timeout=120)
+    if any(result is None or result.returncode != 0 for result in (table, data, recent)):
+        print("❌ 無法運行 ccusage")
+        return None
+
+    def best_time(func, text):
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func(text)
+            times.append(time.perf_counter() - started)
+        return min(times) * 1000
+
+    records = parse_blocks_json(data.stdout)
+    if records is None:
+        print("❌ 此版本的 ccusage 不支持 --json")
+        return None
+    table_ms = best_time(monitor.parse_blocks_table, table.stdout)
+    json_ms = best_time(parse_current_block, recent.stdout)
+    full_ms = best_time(parse_current_block, data.stdout)
+    print(f"📦 區塊數: {len(records)}")
+    print(f"📋 表格解析 (全部區塊): {table_ms:.2f}ms")
+    print(f"🧾 JSON 當前區塊 (--recent): {json_ms:.2f}ms (全部區塊 {full_ms:.2f}ms)")
+    print(f"⚡ 節省: {table_ms - json_ms:.2f}ms ({(1 - json_ms / table_ms) * 100 if table_ms else 0:.0f}%)")
+    return {'blocks': len(records), 'table_ms': table_ms, 'json_ms': json_ms, 'full_json_ms': full_ms}
+
+
+if __name__ == "__main__":
+    compare_parse_time()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+用量檢查點存儲
+
+把 UsageReader 的讀取位置、去重記錄、每小時統計以及最後一次顯示的
+快照保存在 SQLite (WAL 模式) 中，重新啟動時直接從檢查點繼續，
+不必重新掃描全部歷史記錄。檢查點記錄計算費用時使用的價格表版本，
+版本不同時載入後按新價格重新計算。
+"""
+import json
+import os
+import platform
+import sqlite3
+import threading
+
+
+SCHEMA_VERSION = '1'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    inode INTEGER
+);
+CREATE TABLE IF NOT EXISTS seen (
+    key TEXT PRIMARY KEY
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS hourly (
+    hour INTEGER NOT NULL,
+    model TEXT NOT NULL,
+    first REAL NOT NULL,
+    last REAL NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    cache_creation_tokens INTEGER NOT NULL,
+    cache_read_tokens INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (hour, model)
+);
+CREATE VIEW IF NOT EXISTS daily AS
+    SELECT date(hour, 'unixepoch', 'localtime') AS day,
+           SUM(input_tokens + output_tokens + cache_creation_tokens + cache_read_tokens) AS tokens,
+           SUM(cost) AS cost
+    FROM hourly GROUP BY day;
+"""
+
+
+def user_cache_dir():
+    """返回本程序的快取目錄"""
+    system = platform.system().lower()
+    if system == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    elif system == 'windows':
+        base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~\\AppData\\Local'))
+    else:
+        base = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    return os.path.join(base, 'claude-code-monitor')
+
+
+class CheckpointStore:
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(user_cache_dir(), 'checkpoint.db')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+        version = self.get_meta('schema_version')
+        if version != SCHEMA_VERSION:
+            self.clear()
+            self.set_meta('schema_version', SCHEMA_VERSION)
+
+    def get_meta(self, key):
+        with self.lock:
+            row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def clear(self):
+        """清空檢查點 (檔案被截斷或替換時使用)"""
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM files')
+            self.conn.execute('DELETE FROM seen')
+            self.conn.execute('DELETE FROM hourly')
+
+    def load(self, reader):
+        """把檢查點載入到 UsageReader，檔案已被截斷或替換時返回 False 並清空檢查點"""
+        with self.lock:
+            files = self.conn.execute('SELECT path, offset, inode FROM files').fetchall()
+
+        for path, offset, inode in files:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # 檔案已被刪除，保留其歷史統計
+                continue
+            if stat.st_size < offset or (inode is not None and stat.st_ino != inode):
+                self.clear()
+                reader.reset()
+                return False
+
+        reader.reset()
+        with self.lock:
+            for path, offset, inode in files:
+                reader.offsets[path] = offset
+                reader.inodes[path] = inode
+            reader.seen = {row[0] for row in self.conn.execute('SELECT key FROM seen')}
+            rows = self.conn.execute(
+                'SELECT hour, model, first, last, input_tokens, output_tokens, '
+                'cache_creation_tokens, cache_read_tokens, cost, count FROM hourly').fetchall()
+
+        for hour, model, first, last, input_tokens, output_tokens, cache_create, cache_read, cost, count in rows:
+            bucket = reader.hourly.get(hour)
+            if bucket is None:
+                bucket = {'first': first, 'last': last, 'models': {}}
+                reader.hourly[hour] = bucket
+            else:
+                bucket['first'] = min(bucket['first'], first)
+                bucket['last'] = max(bucket['last'], last)
+            bucket['models'][model] = [input_tokens, output_tokens, cache_create, cache_read, cost, count]
+            reader.record_count += count
+
+        reader.clear_dirty()
+        if self.get_meta('prices_version') != reader.prices.version:
+            # 價格表已更新: 按 Token 重新計算費用，下次保存時寫回
+            reader.recompute_costs()
+        else:
+            reader.rebuild_burn_rate()
+        return True
+
+    def save(self, reader):
+        """把 UsageReader 自上次保存後的變更寫入檢查點"""
+        if not (reader.rebuilt or reader.dirty_hours or reader.dirty_files or reader.new_seen):
+            return
+
+        with self.lock, self.conn:
+            if reader.rebuilt:
+                self.conn.execute('DELETE FROM files')
+                self.conn.execute('DELETE FROM seen')
+                self.conn.execute('DELETE FROM hourly')
+                files = reader.offsets.keys()
+                hours = reader.hourly.keys()
+                seen = reader.seen
+            else:
+                files = reader.dirty_files
+                hours = reader.dirty_hours
+                seen = reader.new_seen
+
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO files (path, offset, inode) VALUES (?, ?, ?)',
+                [(path, reader.offsets[path], reader.inodes.get(path)) for path in files])
+            self.conn.executemany('INSERT OR IGNORE INTO seen (key) VALUES (?)', [(key,) for key in seen])
+            rows = []
+            for hour in hours:
+                bucket = reader.hourly[hour]
+                for model, stats in bucket['models'].items():
+                    rows.append((hour, model, bucket['first'], bucket['last'], *stats))
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO hourly (hour, model, first, last, input_tokens, output_tokens, '
+                'cache_creation_tokens, cache_read_tokens, cost, count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                rows)
+            self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                              ('prices_version', reader.prices.version))
+
+        reader.clear_dirty()
+
+    def save_snapshot(self, snapshot):
+        """保存最後一次顯示的數據"""
+        self.set_meta('snapshot', json.dumps(snapshot, ensure_ascii=False))
+
+    def load_snapshot(self):
+        """讀取最後一次顯示的數據"""
+        value = self.get_meta('snapshot')
+        if not value:
+            return None
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -1,15 +1,35 @@
 #!/usr/bin/env python3
-import threading
+import argparse
+import asyncio
+import signal
 import time
 import subprocess
-import platform
-import urllib.request
-import urllib.error
 from datetime import datetime, timedelta
 import os
 import re
+import sys
 from collections import defaultdict
 
+from usage_reader import UsageReader, short_model_name, backfill_async
+from fs_watcher import ProjectsWatcher
+from checkpoint import CheckpointStore
+from scheduler import ProbeScheduler, AdaptiveInterval
+from renderer import FrameRenderer, display_width
+from latency_stats import LatencyRing, StageTimings
+from probes import LatencyProbe, HttpProbe
+from metrics_server import MetricsServer, fetch_status, fetch_status_async, DEFAULT_HOST, DEFAULT_PORT
+from ccusage_client import CcusageLauncher, parse_current_block, parse_daily_json, json_unsupported
+from targets import TargetSet, DEFAULT_CONFIG, format_table
+from profiler import run_profiled
+from rollup import RollupIndex, RANGES, LEVELS, LEVEL_NAMES
+from pricing import PriceTable
+from notifier import Notifier, create_backend, BACKENDS
+from history_log import HistoryLog
+
+# 圖表最多顯示的行數，以及切換粒度時允許的最多桶數
+MAX_CHART_ROWS = 31
+MAX_CHART_BUCKETS = 200
+
 
 class NetworkMonitor:
     def __init__(self):
@@ -25,47 +45,240 @@ class NetworkMonitor:
             'status': '--',
             'model': '--'
         }
+        self.session_block = None       # 內建讀取器的當前區塊 (Token、費用、結束時間)
+        self.remote_burn_rate = None
+        # 每個 5 小時區塊的預算，設置後預測用完的時間
+        self.cost_budget = None
+        self.token_budget = None
         self.daily_costs = {}
         self.total_cost = 0
+        # 按小時、日、週、月預先彙總的費用，圖表切換範圍時直接查詢
+        self.rollup = RollupIndex()
+        self.rollup_source = None       # 建立 rollup 使用的 daily_costs (非內建讀取器時)
+        self.chart_range = '7d'
+        self.chart_level = None         # None 為範圍的預設粒度
         self.ccusage_failed_count = 0
         self.max_ccusage_failures = 3
-        self.npx_path = None
+        # ccusage 結果快取 10 秒，過期後先顯示舊快照並在後台刷新
+        self.ccusage = CcusageLauncher(cache_ttl=10)
+        self.use_json_output = True  # 優先使用 ccusage --json，表格解析作為備用
+        self.parse_times = {}  # 最近一次解析 ccusage 輸出的耗時 (秒)
         self.debug_mode = False  # 可以設為 True 來顯示調試信息
         self.session_count = 0
         self.active_sessions = 0
+        self.usage_reader = UsageReader()
+        self.use_native_reader = True  # 直接讀取 JSONL 記錄，不再每次啟動 ccusage
+        self.watch_projects = True     # 監視對話記錄目錄，有寫入時才刷新用量
+        self.watcher = None
+        self.remote_watch_mode = None
+        # 首次運行時用進程池彙總全部歷史記錄
+        self.backfill_workers = None    # 進程數，None 為 CPU 核心數
+        self.backfill_task = None
+        self.backfill_progress = None   # (已完成字節, 總字節, 進程數)
+        self.remote_backfill = None
+        self.checkpoint = None
+        # 各探測的獨立刷新間隔 (秒)
+        self.probe_intervals = {
+            'ping': 1,
+            'http': 5,
+            'blocks': 10,
+            'daily': 300
+        }
+        # 空閒時 (沒有活躍對話、網絡穩定) 上述間隔逐步加倍，直到這個上限 (秒)
+        self.max_probe_interval = 60
+        self.busy_hold = 60             # 網絡狀態變化後保持最快間隔的時間 (秒)
+        self.network_ok = None
+        self.network_changed_at = None
+        self.was_busy = False
+        self.remote_intervals = None
+        # 各探測單次運行的超時 (秒)，超時的運行會被取消，ccusage 子進程隨之結束
+        self.probe_timeouts = {
+            'ping': 10,
+            'http': 15,
+            'blocks': 90,
+            'daily': 180,
+            'ccusage_update': 300
+        }
+        self.render_interval = 1
+        self.renderer = FrameRenderer(budget_ms=1.0)
+        self.scheduler = None
+        self.connect_url = None     # 設置後作為監測服務的輕量客戶端，不自行探測
+        self.remote_network = None
+        self.remote_latency_stats = None
+        # 最近 300 個 Ping / HTTP 樣本的延遲統計
+        self.ping_stats = LatencyRing(300)
+        self.http_stats = LatencyRing(300)
+        # 每輪連續探測 3 次，可用時使用 ICMP，否則測量 TCP 連接時間
+        self.latency_probe = LatencyProbe('google.com', 443, burst=3)
+        # HEAD 請求，不下載頁面內容
+        self.http_probe = HttpProbe('https://www.google.com/', method='HEAD')
+        self.http_phases = None
+        # 設定檔中的其他監測目標 (Claude API、代理等)，見 targets.example.json
+        self.targets = TargetSet()
+        self.remote_targets = None
+        # 各階段耗時統計，只有啟用診斷時才記錄，關閉時沒有額外開銷
+        self.timings = None
+        self.remote_stage_timings = None
+        self.show_diagnostics = False
+        self.max_ticks = None           # 運行指定次數的顯示周期後停止 (--profile)
+        self.stop_event = None          # 事件循環啟動後建立，收到 Ctrl+C / SIGTERM 時設置
+        self.background_tasks = set()   # 後台任務 (歷史記錄彙總)
+        self.notifier = Notifier()
+        # 探測樣本和狀態變化寫入快取目錄下的歷史記錄，之後用 history_log.py query 查詢
+        self.record_history = True
+        self.history = None
+        self.load_checkpoint()
         
-    def ping_google(self):
-        """測試網絡連接延遲"""
+    def load_checkpoint(self):
+        """從檢查點恢復讀取進度和上次顯示的數據，使啟動不必重新掃描全部歷史"""
         try:
-            param = '-c' if platform.system().lower() != 'windows' else '-n'
-            command = ['ping', param, '1', 'google.com']
-            result = subprocess.run(command, capture_output=True, text=True, timeout=5)
-            
-            if result.returncode == 0:
-                output = result.stdout
-                for line in output.split('\n'):
-                    if 'avg' in line.lower():
-                        try:
-                            latency = line.split('/')[4] + 'ms'
-                            return True, latency
-                        except:
-                            pass
-                return True, "< 5ms"
-            return False, None
-        except:
-            return False, None
+            self.checkpoint = CheckpointStore()
+            self.checkpoint.load(self.usage_reader)
+            snapshot = self.checkpoint.load_snapshot()
+            if snapshot:
+                self.ccusage_data.update(snapshot.get('ccusage_data', {}))
+                self.daily_costs = snapshot.get('daily_costs', {})
+                self.total_cost = snapshot.get('total_cost', 0)
+                self.session_count = snapshot.get('session_count', 0)
+                self.active_sessions = snapshot.get('active_sessions', 0)
+            self.update_rollup()
+        except Exception as e:
+            # 檢查點無法使用時照常運行，只是啟動時需要完整掃描
+            self.checkpoint = None
+            if self.debug_mode:
+                print(f"檢查點載入失敗: {type(e).__name__}: {e}")
     
-    def check_connection(self):
-        """檢查網絡連接速度"""
+    def save_checkpoint(self):
+        """保存讀取進度和當前顯示的數據"""
+        if not self.checkpoint:
+            return
         try:
-            start_time = time.time()
-            with urllib.request.urlopen('https://www.google.com', timeout=5) as response:
-                end_time = time.time()
-                response_time = (end_time - start_time) * 1000
-                speed = "良好" if response_time < 200 else "一般" if response_time < 500 else "較慢"
-                return True, speed, response_time
-        except:
+            self.checkpoint.save(self.usage_reader)
+            self.checkpoint.save_snapshot({
+                'ccusage_data': self.ccusage_data,
+                'daily_costs': self.daily_costs,
+                'total_cost': self.total_cost,
+                'session_count': self.session_count,
+                'active_sessions': self.active_sessions
+            })
+        except Exception as e:
+            if self.debug_mode:
+                print(f"檢查點保存失敗: {type(e).__name__}: {e}")
+        
+    async def ping_google(self):
+        """測試網絡連接延遲 (進程內 ICMP / TCP 探測，不再啟動 ping 進程)"""
+        samples = await self.latency_probe.probe_async()
+        for sample in samples:
+            self.ping_stats.add(sample)
+        
+        succeeded = [sample for sample in samples if sample is not None]
+        if self.history is not None:
+            self.history.record('ping', sum(succeeded) / len(succeeded) if succeeded else None)
+        self.note_network_state(bool(succeeded))
+        if not succeeded:
+            return False, None
+        return True, f"{sum(succeeded) / len(succeeded):.1f}ms"
+    
+    async def check_connection(self):
+        """檢查網絡連接速度 (重用 keep-alive 連接，分階段計時)"""
+        result = await self.http_probe.probe_async()
+        self.http_phases = result
+        if self.history is not None:
+            self.history.record('http', result['total'] if result['ok'] else None)
+        if not result['ok']:
+            self.http_stats.add(None)
             return False, None, None
+        
+        response_time = result['total']
+        speed = "良好" if response_time < 200 else "一般" if response_time < 500 else "較慢"
+        self.http_stats.add(response_time)
+        return True, speed, response_time
+    
+    def note_network_state(self, ok):
+        """記錄網絡狀態，狀態變化時讓探測回到最快間隔"""
+        if self.network_ok is not None and ok != self.network_ok:
+            self.network_changed_at = time.time()
+        self.network_ok = ok
+        self.update_activity()
+    
+    def is_busy(self):
+        """對話活躍、網絡斷開或網絡狀態剛變化時為忙碌，探測使用最快間隔"""
+        if self.ccusage_data.get('status') == 'ACTIVE' or self.network_ok is False:
+            return True
+        return self.network_changed_at is not None and time.time() - self.network_changed_at < self.busy_hold
+    
+    def update_activity(self):
+        """從空閒轉為忙碌時喚醒正在退避的探測"""
+        busy = self.is_busy()
+        if busy and not self.was_busy and self.scheduler:
+            self.scheduler.wake()
+        self.was_busy = busy
+    
+    def start_watcher(self):
+        """使用內建讀取器時監視對話記錄目錄，寫入後立即刷新當前對話"""
+        if not (self.watch_projects and self.use_native_reader and self.usage_reader.has_projects_dir()):
+            return
+        self.watcher = ProjectsWatcher(self.usage_reader.projects_dirs, self.on_usage_change)
+        self.watcher.start()
+    
+    def start_backfill(self):
+        """讀取器還沒有任何進度時 (首次運行或清除檢查點後)，在後台用進程池彙總全部歷史"""
+        if not (self.use_native_reader and self.usage_reader.has_projects_dir()) or self.usage_reader.offsets:
+            return
+        self.backfill_task = asyncio.ensure_future(self.run_backfill())
+        self.background_tasks.add(self.backfill_task)
+        self.backfill_task.add_done_callback(self.background_tasks.discard)
+    
+    async def run_backfill(self):
+        """把專案目錄分組交給工作進程讀取，每組完成後合併並更新進度"""
+        workers = self.backfill_workers or os.cpu_count() or 1
+        
+        def progress(done, total):
+            self.backfill_progress = (done, total, workers)
+        
+        try:
+            await backfill_async(self.usage_reader, workers, progress)
+        except Exception as e:
+            # 讀取器已被清空，由正常的讀取重新計算
+            if self.debug_mode:
+                print(f"歷史記錄彙總失敗: {type(e).__name__}: {e}")
+        finally:
+            self.backfill_task = None
+            self.backfill_progress = None
+        self.save_checkpoint()
+        if self.scheduler:
+            self.scheduler.wake('blocks', 'daily')
+    
+    def get_backfill_progress(self):
+        """返回歷史記錄彙總進度 (已完成字節, 總字節, 進程數)，沒有進行時返回 None"""
+        if self.connect_url:
+            return self.remote_backfill
+        return self.backfill_progress
+    
+    def on_usage_change(self):
+        if self.scheduler:
+            self.scheduler.wake('blocks')
+    
+    def get_watch_mode(self):
+        """返回對話記錄的監視方式 (inotify / polling)，沒有監視時返回 None"""
+        if self.connect_url:
+            return self.remote_watch_mode
+        return self.watcher.mode if self.watcher else None
+    
+    def get_probe_intervals(self):
+        """返回各探測當前使用的間隔 (秒)"""
+        if self.connect_url:
+            return dict(self.remote_intervals or {})
+        if not self.scheduler:
+            return {}
+        return {name: self.scheduler.current_interval(name) for name in self.probe_intervals}
+    
+    def set_targets(self, target_set):
+        """使用設定檔中的主要探測目標和其他監測目標"""
+        primary = target_set.primary
+        self.targets = target_set
+        self.latency_probe = LatencyProbe(primary['host'], primary['port'], burst=3)
+        self.http_probe = HttpProbe(primary['url'], method='HEAD')
     
     def clean_ansi_codes(self, text):
         """移除 ANSI 顏色代碼"""
@@ -105,151 +318,275 @@ class NetworkMonitor:
                 'remaining_time': '--'
             }
     
-    def get_ccusage_info(self):
-        try:
-            # 尋找 npx 的完整路徑
-            npx_path = self.find_npx_path()
-            if not npx_path:
-                print("⚠️  找不到 npx 命令，請確保已安裝 Node.js")
-                print("📍 當前 PATH:", os.environ.get('PATH', '未設置'))
-                return False
-            
-            # print(f"🔍 使用 npx 路徑: {npx_path}")  # 減少輸出
-            
-            # 設置環境變量，確保 npx 可以正常運行
-            env = os.environ.copy()
-            env['PATH'] = f"/usr/local/bin:/usr/bin:/bin:/usr/sbin:/sbin:{env.get('PATH', '')}"
-            
-            result = subprocess.run([npx_path, '--yes', 'ccusage@latest', 'blocks', '--mode', 'calculate'], 
-                                  capture_output=True, text=True, timeout=60, env=env)
-            
-            if result.returncode == 0:
-                output = result.stdout
-                lines = output.split('\n')
-                
+    def refresh_usage(self):
+        """讀取對話記錄的新內容；有目錄監視時只讀取變化的檔案，沒有變化時直接返回"""
+        if self.backfill_task is not None:
+            # 歷史記錄正在後台彙總，顯示已合併的部分
+            return 0
+        if self.watcher is None:
+            return self.usage_reader.refresh()
+        changes = self.watcher.take_changes()
+        if changes is not None and not changes:
+            return 0
+        return self.usage_reader.refresh(changes)
+    
+    def get_native_usage_info(self):
+        """使用內建讀取器增量解析對話記錄，更新 ccusage_data"""
+        self.refresh_usage()
+        summary = self.usage_reader.get_session_summary()
+        if not summary:
+            return False
+        
+        times = self.calculate_session_times(summary['latest_session'])
+        self.session_block = summary['block']
+        self.ccusage_data = {
+            'latest_session': summary['latest_session'],
+            'session_start': times['session_start'],
+            'session_end': times['session_end'],
+            'remaining_time': times['remaining_time'] if summary['status'] == 'ACTIVE' else '已完成',
+            'tokens': summary['tokens'],
+            'cost': summary['cost'],
+            'status': summary['status'],
+            'model': summary['model']
+        }
+        self.ccusage_failed_count = 0
+        return True
+    
+    def current_remaining_time(self):
+        """按對話開始時間在渲染時重新計算剩餘時間
+
+        有目錄監視時 blocks 探測只按最長間隔定時運行，緩存的剩餘時間
+        最多會落後一個間隔；區塊的結束時間是固定的，每幀重新計算即可。
+        """
+        if self.ccusage_data['status'] != 'ACTIVE':
+            return self.ccusage_data['remaining_time']
+        return self.calculate_session_times(self.ccusage_data['latest_session'])['remaining_time']
+    
+    def get_burn_projection(self):
+        """返回當前區塊的消耗速度和預測，沒有活躍區塊或不是內建讀取器的數據時返回 None"""
+        if self.connect_url:
+            return self.remote_burn_rate
+        block = self.session_block
+        if not block or not block['is_active'] or self.ccusage_data['status'] != 'ACTIVE':
+            return None
+        if block['end'] <= time.time():
+            # 區塊已結束，等下一次 blocks 探測更新狀態
+            return None
+        return self.usage_reader.burn_rate.project(block['tokens'], block['cost'], block['end'], time.time(),
+                                                   self.cost_budget, self.token_budget)
+    
+    def parse_blocks_table(self, output):
+        """解析 ccusage blocks 的表格輸出 (JSON 不可用時的備用方案)，返回 ccusage_data 或 None"""
+        lines = output.split('\n')
+        
+        if self.debug_mode:
+            print(f"\n=== DEBUG: 找到 {len(lines)} 行輸出 ===")
+            for i, line in enumerate(lines):
+                if 'ACTIVE' in line or 'elapsed' in line:
+                    print(f"行 {i}: {repr(line[:100])}...")
+        
+        # 先檢查是否有 ACTIVE 狀態的對話
+        for i, line in enumerate(lines):
+            if 'ACTIVE' in line or ('elapsed' in line and 'remaining' in line):
                 if self.debug_mode:
-                    print(f"\n=== DEBUG: 找到 {len(lines)} 行輸出 ===")
-                    for i, line in enumerate(lines):
-                        if 'ACTIVE' in line or 'elapsed' in line:
-                            print(f"行 {i}: {repr(line[:100])}...")
-                
-                # 先檢查是否有 ACTIVE 狀態的對話
-                for i, line in enumerate(lines):
-                    if 'ACTIVE' in line or ('elapsed' in line and 'remaining' in line):
-                        if self.debug_mode:
-                            print(f"\n=== DEBUG: 找到 ACTIVE 行 {i}: {repr(line[:100])} ===")
-                        parts = line.split('│')
-                        if len(parts) >= 6:
-                            session_info = self.clean_ansi_codes(parts[1])
-                            status = self.clean_ansi_codes(parts[2])
-                            tokens = self.clean_ansi_codes(parts[4])
-                            cost = self.clean_ansi_codes(parts[5])
-                            
-                            # 提取模型信息 - 需要檢查當前行和接下來的幾行
-                            models = []
-                            # 檢查當前行的模型列
-                            if len(parts) > 3:
-                                model_info = self.clean_ansi_codes(parts[3])
-                                if 'opus-4' in model_info:
+                    print(f"\n=== DEBUG: 找到 ACTIVE 行 {i}: {repr(line[:100])} ===")
+                parts = line.split('│')
+                if len(parts) >= 6:
+                    session_info = self.clean_ansi_codes(parts[1])
+                    status = self.clean_ansi_codes(parts[2])
+                    tokens = self.clean_ansi_codes(parts[4])
+                    cost = self.clean_ansi_codes(parts[5])
+                    
+                    # 提取模型信息 - 需要檢查當前行和接下來的幾行
+                    models = []
+                    # 檢查當前行的模型列
+                    if len(parts) > 3:
+                        model_info = self.clean_ansi_codes(parts[3])
+                        if 'opus-4' in model_info:
+                            models.append('opus-4')
+                        elif 'sonnet-4' in model_info:
+                            models.append('sonnet-4')
+                        elif 'haiku-3' in model_info:
+                            models.append('haiku-3')
+                    
+                    # 檢查接下來的1-2行是否包含其他模型
+                    for j in range(i+1, min(i+3, len(lines))):
+                        next_line = lines[j]
+                        if '│' in next_line and 'PROJECTED' not in next_line:
+                            next_parts = next_line.split('│')
+                            if len(next_parts) > 3:
+                                next_model_info = self.clean_ansi_codes(next_parts[3])
+                                if 'opus-4' in next_model_info and 'opus-4' not in models:
                                     models.append('opus-4')
-                                elif 'sonnet-4' in model_info:
+                                elif 'sonnet-4' in next_model_info and 'sonnet-4' not in models:
                                     models.append('sonnet-4')
-                                elif 'haiku-3' in model_info:
+                                elif 'haiku-3' in next_model_info and 'haiku-3' not in models:
                                     models.append('haiku-3')
+                    
+                    # 組合模型名稱，過濾掉 synthetic
+                    model = ', '.join(models) if models else '--'
+                    
+                    # 嘗試多種日期格式
+                    # 格式1: 6/21/2025, 11:52:17 AM
+                    # 格式2: 2025/6/21 11:52:17
+                    session_match = re.search(r'(\d+/\d+/\d{4},\s+\d+:\d+:\d+\s+[AP]M)', session_info)
+                    if not session_match:
+                        session_match = re.search(r'(\d{4}/\d+/\d+\s+\d+:\d+:\d+)', session_info)
+                    
+                    if self.debug_mode:
+                        print(f"  session_info: {repr(session_info[:50])}")
+                        print(f"  status: {repr(status)}")
+                        print(f"  tokens: {repr(tokens)}")
+                        print(f"  cost: {repr(cost)}")
+                        print(f"  session_match: {session_match}")
+                    
+                    if session_match:
+                        session_start_str = session_match.group(1)
+                        times = self.calculate_session_times(session_start_str)
+                        
+                        return {
+                            'latest_session': session_start_str,
+                            'session_start': times['session_start'],
+                            'session_end': times['session_end'],
+                            'remaining_time': times['remaining_time'],
+                            'tokens': tokens if tokens and tokens != '-' else '--',
+                            'cost': cost if cost and cost != '-' else '--',
+                            'status': 'ACTIVE',
+                            'model': model
+                        }
+        
+        # 如果沒有 ACTIVE 狀態，找最近的已完成對話
+        for line in reversed(lines):
+            if '│' in line and not ('gap' in line or 'ACTIVE' in line or 'PROJECTED' in line or 'Block Start' in line):
+                parts = line.split('│')
+                if len(parts) >= 6:
+                    session_info = self.clean_ansi_codes(parts[1])
+                    tokens = self.clean_ansi_codes(parts[4])
+                    cost = self.clean_ansi_codes(parts[5])
+                    
+                    # 對於非活躍會話，模型信息可能在同一行
+                    model = '--'
+                    if len(parts) > 3:
+                        model_info = self.clean_ansi_codes(parts[3])
+                        if 'opus-4' in model_info:
+                            model = 'opus-4'
+                        elif 'sonnet-4' in model_info:
+                            model = 'sonnet-4'
+                        elif 'haiku-3' in model_info:
+                            model = 'haiku-3'
+                    
+                    if tokens and tokens != '-':
+                        # 嘗試多種日期格式
+                        session_match = re.search(r'(\d+/\d+/\d{4},\s+\d+:\d+:\d+\s+[AP]M)', session_info)
+                        if not session_match:
+                            session_match = re.search(r'(\d{4}/\d+/\d+\s+\d+:\d+:\d+)', session_info)
+                        
+                        if session_match:
+                            session_start_str = session_match.group(1)
+                            times = self.calculate_session_times(session_start_str)
                             
-                            # 檢查接下來的1-2行是否包含其他模型
-                            for j in range(i+1, min(i+3, len(lines))):
-                                next_line = lines[j]
-                                if '│' in next_line and 'PROJECTED' not in next_line:
-                                    next_parts = next_line.split('│')
-                                    if len(next_parts) > 3:
-                                        next_model_info = self.clean_ansi_codes(next_parts[3])
-                                        if 'opus-4' in next_model_info and 'opus-4' not in models:
-                                            models.append('opus-4')
-                                        elif 'sonnet-4' in next_model_info and 'sonnet-4' not in models:
-                                            models.append('sonnet-4')
-                                        elif 'haiku-3' in next_model_info and 'haiku-3' not in models:
-                                            models.append('haiku-3')
-                            
-                            # 組合模型名稱，過濾掉 synthetic
-                            model = ', '.join(models) if models else '--'
-                            
-                            # 嘗試多種日期格式
-                            # 格式1: 6/21/2025, 11:52:17 AM
-                            # 格式2: 2025/6/21 11:52:17
-                            session_match = re.search(r'(\d+/\d+/\d{4},\s+\d+:\d+:\d+\s+[AP]M)', session_info)
-                            if not session_match:
-                                session_match = re.search(r'(\d{4}/\d+/\d+\s+\d+:\d+:\d+)', session_info)
-                            
-                            if self.debug_mode:
-                                print(f"  session_info: {repr(session_info[:50])}")
-                                print(f"  status: {repr(status)}")
-                                print(f"  tokens: {repr(tokens)}")
-                                print(f"  cost: {repr(cost)}")
-                                print(f"  session_match: {session_match}")
-                            
-                            if session_match:
-                                session_start_str = session_match.group(1)
-                                times = self.calculate_session_times(session_start_str)
-                                
-                                self.ccusage_data = {
-                                    'latest_session': session_start_str,
-                                    'session_start': times['session_start'],
-                                    'session_end': times['session_end'],
-                                    'remaining_time': times['remaining_time'],
-                                    'tokens': tokens if tokens and tokens != '-' else '--',
-                                    'cost': cost if cost and cost != '-' else '--',
-                                    'status': 'ACTIVE',
-                                    'model': model
-                                }
-                                self.ccusage_failed_count = 0  # 成功時重置計數器
-                                return True
-                
-                # 如果沒有 ACTIVE 狀態，找最近的已完成對話
-                for line in reversed(lines):
-                    if '│' in line and not ('gap' in line or 'ACTIVE' in line or 'PROJECTED' in line or 'Block Start' in line):
-                        parts = line.split('│')
-                        if len(parts) >= 6:
-                            session_info = self.clean_ansi_codes(parts[1])
-                            tokens = self.clean_ansi_codes(parts[4])
-                            cost = self.clean_ansi_codes(parts[5])
-                            
-                            # 對於非活躍會話，模型信息可能在同一行
-                            model = '--'
-                            if len(parts) > 3:
-                                model_info = self.clean_ansi_codes(parts[3])
-                                if 'opus-4' in model_info:
-                                    model = 'opus-4'
-                                elif 'sonnet-4' in model_info:
-                                    model = 'sonnet-4'
-                                elif 'haiku-3' in model_info:
-                                    model = 'haiku-3'
-                            
-                            if tokens and tokens != '-':
-                                # 嘗試多種日期格式
-                                session_match = re.search(r'(\d+/\d+/\d{4},\s+\d+:\d+:\d+\s+[AP]M)', session_info)
-                                if not session_match:
-                                    session_match = re.search(r'(\d{4}/\d+/\d+\s+\d+:\d+:\d+)', session_info)
-                                
-                                if session_match:
-                                    session_start_str = session_match.group(1)
-                                    times = self.calculate_session_times(session_start_str)
-                                    
-                                    self.ccusage_data = {
-                                        'latest_session': session_start_str,
-                                        'session_start': times['session_start'],
-                                        'session_end': times['session_end'],
-                                        'remaining_time': '已完成',
-                                        'tokens': tokens,
-                                        'cost': cost,
-                                        'status': 'COMPLETED',
-                                        'model': model
-                                    }
-                                    self.ccusage_failed_count = 0  # 成功時重置計數器
-                                    return True
-                
-                # 如果沒有找到任何數據，可能是因為沒有活躍的對話
-                # 不顯示警告，保持界面清潔
+                            return {
+                                'latest_session': session_start_str,
+                                'session_start': times['session_start'],
+                                'session_end': times['session_end'],
+                                'remaining_time': '已完成',
+                                'tokens': tokens,
+                                'cost': cost,
+                                'status': 'COMPLETED',
+                                'model': model
+                            }
+        
+        # 如果沒有找到任何數據，可能是因為沒有活躍的對話
+        # 不顯示警告，保持界面清潔
+        return None
+    
+    async def run_blocks_json(self, args):
+        """運行 ccusage blocks --json 並解碼當前區塊，返回 (JSON 是否可用, 區塊或 None)"""
+        result = await self.ccusage.run_cached(args, timeout=60)
+        if result is None:
+            return False, None
+        if json_unsupported(result):
+            # 這個版本的 ccusage 不支持 --json，改用表格解析
+            self.use_json_output = False
+            return False, None
+        if result.returncode != 0:
+            return False, None
+        
+        started = time.perf_counter()
+        try:
+            # 逐個解碼區塊，遇到進行中的區塊即停止
+            return True, parse_current_block(result.stdout)
+        except ValueError:
+            # 輸出不完整 (例如被截斷)，這次改用表格解析，下次重新運行
+            self.ccusage.snapshots.invalidate(tuple(args))
+            return False, None
+        finally:
+            self.parse_times['blocks_json'] = time.perf_counter() - started
+    
+    async def get_ccusage_json_info(self):
+        """使用 ccusage blocks --json 獲取對話信息，返回 ccusage_data；這次無法使用 JSON 時返回 None"""
+        ok, record = await self.run_blocks_json(['blocks', '--json', '--recent', '--mode', 'calculate'])
+        if ok and record is None:
+            # 最近 3 天沒有用量，從完整的區塊列表中找最後一個有用量的區塊
+            ok, record = await self.run_blocks_json(['blocks', '--json', '--mode', 'calculate'])
+        if not ok:
+            return None
+        if record is None:
+            return {}
+        
+        session_start_str = record.start.strftime("%Y/%m/%d %H:%M:%S")
+        times = self.calculate_session_times(session_start_str)
+        models = []
+        for name in record.models:
+            short_name = short_model_name(name)
+            if name != '<synthetic>' and short_name not in models:
+                models.append(short_name)
+        return {
+            'latest_session': session_start_str,
+            'session_start': times['session_start'],
+            'session_end': times['session_end'],
+            'remaining_time': times['remaining_time'] if record.is_active else '已完成',
+            'tokens': f"{record.tokens:,}",
+            'cost': f"${record.cost:.2f}",
+            'status': 'ACTIVE' if record.is_active else 'COMPLETED',
+            'model': ', '.join(models) if models else '--'
+        }
+    
+    async def get_ccusage_info(self):
+        if self.use_native_reader and self.usage_reader.has_projects_dir():
+            try:
+                return self.get_native_usage_info()
+            except Exception as e:
+                # 內建讀取器出錯時退回 ccusage 命令
+                if self.debug_mode:
+                    print(f"內建讀取器錯誤: {type(e).__name__}: {e}")
+        self.session_block = None
+        
+        try:
+            if self.use_json_output:
+                data = await self.get_ccusage_json_info()
+                if data is not None:
+                    if not data:
+                        return False
+                    self.ccusage_data = data
+                    self.ccusage_failed_count = 0
+                    return True
+            
+            # 直接運行已固定的 ccusage 可執行檔
+            result = await self.ccusage.run_cached(['blocks', '--mode', 'calculate'], timeout=60)
+            if result is None:
+                print("⚠️  找不到 ccusage 或 npx 命令，請確保已安裝 Node.js")
+                print("📍 當前 PATH:", os.environ.get('PATH', '未設置'))
+                return False
+            
+            if result.returncode == 0:
+                started = time.perf_counter()
+                data = self.parse_blocks_table(result.stdout)
+                self.parse_times['blocks_table'] = time.perf_counter() - started
+                if data:
+                    self.ccusage_data = data
+                    self.ccusage_failed_count = 0  # 成功時重置計數器
+                    return True
                 return False
             else:
                 print(f"❌ ccusage 命令執行失敗 (返回碼: {result.returncode})")
@@ -269,7 +606,7 @@ class NetworkMonitor:
             # 如果連續失敗次數達到上限，嘗試更新 ccusage
             if self.ccusage_failed_count >= self.max_ccusage_failures:
                 print("🔄 連續失敗次數過多，正在嘗試更新 ccusage...")
-                if self.update_ccusage():
+                if await self.update_ccusage():
                     print("✅ ccusage 更新成功，重置失敗計數器")
                     self.ccusage_failed_count = 0
                 else:
@@ -277,135 +614,141 @@ class NetworkMonitor:
             
             return False
     
-    def find_npx_path(self):
-        """尋找 npx 命令的完整路徑"""
-        if self.npx_path:
-            return self.npx_path
-            
-        # 嘗試常見的 npx 位置
-        possible_paths = [
-            '/usr/local/bin/npx',
-            '/usr/bin/npx',
-            '/opt/homebrew/bin/npx',
-            os.path.expanduser('~/.nvm/versions/node/*/bin/npx'),
-            os.path.expanduser('~/n/*/bin/npx'),
-        ]
-        
-        # 使用 which 命令尋找
-        try:
-            result = subprocess.run(['which', 'npx'], capture_output=True, text=True)
-            if result.returncode == 0 and result.stdout.strip():
-                self.npx_path = result.stdout.strip()
-                return self.npx_path
-        except:
-            pass
-        
-        # 檢查可能的路徑
-        import glob
-        for path in possible_paths:
-            if '*' in path:
-                matches = glob.glob(path)
-                if matches:
-                    for match in matches:
-                        if os.path.exists(match) and os.access(match, os.X_OK):
-                            self.npx_path = match
-                            return self.npx_path
-            elif os.path.exists(path) and os.access(path, os.X_OK):
-                self.npx_path = path
-                return self.npx_path
-        
-        return None
-    
-    def update_ccusage(self):
+    async def update_ccusage(self):
         """更新 ccusage 到最新版本"""
         try:
             print("📦 正在更新 ccusage...")
             
-            # 尋找 npx 路徑
-            npx_path = self.find_npx_path()
-            if not npx_path:
-                print("❌ 找不到 npx 命令")
-                return False
-            
-            # 使用 --yes 強制更新到最新版本
-            result = subprocess.run([npx_path, '--yes', 'ccusage@latest', '--version'], 
-                                  capture_output=True, text=True, timeout=30)
-            
-            if result.returncode == 0:
-                print(f"🎉 ccusage 已更新到版本: {result.stdout.strip()}")
+            # 只有在這裡才查詢最新版本，之後固定使用新版本
+            version = await self.ccusage.update()
+            if version:
+                print(f"🎉 ccusage 已更新到版本: {version}")
                 return True
             else:
-                print(f"❌ 更新失敗: {result.stderr}")
+                print("❌ 更新失敗: 找不到 npx 命令或無法取得最新版本")
                 return False
                 
-        except subprocess.TimeoutExpired:
-            print("⏰ 更新超時")
-            return False
         except Exception as e:
             print(f"❌ 更新過程出錯: {e}")
             return False
     
-    def analyze_daily_costs(self):
+    def analyze_native_daily_costs(self):
+        """使用內建讀取器的小時統計生成每日花費"""
+        self.refresh_usage()
+        blocks = self.usage_reader.get_blocks()
+        daily_costs = self.usage_reader.get_daily_costs()
+            
+        self.daily_costs = daily_costs
+        self.total_cost = sum(daily_costs.values())
+        self.session_count = len(blocks)
+        self.active_sessions = sum(1 for block in blocks if block['is_active'])
+        return True
+    
+    def parse_daily_table(self, output):
+        """解析 ccusage daily 的表格輸出，返回 {MM-DD: 費用}"""
+        lines = output.split('\n')
+        daily_costs = defaultdict(float)
+        
+        # 解析 daily 命令的輸出格式
+        # 格式範例: │ 2025     │ - opus-4        │    9,760 │  170,645 │ 11,697,588 │ 153,763,… │ 165,641,8… │   $460.77 │
+        for line in lines:
+            if '│' in line and not ('Date' in line or 'Total' in line or '─' in line or '═' in line):
+                parts = line.split('│')
+                if len(parts) >= 9:  # daily 格式有9個欄位
+                    date_str = self.clean_ansi_codes(parts[1])
+                    cost_str = self.clean_ansi_codes(parts[8])
+                    
+                    # 解析日期 (格式: 2025 06-21)
+                    date_match = re.search(r'(\d{4})\s+(\d{2}-\d{2})', date_str)
+                    if not date_match:
+                        # 嘗試其他格式
+                        date_match = re.search(r'(\d{2}-\d{2})', date_str)
+                    
+                    # 解析費用
+                    cost_match = re.search(r'\$?(\d+\.?\d*)', cost_str)
+                    
+                    if date_match and cost_match:
+                        if date_match.lastindex == 2:
+                            # 格式: 2025 06-21
+                            month_day = date_match.group(2)
+                        else:
+                            # 格式: 06-21
+                            month_day = date_match.group(1)
+                        
+                        cost_value = float(cost_match.group(1))
+                        daily_costs[month_day] = cost_value
+        return daily_costs
+    
+    async def analyze_daily_costs_json(self):
+        """使用 ccusage daily --json 獲取每日費用"""
+        args = ['daily', '--json', '--mode', 'calculate', '--order', 'asc']
+        result = await self.ccusage.run_cached(args, timeout=60)
+        if result is None:
+            return False
+        if json_unsupported(result):
+            # 這個版本的 ccusage 不支持 --json，改用表格解析
+            self.use_json_output = False
+            return False
+        if result.returncode != 0:
+            return False
+        
+        started = time.perf_counter()
+        records = parse_daily_json(result.stdout)
+        self.parse_times['daily_json'] = time.perf_counter() - started
+        if records is None:
+            # 輸出不完整，這次改用表格解析，下次重新運行
+            self.ccusage.snapshots.invalidate(tuple(args))
+            return False
+        if not records:
+            return False
+        
+        daily_costs = defaultdict(float)
+        for record in records:
+            daily_costs[record.date.strftime("%m-%d")] += record.cost
+        
+        self.daily_costs = dict(daily_costs)
+        self.total_cost = sum(daily_costs.values())
+        self.session_count = len(daily_costs)
+        self.active_sessions = 0
+        return True
+    
+    async def analyze_daily_costs(self):
         """分析每日花費並生成圖表數據"""
+        if self.use_native_reader and self.usage_reader.has_projects_dir():
+            try:
+                return self.analyze_native_daily_costs()
+            except Exception as e:
+                if self.debug_mode:
+                    print(f"內建讀取器錯誤: {type(e).__name__}: {e}")
+        
+        if self.use_json_output:
+            try:
+                if await self.analyze_daily_costs_json():
+                    return True
+            except Exception as e:
+                if self.debug_mode:
+                    print(f"ccusage JSON 解析錯誤: {type(e).__name__}: {e}")
+        
         try:
-            # 尋找 npx 路徑
-            npx_path = self.find_npx_path()
-            if not npx_path:
-                return False
-                
-            # 設置環境變量
-            env = os.environ.copy()
-            env['PATH'] = f"/usr/local/bin:/usr/bin:/bin:/usr/sbin:/sbin:{env.get('PATH', '')}"
-            
             # 使用 ccusage daily 命令來獲取每日費用，使用 calculate 模式確保準確性
-            result = subprocess.run([npx_path, '--yes', 'ccusage@latest', 'daily', '--mode', 'calculate', '--order', 'asc'], 
-                                  capture_output=True, text=True, timeout=60, env=env)
+            result = await self.ccusage.run_cached(['daily', '--mode', 'calculate', '--order', 'asc'], timeout=60)
             
-            if result.returncode != 0:
+            if result is None or result.returncode != 0:
                 return False
             
             output = result.stdout
-            lines = output.split('\n')
             
-            daily_costs = defaultdict(float)
+            started = time.perf_counter()
+            daily_costs = self.parse_daily_table(output)
+            self.parse_times['daily_table'] = time.perf_counter() - started
             session_count = 0
             active_sessions = 0
             
-            # 解析 daily 命令的輸出格式
-            # 格式範例: │ 2025     │ - opus-4        │    9,760 │  170,645 │ 11,697,588 │ 153,763,… │ 165,641,8… │   $460.77 │
-            for line in lines:
-                if '│' in line and not ('Date' in line or 'Total' in line or '─' in line or '═' in line):
-                    parts = line.split('│')
-                    if len(parts) >= 9:  # daily 格式有9個欄位
-                        date_str = self.clean_ansi_codes(parts[1])
-                        cost_str = self.clean_ansi_codes(parts[8])
-                        
-                        # 解析日期 (格式: 2025 06-21)
-                        date_match = re.search(r'(\d{4})\s+(\d{2}-\d{2})', date_str)
-                        if not date_match:
-                            # 嘗試其他格式
-                            date_match = re.search(r'(\d{2}-\d{2})', date_str)
-                        
-                        # 解析費用
-                        cost_match = re.search(r'\$?(\d+\.?\d*)', cost_str)
-                        
-                        if date_match and cost_match:
-                            if date_match.lastindex == 2:
-                                # 格式: 2025 06-21
-                                month_day = date_match.group(2)
-                            else:
-                                # 格式: 06-21
-                                month_day = date_match.group(1)
-                            
-                            cost_value = float(cost_match.group(1))
-                            daily_costs[month_day] = cost_value
-            
             # 如果 daily 命令沒有返回數據，使用 blocks 命令作為備用
             if not daily_costs:
-                result = subprocess.run([npx_path, '--yes', 'ccusage@latest', 'blocks', '--mode', 'calculate'], 
-                                      capture_output=True, text=True, timeout=60, env=env)
+                result = await self.ccusage.run_cached(['blocks', '--mode', 'calculate'], timeout=60)
                 
-                if result.returncode == 0:
+                if result is not None and result.returncode == 0:
                     output = result.stdout
                     lines = output.split('\n')
                     
@@ -456,27 +799,31 @@ class NetworkMonitor:
             # analyze_daily_costs 失敗不影響主功能，只是沒有圖表顯示
             return False
     
-    def create_bar_chart(self, width=40):
-        """創建美觀的長條圖表"""
-        if not self.daily_costs:
-            return ["  📊 暫無歷史數據"]
-        
-        # 獲取最近7天的數據並按日期排序
-        all_dates = sorted(self.daily_costs.keys())
-        sorted_dates = all_dates[-7:] if len(all_dates) >= 7 else all_dates
-        
-        if not sorted_dates:
-            return ["  📊 暫無歷史數據"]
+    def create_bar_chart(self, range_name=None, level=None):
+        """從彙總索引創建所選範圍和粒度的長條圖表"""
+        days, default_level = RANGES[range_name or self.chart_range]
+        level = level or self.chart_level or default_level
+        if not self.rollup.has_level(level):
+            level = default_level
+        buckets = self.rollup.query(days, level)
+        if not any(cost for _, cost, _ in buckets):
+            return [f"  📊 最近 {days} 天暫無數據 (按 1-4 切換範圍)"]
         
         chart_lines = []
-        chart_lines.append("  📊 歷史帳單統計 (最近7天)")
+        chart_lines.append(f"  📊 最近 {days} 天 · {LEVEL_NAMES[level]}  (按 1-4 切換範圍，g 切換粒度)")
         chart_lines.append("  " + "─" * 48)
         
-        max_cost = max(self.daily_costs[date] for date in sorted_dates)
+        hidden = buckets[:-MAX_CHART_ROWS]
+        buckets = buckets[-MAX_CHART_ROWS:]
+        if hidden:
+            chart_lines.append(f"  … 較早的 {len(hidden)} 個時段合計 ${sum(cost for _, cost, _ in hidden):.2f}")
         
-        for date in sorted_dates:
-            cost = self.daily_costs[date]
-            
+        max_cost = max(cost for _, cost, _ in buckets)
+        label_width = max(display_width(label) for label, _, _ in buckets)
+        # 金額級別按每個桶包含的天數縮放
+        scale = {'hour': 1 / 24, 'day': 1, 'week': 7, 'month': 30}[level]
+        
+        for label, cost, _ in buckets:
             # 計算長條長度
             if max_cost > 0:
                 bar_length = int((cost / max_cost) * 25)
@@ -484,13 +831,13 @@ class NetworkMonitor:
                 bar_length = 0
             
             # 根據金額選擇顏色和圖標
-            if cost >= 50:
+            if cost >= 50 * scale:
                 bar_chars = "█"  # 實心方塊
                 cost_indicator = "💸"  # 高消費
-            elif cost >= 30:
+            elif cost >= 30 * scale:
                 bar_chars = "▓"  # 深色方塊
                 cost_indicator = "💵"  # 中高消費
-            elif cost >= 10:
+            elif cost >= 10 * scale:
                 bar_chars = "▒"  # 中等方塊
                 cost_indicator = "💰"  # 中等消費
             elif cost > 0:
@@ -504,13 +851,14 @@ class NetworkMonitor:
             bar = bar_chars * max(1, bar_length) if bar_length > 0 else "·"
             
             # 格式化輸出
-            chart_lines.append(f"  {cost_indicator} {date}: {bar:<25} ${cost:>7.2f}")
+            chart_lines.append(f"  {cost_indicator} {label}{' ' * (label_width - display_width(label))}: {bar:<25} ${cost:>7.2f}")
         
         chart_lines.append("  " + "─" * 48)
         
         # 添加統計信息
-        avg_cost = self.total_cost / len(self.daily_costs) if self.daily_costs else 0
-        chart_lines.append(f"  💳 總計: ${self.total_cost:>7.2f}  |  📊 平均: ${avg_cost:>7.2f}/天")
+        range_total = self.rollup.total(days)
+        chart_lines.append(f"  💳 範圍合計: ${range_total:>7.2f}  |  📊 平均: ${range_total / days:>7.2f}/天")
+        chart_lines.append(f"  🧾 歷史總計: ${self.total_cost:>7.2f}")
         
         # 添加會話統計
         if self.session_count > 0:
@@ -518,83 +866,146 @@ class NetworkMonitor:
         
         return chart_lines
     
-    def show_notification(self, message):
-        system = platform.system().lower()
-        try:
-            if system == 'darwin':  # macOS
-                subprocess.run([
-                    'osascript', '-e', 
-                    f'display notification "{message}" with title "Claude Code 監測器" sound name "Glass"'
-                ])
-            elif system == 'linux':
-                subprocess.run(['notify-send', 'Claude Code 監測器', message])
-            elif system == 'windows':
-                subprocess.run(['msg', '*', message])
-        except:
-            print(f"🔔 系統提醒: {message}")
+    def set_chart_range(self, range_name=None, next_level=False):
+        """切換圖表範圍，或切換到下一個粒度 (跳過桶數過多或沒有數據的粒度)"""
+        if range_name:
+            self.chart_range = range_name
+            self.chart_level = None
+        if next_level:
+            days, default_level = RANGES[self.chart_range]
+            current = self.chart_level or default_level
+            candidates = []
+            for level in LEVELS:
+                first, last = self.rollup.bucket_range(days, level)
+                if self.rollup.has_level(level) and last - first < MAX_CHART_BUCKETS:
+                    candidates.append(level)
+            if candidates:
+                position = candidates.index(current) + 1 if current in candidates else 0
+                self.chart_level = candidates[position % len(candidates)]
+    
+    def set_prices(self, table):
+        """改用另一個價格表，按 Token 重新計算全部歷史費用"""
+        self.usage_reader.recompute_costs(table)
+        self.update_rollup()
+        self.save_checkpoint()
+    
+    def update_rollup(self):
+        """更新圖表使用的彙總索引: 內建讀取器按小時增量更新，其他數據來源從每日花費重建"""
+        if not self.connect_url and self.use_native_reader and self.usage_reader.hourly:
+            self.rollup.sync(self.usage_reader)
+        elif self.rollup_source is not self.daily_costs:
+            self.rollup = RollupIndex.from_daily_costs(self.daily_costs)
+            self.rollup_source = self.daily_costs
+    
+    def notify(self, message, kind='network'):
+        """交給通知線程發送，不阻塞顯示；短時間內的多次狀態變化合併成一個通知"""
+        self.notifier.post(kind, message)
+    
+    def format_ms(self, value):
+        return f"{value:.0f}ms" if value is not None else "--"
+    
+    def get_latency_summaries(self):
+        """返回 Ping 和 HTTP 的延遲統計 (客戶端模式下使用監測服務的數據)"""
+        if self.connect_url and self.remote_latency_stats:
+            return self.remote_latency_stats
+        return {'ping': self.ping_stats.summary(), 'http': self.http_stats.summary()}
+    
+    def get_http_phases(self):
+        """返回最近一次 HTTP 探測的各階段耗時"""
+        if self.connect_url:
+            return (self.remote_network or {}).get('http_phases')
+        return self.http_phases
     
-    def clear_screen(self):
-        # 使用標準 clear 命令
-        os.system('clear' if platform.system() != 'Windows' else 'cls')
+    def enable_diagnostics(self, show_panel=True):
+        """開始記錄每個階段的耗時，show_panel 為 True 時在介面中顯示診斷面板"""
+        self.timings = StageTimings()
+        self.show_diagnostics = show_panel
+    
+    def get_stage_timings(self):
+        """返回各階段的耗時統計 (客戶端模式下合併監測服務的探測耗時)"""
+        timings = dict(self.remote_stage_timings or {}) if self.connect_url else {}
+        if self.timings is not None:
+            timings.update(self.timings.summary())
+        return timings
+    
+    def get_target_statuses(self):
+        """返回所有監測目標的狀態 (客戶端模式下使用監測服務的數據)"""
+        if self.connect_url:
+            return self.remote_targets or []
+        return self.targets.status()
     
     def format_line(self, content, width=50):
         """輔助函數: 格式化一行內容以確保寬度一致"""
         # 計算實際顯示寬度（考慮 emoji 和中文）
-        display_len = 0
-        for char in content:
-            if ord(char) > 0x1F000:  # Emoji 範圍
-                display_len += 2
-            elif ord(char) > 0x4E00:  # 中文範圍
-                display_len += 2
-            else:
-                display_len += 1
-        
-        padding_needed = width - display_len
+        padding_needed = width - display_width(content)
         return content + ' ' * max(0, padding_needed)
     
-    def display_status(self, connected, speed, latency, current_time):
-        self.clear_screen()
+    def build_frame(self, connected, speed, latency, current_time):
+        """在記憶體中構建整個畫面，返回每一行的列表"""
+        lines = []
         
         # 使用簡潔的設計
-        print("\n" + "=" * 54)
-        print("         Claude Code 網絡監測器 v2.0")
-        print("=" * 54)
-        print()
+        lines.append("\n" + "=" * 54)
+        lines.append("         Claude Code 網絡監測器 v2.0")
+        lines.append("=" * 54)
+        lines.append("")
         
         # 網絡狀態
-        print("[🌐 網絡連接狀態]")
-        if connected:
-            # 根據延遲選擇顏色圖標
-            try:
-                latency_ms = float(latency.replace('ms', ''))
-                if latency_ms < 50:
-                    latency_icon = "🟢"
-                elif latency_ms < 150:
-                    latency_icon = "🟡"
-                else:
-                    latency_icon = "🔴"
-            except:
-                latency_icon = "🟢"
-                
-            print(f"  🟢 狀態: 已連接")
-            print(f"  🚀 網速: {speed}")
-            print(f"  {latency_icon} 延遲: {latency}")
+        lines.append("[🌐 網絡連接狀態]")
+        if connected is None:
+            lines.append("  🟡 狀態: 檢測中...")
+        elif connected:
+            lines.append(f"  🟢 狀態: 已連接")
+            lines.append(f"  🚀 網速: {speed}")
         else:
-            print("  🔴 狀態: 連接失敗")
-            print("  💔 無法連接到網絡")
+            lines.append("  🔴 狀態: 連接失敗")
+            lines.append("  💔 無法連接到網絡")
+        
+        # 延遲統計: 根據最近一段時間的 p95 和丟包率而不是最新一個樣本
+        stats = self.get_latency_summaries()
+        ping = stats['ping']
+        if ping['count']:
+            if ping['p95'] is None or ping['loss_rate'] >= 0.2 or ping['p95'] >= 150:
+                latency_icon = "🔴"
+            elif ping['loss_rate'] > 0 or ping['p95'] >= 50:
+                latency_icon = "🟡"
+            else:
+                latency_icon = "🟢"
+            lines.append(f"  {latency_icon} 延遲: p50 {self.format_ms(ping['p50'])} | "
+                         f"p95 {self.format_ms(ping['p95'])} | p99 {self.format_ms(ping['p99'])}")
+            lines.append(f"  📶 抖動: {self.format_ms(ping['jitter'])} | 丟包: {ping['loss_rate'] * 100:.1f}% "
+                         f"({ping['count']} 個樣本)")
+        http = stats['http']
+        if http['count']:
+            lines.append(f"  🌍 HTTP: p50 {self.format_ms(http['p50'])} | p95 {self.format_ms(http['p95'])} | "
+                         f"失敗: {http['loss_rate'] * 100:.1f}%")
+        phases = self.get_http_phases()
+        if phases and phases.get('ok'):
+            if phases.get('reused'):
+                lines.append(f"  🔬 重用連接 | 首字節 {self.format_ms(phases['ttfb'])}")
+            else:
+                lines.append(f"  🔬 DNS {self.format_ms(phases['dns'])} | 連接 {self.format_ms(phases['connect'])} | "
+                             f"TLS {self.format_ms(phases['tls'])} | 首字節 {self.format_ms(phases['ttfb'])}")
         
-        print("\n[🤖 Claude Code 使用狀態]")
+        # 其他監測目標: 問題目標排在前面，目標很多時只列出一部分
+        targets = self.get_target_statuses()
+        if targets:
+            healthy = sum(1 for target in targets if target['state'] == 'ok')
+            lines.append(f"\n[🎯 監測目標] {healthy}/{len(targets)} 正常")
+            lines.extend(format_table(targets))
+        
+        lines.append("\n[🤖 Claude Code 使用狀態]")
         
         # 對話開始時間
         if self.ccusage_data['latest_session'] != '--':
-            print(f"  📅 對話開始: {self.ccusage_data['latest_session']}")
+            lines.append(f"  📅 對話開始: {self.ccusage_data['latest_session']}")
         else:
-            print("  📅 對話開始: --")
+            lines.append("  📅 對話開始: --")
         
         # 時間信息
         if self.ccusage_data['session_start'] != '--':
-            print(f"  ⏱️  時間: {self.ccusage_data['session_start']} → {self.ccusage_data['session_end']} (重置)")
-            print(f"  ⏰ 剩餘: {self.ccusage_data['remaining_time']}")
+            lines.append(f"  ⏱️  時間: {self.ccusage_data['session_start']} → {self.ccusage_data['session_end']} (重置)")
+            lines.append(f"  ⏰ 剩餘: {self.current_remaining_time()}")
         
         # Token 和費用
         if self.ccusage_data['tokens'] != '--':
@@ -604,12 +1015,28 @@ class NetworkMonitor:
             except:
                 formatted_tokens = self.ccusage_data['tokens']
                 
-            print(f"  🎫 Tokens: {formatted_tokens}")
-            print(f"  💰 費用: {self.ccusage_data['cost']}")
+            lines.append(f"  🎫 Tokens: {formatted_tokens}")
+            lines.append(f"  💰 費用: {self.ccusage_data['cost']}")
+        
+        # 消耗速度和區塊結束時的預測
+        burn = self.get_burn_projection()
+        if burn:
+            lines.append(f"  🔥 速度: {burn['tokens_per_minute']:,.0f} Tokens/分 | ${burn['cost_per_hour']:.2f}/時")
+            lines.append(f"  📈 預計: {burn['projected_tokens']:,} Tokens | ${burn['projected_cost']:.2f} (區塊結束時)")
+            for budget in burn['budgets']:
+                limit = (f"${budget['limit']:.2f}" if budget['kind'] == 'cost'
+                         else f"{budget['limit']:,.0f} Tokens")
+                if budget['exceeded']:
+                    forecast = "已用完"
+                elif budget['hit_time'] is None:
+                    forecast = "本區塊內不會用完"
+                else:
+                    forecast = f"預計 {datetime.fromtimestamp(budget['hit_time']).strftime('%H:%M')} 用完"
+                lines.append(f"  🎯 預算 {limit}: {forecast}")
         
         # 模型信息
         if self.ccusage_data['model'] != '--':
-            print(f"  🤖 模型: {self.ccusage_data['model']}")
+            lines.append(f"  🤖 模型: {self.ccusage_data['model']}")
         
         # 狀態
         status_text = {
@@ -619,93 +1046,456 @@ class NetworkMonitor:
             '--': '⏸️  未活動'
         }
         current_status = status_text.get(self.ccusage_data['status'], f"❓ {self.ccusage_data['status']}")
-        print(f"  📍 狀態: {current_status}")
+        lines.append(f"  📍 狀態: {current_status}")
+        backfill = self.get_backfill_progress()
+        if backfill:
+            done, total, workers = backfill
+            lines.append(f"  ⏳ 正在彙總歷史記錄: {done * 100 // max(total, 1)}% "
+                         f"({done / 1024 / 1024:.0f}/{total / 1024 / 1024:.0f} MB，{workers} 個進程)")
         
         # 歷史帳單
-        print("\n[📊 歷史帳單統計 (基於 Token 計算)]")
-        if self.daily_costs:
-            # 獲取最近7天的數據
-            all_dates = sorted(self.daily_costs.keys())
-            recent_dates = all_dates[-7:] if len(all_dates) >= 7 else all_dates
-            
-            for date in recent_dates:
-                cost = self.daily_costs[date]
-                # 根據金額選擇顯示符號
-                if cost >= 50:
-                    indicator = "💸"  # 高消費
-                elif cost >= 30:
-                    indicator = "💵"  # 中高消費  
-                elif cost >= 10:
-                    indicator = "💰"  # 中等消費
-                else:
-                    indicator = "💲"  # 低消費
-                    
-                # 簡單的長條圖
-                bar_length = int((cost / 100) * 20) if cost < 100 else 20
-                bar = "█" * bar_length if bar_length > 0 else "│"
-                
-                print(f"  {indicator} {date}: {bar} ${cost:.2f}")
-            
-            # 統計信息
-            avg_cost = self.total_cost / len(self.daily_costs) if self.daily_costs else 0
-            print(f"\n  💳 總計: ${self.total_cost:.2f}")
-            print(f"  📊 平均: ${avg_cost:.2f}/天")
-            
-            if self.session_count > 0:
-                print(f"  🔢 總會話數: {self.session_count}")
-                print(f"  ⚡ 活躍會話: {self.active_sessions}")
-        else:
-            print("  暫無歷史數據")
+        lines.append("\n[📊 歷史帳單統計 (基於 Token 計算)]")
+        lines.extend(self.create_bar_chart())
+        
+        if self.show_diagnostics:
+            lines.append("\n[🩺 診斷: 各階段耗時 (毫秒)]")
+            lines.append(f"  {'階段':<14}{'最近':>7}{'p50':>9}{'p95':>9}{'最大':>7}")
+            for stage, stats in sorted(self.get_stage_timings().items()):
+                values = [f"{stats[key]:.1f}" if stats[key] is not None else "--"
+                          for key in ('last', 'p50', 'p95', 'max')]
+                lines.append(f"  {stage[:16]:<16}{values[0]:>9}{values[1]:>9}{values[2]:>9}{values[3]:>9}")
+            renderer = self.renderer
+            lines.append(f"  渲染: 平均 {renderer.average_render_ms():.2f}ms | 最大 {renderer.max_render_ms:.2f}ms | "
+                         f"超出 {renderer.budget_ms:g}ms 預算 {renderer.over_budget}/{renderer.frame_count} 幀 | "
+                         f"上一幀重寫 {renderer.last_changed_lines} 行")
         
-        print(f"\n🕐 最後更新: {current_time}")
-        print("\n🔗 GitHub: https://github.com/vincequant/claude-code-monitor")
-        print("\n按 Ctrl+C 停止監控")
-        print("=" * 54)
+        lines.append(f"\n🕐 最後更新: {current_time}  |  🖥️  渲染: {self.renderer.last_render_ms:.2f}ms")
+        intervals = self.get_probe_intervals()
+        if intervals:
+            labels = (('ping', 'Ping'), ('http', 'HTTP'), ('blocks', '對話'), ('daily', '帳單'))
+            watch_mode = self.get_watch_mode()
+            backed_off = any(intervals.get(name, 0) > self.probe_intervals[name] for name, _ in labels[:2])
+            if not watch_mode:
+                backed_off = backed_off or intervals.get('blocks', 0) > self.probe_intervals['blocks']
+            parts = [f"{label} {intervals[name]:g}秒" for name, label in labels if name in intervals]
+            if watch_mode:
+                parts.append(f"記錄監視: {watch_mode}")
+            lines.append("🔄 探測間隔: " + " | ".join(parts) + (" (空閒退避中)" if backed_off else ""))
+        if self.connect_url:
+            lines.append(f"📡 數據來源: {self.connect_url}")
+        lines.append("\n🔗 GitHub: https://github.com/vincequant/claude-code-monitor")
+        lines.append("\n按 Ctrl+C 停止監控")
+        lines.append("=" * 54)
+        return '\n'.join(lines).split('\n')
     
-    def monitor_loop(self):
-        while self.is_monitoring:
+    def display_status(self, connected, speed, latency, current_time):
+        # 整幀構建後只重寫有變化的行，一次寫入終端
+        self.renderer.render(self.build_frame(connected, speed, latency, current_time))
+    
+    async def refresh_blocks(self):
+        """blocks 探測: 更新當前對話，對話開始活躍時喚醒其他探測"""
+        result = await self.get_ccusage_info()
+        self.update_rollup()
+        self.update_activity()
+        return result
+    
+    async def refresh_daily(self):
+        """daily 探測: 更新每日花費並保存檢查點"""
+        result = await self.analyze_daily_costs()
+        self.update_rollup()
+        self.save_checkpoint()
+        return result
+    
+    def create_scheduler(self):
+        """為每個探測註冊獨立的刷新間隔和超時，ping、HTTP 和 blocks 空閒時逐步退避"""
+        scheduler = ProbeScheduler(self.timings)
+        for name, func in (('ping', self.ping_google), ('http', self.check_connection),
+                           ('blocks', self.refresh_blocks)):
+            interval = AdaptiveInterval(self.probe_intervals[name], self.max_probe_interval, self.is_busy)
+            if name == 'blocks' and self.watcher:
+                # 用量由目錄監視觸發刷新，剩餘時間在渲染時計算，定時運行只為發現區塊結束
+                interval = max(self.probe_intervals['blocks'], self.max_probe_interval)
+            scheduler.add(name, func, interval, self.probe_timeouts[name])
+        scheduler.add('daily', self.refresh_daily, self.probe_intervals['daily'], self.probe_timeouts['daily'])
+        # 定期檢查 ccusage 新版本 (只在實際使用 ccusage 時才會查詢)
+        scheduler.add('ccusage_update', self.ccusage.maybe_update, 3600, self.probe_timeouts['ccusage_update'])
+        return scheduler
+    
+    def uses_ccusage(self):
+        """內建讀取器不可用時才需要運行 ccusage"""
+        return not (self.use_native_reader and self.usage_reader.has_projects_dir())
+    
+    def get_network_state(self):
+        """返回 (connected, speed, latency)，探測尚未完成時 connected 為 None"""
+        if self.connect_url:
+            network = self.remote_network or {}
+            return network.get('connected'), network.get('speed'), network.get('latency')
+        
+        ping_result = self.scheduler.get('ping') if self.scheduler else None
+        conn_result = self.scheduler.get('http') if self.scheduler else None
+        if ping_result is None or conn_result is None:
+            # 探測尚未完成第一輪
+            return None, None, None
+        ping_success, latency = ping_result
+        conn_success, speed, _ = conn_result
+        return ping_success and conn_success, speed, latency
+    
+    def get_status(self):
+        """返回當前完整狀態，供監測服務輸出 JSON 和 Prometheus 指標"""
+        connected, speed, latency = self.get_network_state()
+        conn_result = self.scheduler.get('http') if self.scheduler else None
+        
+        def to_number(text, cast):
             try:
-                ping_success, latency = self.ping_google()
-                conn_success, speed, _ = self.check_connection()
-                ccusage_success = self.get_ccusage_info()
-                self.analyze_daily_costs()
-                
-                connected = ping_success and conn_success
-                current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                
-                self.display_status(connected, speed or "--", latency or "--", current_time)
-                
-                if not connected and self.last_status != False:
-                    self.show_notification("🚨 網絡連接中斷")
-                elif connected and self.last_status == False:
-                    self.show_notification("🎉 網絡連接已恢復")
+                return cast(str(text).replace(',', '').replace('$', ''))
+            except ValueError:
+                return None
+        
+        ccusage_data = dict(self.ccusage_data, remaining_time=self.current_remaining_time())
+        status = {
+            'time': time.time(),
+            'network': {
+                'connected': connected,
+                'speed': speed,
+                'latency': latency,
+                'latency_ms': to_number((latency or '').replace('ms', ''), float) if latency else None,
+                'response_ms': conn_result[2] if conn_result else None,
+                'http_phases': self.get_http_phases()
+            },
+            'ccusage_data': ccusage_data,
+            'session': {
+                'tokens': to_number(ccusage_data['tokens'], int),
+                'cost': to_number(ccusage_data['cost'], float),
+                'active': ccusage_data['status'] == 'ACTIVE'
+            },
+            'burn_rate': self.get_burn_projection(),
+            'latency_stats': self.get_latency_summaries(),
+            'targets': self.targets.status(),
+            'stage_timings': self.timings.summary() if self.timings is not None else {},
+            'probe_intervals': self.get_probe_intervals(),
+            'usage_watch': self.get_watch_mode(),
+            'backfill': self.get_backfill_progress(),
+            'notifications': self.notifier.stats(),
+            'daily_costs': dict(self.daily_costs),
+            'total_cost': self.total_cost,
+            'session_count': self.session_count,
+            'active_sessions': self.active_sessions,
+            'probes': {
+                name: {'duration': result['duration'], 'time': result['time'], 'error': result['error']}
+                for name, result in (self.scheduler.snapshot() if self.scheduler else {}).items()
+            }
+        }
+        return status
+    
+    def apply_status(self, status):
+        """使用監測服務返回的狀態更新顯示數據"""
+        self.remote_network = status.get('network', {})
+        self.remote_latency_stats = status.get('latency_stats')
+        self.remote_targets = status.get('targets')
+        self.remote_stage_timings = status.get('stage_timings')
+        self.remote_intervals = status.get('probe_intervals')
+        self.remote_watch_mode = status.get('usage_watch')
+        self.remote_backfill = status.get('backfill')
+        self.remote_burn_rate = status.get('burn_rate')
+        self.ccusage_data.update(status.get('ccusage_data', {}))
+        self.daily_costs = status.get('daily_costs', {})
+        self.total_cost = status.get('total_cost', 0)
+        self.session_count = status.get('session_count', 0)
+        self.active_sessions = status.get('active_sessions', 0)
+        self.update_rollup()
+    
+    def start_local_probes(self):
+        self.start_backfill()
+        self.start_watcher()
+        if self.record_history and self.history is None:
+            self.history = HistoryLog('monitor')
+        self.scheduler = self.create_scheduler()
+        self.targets.register(self.scheduler, self.history)
+        self.scheduler.start()
+    
+    async def stop_local_probes(self):
+        """取消所有探測和後台任務，等待 ccusage 子進程結束"""
+        if self.watcher:
+            self.watcher.stop()
+        if self.scheduler:
+            await self.scheduler.stop()
+        await self.ccusage.snapshots.close()
+        for task in list(self.background_tasks):
+            task.cancel()
+        await asyncio.gather(*self.background_tasks, return_exceptions=True)
+        self.http_probe.close()
+        self.targets.close()
+        if self.history is not None:
+            self.history.close()
+            self.history = None
+    
+    def install_signal_handlers(self):
+        """Ctrl+C 和 SIGTERM 只設置停止事件，由事件循環完成清理"""
+        self.stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                # Windows 不支持，仍由 KeyboardInterrupt 結束
+                pass
+    
+    async def wait_for_stop(self, timeout=None):
+        """等待 timeout 秒，收到停止信號時提前返回 True"""
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.stop_event.is_set()
+    
+    def redraw(self):
+        connected, speed, latency = self.get_network_state()
+        self.display_status(connected, speed or "--", latency or "--", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    
+    def handle_keys(self):
+        """讀取按鍵: 1-4 切換圖表範圍，g 切換粒度，切換後立即重繪"""
+        fd = sys.stdin.fileno()
+        try:
+            keys = os.read(fd, 32).decode('utf-8', errors='ignore')
+        except OSError:
+            return
+        if not keys:
+            # 標準輸入已關閉
+            asyncio.get_running_loop().remove_reader(fd)
+            return
+        ranges = list(RANGES)
+        changed = False
+        for key in keys:
+            if key in '1234':
+                self.set_chart_range(ranges[int(key) - 1])
+                changed = True
+            elif key in 'gG':
+                self.set_chart_range(next_level=True)
+                changed = True
+        if changed:
+            self.redraw()
+    
+    def enable_keys(self):
+        """終端為互動模式時以 cbreak 模式接收按鍵 (Ctrl+C 照常生效)，返回恢復終端設置的函數"""
+        if not sys.stdin.isatty():
+            return None
+        try:
+            import termios
+            import tty
+        except ImportError:
+            # Windows 不支持
+            return None
+        fd = sys.stdin.fileno()
+        saved = termios.tcgetattr(fd)
+        tty.setcbreak(fd)
+        loop = asyncio.get_running_loop()
+        loop.add_reader(fd, self.handle_keys)
+        
+        def restore():
+            loop.remove_reader(fd)
+            termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+        return restore
+    
+    async def run_monitor(self):
+        """顯示循環: 探測、渲染和通知都在同一個事件循環中運行"""
+        self.install_signal_handlers()
+        if not self.connect_url:
+            self.start_local_probes()
+        restore_keys = self.enable_keys()
+        timings = self.timings
+        ticks = 0
+        try:
+            while self.is_monitoring:
+                if timings is not None:
+                    tick_started = time.perf_counter()
+                try:
+                    if self.connect_url:
+                        status = await fetch_status_async(self.connect_url)
+                        if timings is not None:
+                            timings.record('fetch', (time.perf_counter() - tick_started) * 1000)
+                        if status is None:
+                            # 監測服務已停止，改為本機探測
+                            self.connect_url = None
+                            self.start_local_probes()
+                        else:
+                            self.apply_status(status)
+                    
+                    connected, speed, latency = self.get_network_state()
+                    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    
+                    if timings is not None:
+                        render_started = time.perf_counter()
+                    self.display_status(connected, speed or "--", latency or "--", current_time)
+                    if timings is not None:
+                        timings.record('render', (time.perf_counter() - render_started) * 1000)
+                    
+                    if connected is not None:
+                        if not connected and self.last_status != False:
+                            self.notify("🚨 網絡連接中斷")
+                        elif connected and self.last_status == False:
+                            self.notify("🎉 網絡連接已恢復")
+                        
+                        self.last_status = connected
+                    
+                except Exception as e:
+                    print(f"監測錯誤: {e}")
                 
-                self.last_status = connected
+                if timings is not None:
+                    timings.record('tick', (time.perf_counter() - tick_started) * 1000)
+                ticks += 1
+                if self.max_ticks and ticks >= self.max_ticks:
+                    break
                 
-            except Exception as e:
-                print(f"監測錯誤: {e}")
-            
-            # 每3秒刷新一次
-            time.sleep(3)
+                # 顯示只讀取最新結果，不等待任何探測
+                if await self.wait_for_stop(self.render_interval):
+                    break
+        finally:
+            if restore_keys:
+                restore_keys()
+            await self.stop_local_probes()
+            self.notifier.close(flush=False)
+    
+    def monitor_loop(self):
+        asyncio.run(self.run_monitor())
+    
+    async def run_service(self, host, port):
+        self.install_signal_handlers()
+        server = MetricsServer(self.get_status, host, port)
+        await server.start()
+        self.start_local_probes()
+        print(f"🛰️  Claude Code 監測服務運行於 {server.url}")
+        print(f"   狀態: {server.url}/status.json")
+        print(f"   指標: {server.url}/metrics")
+        print("按 Ctrl+C 停止服務")
+        try:
+            await self.stop_event.wait()
+        finally:
+            await server.stop()
+            await self.stop_local_probes()
+    
+    def run_daemon(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """無介面模式: 只運行一組探測，並在本機提供狀態服務"""
+        if self.uses_ccusage():
+            # 在事件循環外完成 ccusage 的首次解析 (可能需要通過 npx 安裝)
+            self.ccusage.resolve()
+        try:
+            asyncio.run(self.run_service(host, port))
+        except KeyboardInterrupt:
+            pass
+        self.is_monitoring = False
+        print("\n🌙 監測服務已關閉")
     
     def start(self):
         print("\n🚀 Claude Code 監測器 v2.0 啟動中...")
         print("🔍 正在檢查網絡和 Claude 狀態...")
         print("🔄 具備自動更新 ccusage 功能")
         print("📊 包含歷史帳單統計功能 (使用 Token 計算模式)")
-        print("💡 費用計算採用 ccusage --mode calculate 確保準確性")
-        print("🔄 刷新頻率: 3秒")
+        if self.connect_url or self.uses_ccusage():
+            print("💡 費用計算採用 ccusage --mode calculate 確保準確性")
+        else:
+            print(f"💲 費用按本機價格表計算 (版本 {self.usage_reader.prices.version})，不需要網絡")
+        print(f"🔄 刷新頻率: 顯示 {self.render_interval}秒 | Ping {self.probe_intervals['ping']}秒 | "
+              f"HTTP {self.probe_intervals['http']}秒 | 對話 {self.probe_intervals['blocks']}秒 | "
+              f"帳單 {self.probe_intervals['daily']}秒 (空閒時最長 {self.max_probe_interval}秒)")
+        if self.targets.targets:
+            print(f"🎯 監測目標: {len(self.targets.targets)} 個 (並行上限 {self.targets.concurrency})")
+        if self.connect_url:
+            print(f"📡 使用監測服務的數據: {self.connect_url}")
+        elif self.uses_ccusage():
+            overhead = self.ccusage.measure_startup()
+            if overhead is not None:
+                print(f"⚙️  ccusage {self.ccusage.version or ''}: {self.ccusage.command_prefix()[0]}")
+                print(f"⏱️  每次調用 ccusage 的啟動開銷: {overhead:.0f}ms")
         print("✅ 準備就緒，開始監測\n")
         time.sleep(2)
         
         try:
             self.monitor_loop()
         except KeyboardInterrupt:
-            print("\n\n👋 Claude Code 監測器已停止")
-            print("🌙 監測服務已關閉")
-            self.is_monitoring = False
+            pass
+        self.renderer.close()
+        print("\n\n👋 Claude Code 監測器已停止")
+        print("🌙 監測服務已關閉")
+        self.is_monitoring = False
 
 
-if __name__ == "__main__":
+def main():
+    parser = argparse.ArgumentParser(description="Claude Code 網絡監測器")
+    parser.add_argument('--daemon', action='store_true', help="無介面運行，在本機提供 /status.json 和 /metrics")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"監測服務地址 (預設 {DEFAULT_HOST})")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"監測服務端口 (預設 {DEFAULT_PORT})")
+    parser.add_argument('--connect', metavar='URL', help="連接到指定的監測服務，只顯示不探測")
+    parser.add_argument('--standalone', action='store_true', help="不連接監測服務，自行探測")
+    parser.add_argument('--targets', default=DEFAULT_CONFIG, help="監測目標設定檔 (預設為程式目錄下的 targets.json)")
+    parser.add_argument('--max-interval', type=float, default=60,
+                        help="空閒時 Ping、HTTP 和對話探測的最長間隔 (秒，預設 60)")
+    parser.add_argument('--range', choices=list(RANGES), default='7d', help="歷史圖表的初始範圍 (運行時按 1-4 切換)")
+    parser.add_argument('--prices', metavar='PATH', help="使用另一個價格表 (格式同 model_prices.json)")
+    parser.add_argument('--budget', type=float, metavar='USD', help="每個 5 小時區塊的費用預算，顯示預計用完的時間")
+    parser.add_argument('--token-budget', type=int, metavar='N', help="每個 5 小時區塊的 Token 預算")
+    parser.add_argument('--workers', type=int, help="首次彙總歷史記錄時使用的進程數 (預設為 CPU 核心數)")
+    parser.add_argument('--no-watch', action='store_true', help="不監視對話記錄目錄，改為定時刷新用量")
+    parser.add_argument('--notify', default='auto', metavar='BACKEND',
+                        help=f"網絡狀態變化的通知方式: {', '.join(BACKENDS)} (預設 auto)")
+    parser.add_argument('--no-history', action='store_true', help="不把探測樣本寫入歷史記錄 (見 history_log.py query)")
+    parser.add_argument('--diagnostics', action='store_true', help="記錄各階段耗時並顯示診斷面板")
+    parser.add_argument('--profile', type=int, metavar='N', help="在分析器下運行 N 個顯示周期後退出")
+    parser.add_argument('--profiler', choices=('sample', 'cprofile'), default='sample',
+                        help="sample 輸出火焰圖 folded 格式，cprofile 輸出 .pstats")
+    parser.add_argument('--profile-output', default='claude_monitor_profile', help="分析結果的檔名 (不含副檔名)")
+    args = parser.parse_args()
+    
     monitor = NetworkMonitor()
-    monitor.start()
\ No newline at end of file
+    monitor.max_probe_interval = args.max_interval
+    monitor.watch_projects = not args.no_watch
+    monitor.backfill_workers = args.workers
+    monitor.chart_range = args.range
+    monitor.cost_budget = args.budget
+    monitor.token_budget = args.token_budget
+    monitor.record_history = not args.no_history
+    try:
+        monitor.notifier = Notifier(create_backend(args.notify))
+    except ValueError as e:
+        print(f"⚠️  {e}，使用預設通知方式")
+    if args.prices:
+        try:
+            monitor.set_prices(PriceTable.load(args.prices))
+        except ValueError as e:
+            print(f"⚠️  {e}，使用預設價格表")
+    try:
+        monitor.set_targets(TargetSet.load(args.targets))
+    except ValueError as e:
+        print(f"⚠️  監測目標設定錯誤，只監測預設目標: {e}")
+    if args.diagnostics or args.profile:
+        monitor.enable_diagnostics(show_panel=not args.daemon)
+    
+    if args.profile:
+        monitor.max_ticks = args.profile
+        if args.connect:
+            monitor.connect_url = args.connect
+        elif monitor.uses_ccusage():
+            monitor.ccusage.resolve()
+        
+        def profiled_loop():
+            try:
+                monitor.monitor_loop()
+            finally:
+                monitor.renderer.close()
+        run_profiled(profiled_loop, args.profile_output, args.profiler)
+        return
+    if args.daemon:
+        monitor.run_daemon(args.host, args.port)
+        return
+    
+    if args.connect:
+        monitor.connect_url = args.connect
+    elif not args.standalone:
+        # 本機已有監測服務時直接使用其數據
+        url = f"http://{args.host}:{args.port}"
+        if fetch_status(url, timeout=0.5) is not None:
+            monitor.connect_url = url
+    monitor.start()
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+對話記錄目錄監視
+
+用量只會在 Claude Code 往對話記錄追加內容時改變。監視器在 Linux 上用
+inotify (通過 ctypes 調用 libc，不需要額外依賴) 接收檔案變化，其他系統
+或 inotify 不可用時退回定時比對檔案大小和修改時間。
+
+一連串寫入會被合併: 第一個變化後等待 debounce 秒，再通知一次並附上這段
+時間內所有變化的檔案。沒有寫入時 inotify 模式不做任何事情。
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+
+# inotify 事件 (見 <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class Inotify:
+    """最小的 inotify 封裝: 非阻塞檔案描述符、添加監視、解析事件"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        self.add_watch_func = libc.inotify_add_watch
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        wd = self.add_watch_func(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def read_events(self):
+        """讀取所有已到達的事件，返回 [(wd, mask, name)]"""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                events.append((wd, mask, os.fsdecode(name)))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ProjectsWatcher:
+    def __init__(self, dirs, on_change, debounce=0.3, poll_interval=2.0, use_inotify=True):
+        self.dirs = [path for path in dirs if os.path.isdir(path)]
+        self.on_change = on_change      # 合併後的變化到達時調用 (無參數)
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and sys.platform.startswith('linux')
+        self.mode = None                # 'inotify' 或 'polling'
+        self.changed = set()
+        self.rescan = True              # 需要完整掃描 (啟動時、事件溢出時)
+        self.pending = None             # 等待中的合併通知
+        self.loop = None
+        self.inotify = None
+        self.watches = {}               # inotify wd -> 目錄
+        self.poll_task = None
+        self.poll_state = {}            # 輪詢模式: 路徑 -> (大小, 修改時間)
+
+    def start(self):
+        """開始監視，必須在事件循環中調用"""
+        self.loop = asyncio.get_running_loop()
+        if self.use_inotify:
+            try:
+                self.inotify = Inotify()
+                for base in self.dirs:
+                    self.watch_tree(base)
+                self.loop.add_reader(self.inotify.fd, self.handle_events)
+                self.mode = 'inotify'
+                return
+            except (OSError, AttributeError):
+                # 沒有 inotify 或超過 max_user_watches
+                self.close_inotify()
+        self.poll_state = self.scan()
+        self.poll_task = asyncio.ensure_future(self.poll())
+        self.mode = 'polling'
+
+    def stop(self):
+        if self.pending is not None:
+            self.pending.cancel()
+            self.pending = None
+        if self.inotify is not None:
+            self.loop.remove_reader(self.inotify.fd)
+            self.close_inotify()
+        if self.poll_task is not None:
+            self.poll_task.cancel()
+            self.poll_task = None
+
+    def close_inotify(self):
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+        self.watches = {}
+
+    def take_changes(self):
+        """返回上次調用後變化的檔案集合，需要完整掃描時返回 None"""
+        if self.rescan:
+            self.rescan = False
+            self.changed = set()
+            return None
+        changed, self.changed = self.changed, set()
+        return changed
+
+    def mark(self, paths=(), rescan=False):
+        """記錄變化，並在 debounce 秒後發出一次合併的通知"""
+        self.changed.update(path for path in paths if path.endswith('.jsonl'))
+        self.rescan = self.rescan or rescan
+        if (self.changed or self.rescan) and self.pending is None:
+            self.pending = self.loop.call_later(self.debounce, self.flush)
+
+    def flush(self):
+        self.pending = None
+        self.on_change()
+
+    def watch_tree(self, base):
+        """監視目錄及其所有子目錄，返回其中已存在的 JSONL 檔案"""
+        found = []
+        for root, dirs, files in os.walk(base):
+            self.watches[self.inotify.add_watch(root)] = root
+            found.extend(os.path.join(root, name) for name in files)
+        return found
+
+    def handle_events(self):
+        changed, rescan = [], False
+        for wd, mask, name in self.inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                rescan = True
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # 新目錄: 添加監視，並補上添加監視前已寫入的檔案
+                    try:
+                        changed.extend(self.watch_tree(path))
+                    except OSError:
+                        rescan = True
+            else:
+                changed.append(path)
+        self.mark(changed, rescan)
+
+    def scan(self):
+        """輪詢模式: 返回所有 JSONL 檔案的 (大小, 修改時間)"""
+        state = {}
+        for base in self.dirs:
+            for root, dirs, files in os.walk(base):
+                for name in files:
+                    if not name.endswith('.jsonl'):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    state[path] = (stat.st_size, stat.st_mtime_ns)
+        return state
+
+    async def poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            state = self.scan()
+            changed = [path for path, info in state.items() if self.poll_state.get(path) != info]
+            self.poll_state = state
+            if changed:
+                self.mark(changed)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from usage_reader import default_projects_dirs
+
+    parser = argparse.ArgumentParser(description="監視對話記錄目錄並顯示合併後的變化")
+    parser.add_argument('dirs', nargs='*', help="要監視的目錄 (預設為 Claude Code 的 projects 目錄)")
+    parser.add_argument('--polling', action='store_true', help="強制使用輪詢模式")
+    parser.add_argument('--debounce', type=float, default=0.3, help="合併寫入的等待時間 (秒)")
+    args = parser.parse_args()
+
+    async def main():
+        def report():
+            changes = watcher.take_changes()
+            stamp = time.strftime('%H:%M:%S')
+            if changes is None:
+                print(f"{stamp}  需要完整掃描")
+            for path in sorted(changes or ()):
+                print(f"{stamp}  {path}")
+
+        watcher = ProjectsWatcher(args.dirs or default_projects_dirs(), report,
+                                  debounce=args.debounce, use_inotify=not args.polling)
+        if not watcher.dirs:
+            print("❌ 找不到要監視的目錄")
+            return
+        watcher.start()
+        watcher.take_changes()
+        print(f"👀 監視 {len(watcher.dirs)} 個目錄 ({watcher.mode})，按 Ctrl+C 停止")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            watcher.stop()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
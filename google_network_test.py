@@ -1,58 +1,50 @@
 #!/usr/bin/env python3
-import os
+import argparse
 import time
-import subprocess
-import requests
 from datetime import datetime
 import sys
 import threading
-from queue import Queue
+from queue import Queue, Empty
 import io
 
+from probes import LatencyProbe, HttpProbe
+from renderer import FrameRenderer
+from targets import TargetSet, DEFAULT_PRIMARY
+from notifier import Notifier, create_backend, BACKENDS
+from history_log import HistoryLog
+
 class NetworkTester:
-    def __init__(self):
+    def __init__(self, primary=None, notifier=None, history=None):
         self.last_status = None
         self.fail_count = 0
         self.latest_ping = None
         self.latest_http = None
         self.data_queue = Queue()
-        self.first_run = True
-        
-    def clear_screen(self):
-        # 使用 ANSI escape codes 更平滑地清屏
-        print("\033[H\033[J", end='')
+        self.sample_count = 0
+        self.transition = None          # 最近一個樣本帶來的狀態變化提示
+        self.renderer = FrameRenderer()
+        self.last_content = None
+        # 探測目標可以在 targets.json 的 primary 中修改
+        primary = primary or DEFAULT_PRIMARY
+        self.latency_probe = LatencyProbe(primary['host'], primary['port'], burst=3)
+        self.http_probe = HttpProbe(primary['url'], method='HEAD')
+        # 通知在後台線程發送，網絡反覆斷開時合併成一個通知
+        self.notifier = notifier or Notifier()
+        self.history = history          # HistoryLog，設置後記錄每個樣本
         
     def ping_google(self):
-        """測試到 google.com 的延遲"""
-        try:
-            result = subprocess.run(
-                ['ping', '-c', '1', '-W', '2', 'google.com'],
-                capture_output=True,
-                text=True,
-                timeout=3
-            )
-            if result.returncode == 0:
-                for line in result.stdout.split('\n'):
-                    if 'time=' in line:
-                        latency = float(line.split('time=')[1].split(' ')[0])
-                        return latency
-            return None
-        except Exception:
+        """測試到 google.com 的延遲 (進程內探測，取一輪探測的平均值)"""
+        samples = [s for s in self.latency_probe.probe() if s is not None]
+        if not samples:
             return None
+        return sum(samples) / len(samples)
             
     def check_connection(self):
-        """測試網絡連接速度"""
-        try:
-            start_time = time.time()
-            response = requests.get('https://www.google.com', timeout=5)
-            end_time = time.time()
-            
-            if response.status_code == 200:
-                response_time = (end_time - start_time) * 1000
-                return response_time
-            return None
-        except:
-            return None
+        """測試網絡連接速度 (重用 keep-alive 連接，只發送 HEAD 請求)"""
+        result = self.http_probe.probe()
+        if result['ok']:
+            return result['total']
+        return None
             
     def get_status_icon(self, status):
         """根據狀態返回圖標"""
@@ -66,8 +58,31 @@ class NetworkTester:
             self.data_queue.put((ping_result, http_result))
             time.sleep(3)
             
+    def record_sample(self, latency, response_time):
+        """每個新樣本調用一次: 更新整體狀態和連續失敗次數，狀態變化時發送通知"""
+        self.latest_ping, self.latest_http = latency, response_time
+        if self.history is not None:
+            self.history.record('ping', latency)
+            self.history.record('http', response_time)
+        overall_status = latency is not None and response_time is not None
+        self.transition = None
+        if self.last_status is not None and self.last_status != overall_status:
+            if overall_status:
+                self.transition = "✅ 網絡已恢復正常！"
+                self.show_notification("網絡恢復", "Google 網絡連接已恢復正常")
+            else:
+                self.transition = "❌ 網絡連接異常！"
+                self.show_notification("網絡異常", "無法連接到 Google")
+        self.last_status = overall_status
+        
+        if overall_status:
+            self.fail_count = 0
+        else:
+            self.fail_count += 1
+        self.sample_count += 1
+    
     def build_display_buffer(self, current_time, latency, response_time):
-        """構建顯示緩衝區"""
+        """構建顯示緩衝區 (只讀取狀態，不改變狀態)"""
         buffer = io.StringIO()
         
         # 標題
@@ -83,6 +98,12 @@ class NetworkTester:
         buffer.write("📡 網絡連接測試\n")
         buffer.write("=" * 50 + "\n")
         
+        if not self.sample_count:
+            buffer.write("🟡 正在測試...\n")
+            buffer.write("\n" + "=" * 50 + "\n")
+            buffer.write("按 Ctrl+C 退出\n")
+            return buffer.getvalue()
+        
         # Ping 測試
         ping_status = latency is not None
         ping_icon = self.get_status_icon(ping_status)
@@ -110,23 +131,11 @@ class NetworkTester:
         buffer.write("\n" + "=" * 50 + "\n")
         buffer.write(f"{overall_icon} 整體狀態: {'正常' if overall_status else '異常'}\n")
         
-        # 狀態變化通知
-        if self.last_status is not None and self.last_status != overall_status:
-            if overall_status:
-                buffer.write("\n✅ 網絡已恢復正常！\n")
-                self.show_notification("網絡恢復", "Google 網絡連接已恢復正常")
-            else:
-                buffer.write("\n❌ 網絡連接異常！\n")
-                self.show_notification("網絡異常", "無法連接到 Google")
-                
-        self.last_status = overall_status
+        # 狀態變化提示，顯示到下一個樣本為止
+        if self.transition:
+            buffer.write(f"\n{self.transition}\n")
         
         # 統計信息
-        if not overall_status:
-            self.fail_count += 1
-        else:
-            self.fail_count = 0
-            
         if self.fail_count > 0:
             buffer.write(f"\n⚠️  連續失敗次數: {self.fail_count}\n")
             
@@ -139,23 +148,18 @@ class NetworkTester:
         """顯示網絡狀態"""
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        # 構建完整的顯示內容
+        # 構建完整的顯示內容，和上一幀相同時不輸出
         content = self.build_display_buffer(current_time, self.latest_ping, self.latest_http)
+        if content == self.last_content:
+            return
+        self.last_content = content
         
-        # 一次性輸出所有內容
-        self.clear_screen()
-        print(content, end='', flush=True)
+        # 只重寫有變化的行，一次寫入終端
+        self.renderer.render(content.rstrip('\n').split('\n'))
         
     def show_notification(self, title, message):
-        """發送 macOS 通知"""
-        try:
-            subprocess.run([
-                'osascript',
-                '-e',
-                f'display notification "{message}" with title "{title}"'
-            ])
-        except:
-            pass
+        """交給通知線程發送，不阻塞顯示"""
+        self.notifier.post('network', message, title=title)
             
     def run(self):
         """主循環"""
@@ -167,21 +171,36 @@ class NetworkTester:
         
         try:
             while True:
-                # 獲取最新測試結果
-                if not self.data_queue.empty():
-                    self.latest_ping, self.latest_http = self.data_queue.get()
-                
-                # 如果有數據就顯示
-                if self.latest_ping is not None or self.latest_http is not None or self.first_run:
-                    self.display_status()
-                    self.first_run = False
-                    
-                time.sleep(0.1)  # 更短的主循環間隔，更流暢的顯示
+                self.display_status()
+                # 等待新的測試結果，最多等到時鐘進入下一秒，期間不佔用 CPU
+                try:
+                    self.record_sample(*self.data_queue.get(timeout=1.001 - time.time() % 1))
+                except Empty:
+                    pass
                 
         except KeyboardInterrupt:
+            self.renderer.close()
+            self.notifier.close(flush=False)
+            if self.history is not None:
+                self.history.close()
             print("\n\n👋 測試已停止")
             sys.exit(0)
 
 if __name__ == "__main__":
-    tester = NetworkTester()
+    parser = argparse.ArgumentParser(description="Google 網絡測試工具")
+    parser.add_argument('--notify', default='auto', metavar='BACKEND',
+                        help=f"網絡狀態變化的通知方式: {', '.join(BACKENDS)} (預設 auto)")
+    parser.add_argument('--no-history', action='store_true', help="不把探測樣本寫入歷史記錄 (見 history_log.py query)")
+    args = parser.parse_args()
+    try:
+        notifier = Notifier(create_backend(args.notify))
+    except ValueError as e:
+        print(f"⚠️  {e}，使用預設通知方式")
+        notifier = None
+    try:
+        primary = TargetSet.load().primary
+    except ValueError as e:
+        print(f"⚠️  監測目標設定錯誤，使用預設目標: {e}")
+        primary = None
+    tester = NetworkTester(primary, notifier, None if args.no_history else HistoryLog('tester'))
     tester.run()
\ No newline at end of file
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+探測歷史記錄
+
+每個探測樣本和每次狀態變化 (可用 <-> 不可用，每個進程的第一個樣本也記錄
+一次初始狀態) 都追加到快取目錄下的二進制分段檔案中。每條記錄固定 48 字節:
+  時間 (double, epoch 秒)、延遲 (float, 毫秒，失敗為 NaN)、類型 (0 樣本 /
+  1 狀態變化)、是否成功、探測名稱 (UTF-8，最多 34 字節)
+
+寫入只追加到記憶體緩衝區，累積到 flush_bytes 或距上次寫入超過
+flush_interval 秒時才一次寫入檔案，不調用 fsync；程序異常退出最多丟失
+最後一段緩衝。分段超過 max_bytes 或 max_age 秒後換新檔案，超過
+retention_days 天的分段在換檔時刪除。每個進程寫自己的分段，檔名為
+<來源>-<開始時間>-<進程號>.bin。
+
+查詢:
+  python3 history_log.py query --since 7d
+  python3 history_log.py query --since 2026-10-01 --until 2026-10-08 --probe ping
+  python3 history_log.py query --probe "target:Claude API" --source tester
+列出每個探測的可用率、延遲百分位和中斷記錄。監測器和網絡測試程序都記錄
+ping、http 等同名探測，查詢預設只讀取監測器 (monitor) 的記錄，
+--source all 才會合併兩者。
+"""
+import glob
+import math
+import os
+import struct
+import time
+from array import array
+from datetime import datetime
+
+from checkpoint import user_cache_dir
+
+
+RECORD = struct.Struct('<dfBB34s')
+SAMPLE, TRANSITION = 0, 1
+NAN = float('nan')
+# 同一探測相鄰兩個樣本間隔超過這個時間 (秒) 時視為監測器沒有運行，不計入可用率和中斷時長
+MAX_GAP = 300
+
+
+def default_history_dir():
+    return os.path.join(user_cache_dir(), 'history')
+
+
+class HistoryLog:
+    def __init__(self, source, directory=None, max_bytes=16 * 1024 * 1024, max_age=24 * 3600,
+                 retention_days=30, flush_bytes=32 * 1024, flush_interval=30.0):
+        self.source = source            # 檔名前綴，例如 monitor / tester
+        self.directory = directory or default_history_dir()
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.retention_days = retention_days
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.buffer = bytearray()
+        self.states = {}                # 探測名稱 -> 最近一次是否成功
+        self.file = None
+        self.path = None
+        self.opened_at = None
+        self.written = 0                # 當前分段已寫入的字節數
+        self.flushed_at = time.monotonic()
+
+    def record(self, probe, latency, timestamp=None):
+        """記錄一個樣本，latency 為 None 表示失敗；狀態變化時另外記錄一條狀態變化"""
+        timestamp = time.time() if timestamp is None else timestamp
+        ok = latency is not None
+        name = probe.encode('utf-8')[:34]
+        value = NAN if latency is None else latency
+        if self.states.get(probe) != ok:
+            self.states[probe] = ok
+            self.buffer += RECORD.pack(timestamp, value, TRANSITION, ok, name)
+        self.buffer += RECORD.pack(timestamp, value, SAMPLE, ok, name)
+        if len(self.buffer) >= self.flush_bytes or time.monotonic() - self.flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """把緩衝區寫入當前分段 (不調用 fsync)，需要時換新分段"""
+        self.flushed_at = time.monotonic()
+        if not self.buffer:
+            return
+        try:
+            if self.file is None or self.written >= self.max_bytes or time.time() - self.opened_at >= self.max_age:
+                self.rotate()
+            self.file.write(self.buffer)
+            self.written += len(self.buffer)
+        except OSError:
+            # 磁碟已滿或目錄不可寫時丟棄這段記錄，不影響監測
+            pass
+        self.buffer = bytearray()
+
+    def rotate(self):
+        if self.file is not None:
+            self.file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self.opened_at = time.time()
+        stamp = datetime.fromtimestamp(self.opened_at).strftime('%Y%m%d-%H%M%S')
+        self.path = os.path.join(self.directory, f"{self.source}-{stamp}-{os.getpid()}.bin")
+        self.file = open(self.path, 'ab', buffering=0)
+        self.written = 0
+        self.remove_expired()
+
+    def remove_expired(self):
+        cutoff = time.time() - self.retention_days * 86400
+        for path in segment_paths(self.directory):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def segment_paths(directory, source=None):
+    return sorted(glob.glob(os.path.join(directory, f"{source or '*'}-*.bin")))
+
+
+def read_records(directory=None, since=None, until=None, source=None, probe=None):
+    """按時間順序返回範圍內的記錄 [(時間, 延遲或 None, 類型, 是否成功, 探測名稱)]"""
+    since = float('-inf') if since is None else since
+    until = float('inf') if until is None else until
+    records = []
+    for path in segment_paths(directory or default_history_dir(), source):
+        try:
+            if os.path.getmtime(path) < since:
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            continue
+        # 異常退出時最後一條記錄可能不完整
+        data = data[:len(data) - len(data) % RECORD.size]
+        for timestamp, value, kind, ok, name in RECORD.iter_unpack(data):
+            if not since <= timestamp <= until:
+                continue
+            name = name.rstrip(b'\0').decode('utf-8', 'replace')
+            if probe is not None and name != probe:
+                continue
+            records.append((timestamp, None if math.isnan(value) else value, kind, bool(ok), name))
+    records.sort(key=lambda record: record[0])
+    return records
+
+
+def percentile(sorted_values, p):
+    """最近秩法，與 LatencyRing.percentile 相同"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(1, math.ceil(p / 100 * len(sorted_values))) - 1]
+
+
+def summarize(records, max_gap=MAX_GAP):
+    """按探測統計樣本: 可用率 (按時間加權)、延遲百分位和中斷列表"""
+    probes = {}
+    for timestamp, value, kind, ok, name in records:
+        if kind != SAMPLE:
+            continue
+        stats = probes.get(name)
+        if stats is None:
+            stats = probes[name] = {'count': 0, 'failures': 0, 'up': 0.0, 'down': 0.0,
+                                    'latencies': array('d'), 'outages': [], 'last': None, 'outage': None}
+        last = stats['last']
+        if last is not None:
+            gap = timestamp - last[0]
+            if gap > max_gap:
+                # 監測器沒有運行: 進行中的中斷在最後一個樣本處結束
+                if stats['outage'] is not None:
+                    stats['outages'].append((stats['outage'], last[0], False))
+                    stats['outage'] = None
+            else:
+                stats['up' if last[1] else 'down'] += gap
+        stats['count'] += 1
+        if ok:
+            stats['latencies'].append(value)
+            if stats['outage'] is not None:
+                stats['outages'].append((stats['outage'], timestamp, False))
+                stats['outage'] = None
+        else:
+            stats['failures'] += 1
+            if stats['outage'] is None:
+                stats['outage'] = timestamp
+        stats['last'] = (timestamp, ok)
+
+    result = {}
+    for name, stats in probes.items():
+        outages = stats['outages']
+        if stats['outage'] is not None:
+            # 範圍結束時仍然中斷
+            outages.append((stats['outage'], stats['last'][0], True))
+        latencies = sorted(stats['latencies'])
+        observed = stats['up'] + stats['down']
+        result[name] = {
+            'count': stats['count'],
+            'failures': stats['failures'],
+            'uptime': stats['up'] / observed if observed else (1.0 if stats['failures'] == 0 else 0.0),
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'outages': outages,
+            'outage_seconds': sum(end - start for start, end, _ in outages)
+        }
+    return result
+
+
+def parse_time(text, now=None):
+    """解析 7d / 12h / 30m 等相對時間或 ISO 日期時間，返回 epoch 秒"""
+    now = now or time.time()
+    units = {'m': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+    if text[-1:] in units:
+        try:
+            return now - float(text[:-1]) * units[text[-1]]
+        except ValueError:
+            pass
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        raise ValueError(f"無法解析時間 {text} (例如 7d、12h、2026-10-01 或 2026-10-01T08:00)")
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}時{seconds % 3600 // 60}分"
+    if seconds >= 60:
+        return f"{seconds // 60}分{seconds % 60}秒"
+    return f"{seconds}秒"
+
+
+def format_ms(value):
+    return f"{value:.1f}ms" if value is not None else "--"
+
+
+def format_report(summary, since, until, max_outages=20):
+    lines = [f"📜 {datetime.fromtimestamp(since).strftime('%Y-%m-%d %H:%M')} → "
+             f"{datetime.fromtimestamp(until).strftime('%Y-%m-%d %H:%M')}"]
+    if not summary:
+        lines.append("  沒有探測記錄")
+        return lines
+    lines.append(f"  {'探測':<18}{'樣本':>7}{'可用率':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'中斷':>6}  中斷時長")
+    for name, stats in sorted(summary.items()):
+        lines.append(f"  {name[:20]:<20}{stats['count']:>9,}{stats['uptime'] * 100:>10.2f}%"
+                     f"{format_ms(stats['p50']):>10}{format_ms(stats['p95']):>10}{format_ms(stats['p99']):>10}"
+                     f"{len(stats['outages']):>8}  {format_duration(stats['outage_seconds'])}")
+    for name, stats in sorted(summary.items()):
+        outages = stats['outages']
+        if not outages:
+            continue
+        lines.append(f"\n  中斷記錄 ({name}，共 {len(outages)} 次):")
+        for start, end, ongoing in outages[-max_outages:]:
+            lines.append(f"    {datetime.fromtimestamp(start).strftime('%m-%d %H:%M:%S')} → "
+                         f"{datetime.fromtimestamp(end).strftime('%H:%M:%S')}  {format_duration(end - start)}"
+                         f"{' (範圍結束時仍中斷)' if ongoing else ''}")
+        if len(outages) > max_outages:
+            lines.append(f"    … 較早的 {len(outages) - max_outages} 次省略")
+    return lines
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="探測歷史記錄")
+    commands = parser.add_subparsers(dest='command', required=True)
+    query = commands.add_parser('query', help="列出中斷、可用率和延遲百分位")
+    query.add_argument('--since', default='7d', help="開始時間: 7d、12h 或 ISO 日期時間 (預設 7d)")
+    query.add_argument('--until', help="結束時間 (預設為現在)")
+    query.add_argument('--probe', help="只統計這個探測，例如 ping、http 或 \"target:<目標名稱>\" "
+                                       "(如 \"target:Claude API\"，名稱與 targets.json 的 name 相同)")
+    query.add_argument('--source', choices=('monitor', 'tester', 'all'), default='monitor',
+                       help="讀取哪個程序的記錄 (預設 monitor)；兩個程序的 ping、http 樣本同名，"
+                            "all 會把它們混在一起統計")
+    query.add_argument('--dir', default=None, help="記錄目錄 (預設為快取目錄下的 history)")
+    query.add_argument('--transitions', action='store_true', help="同時列出每次狀態變化")
+    args = parser.parse_args()
+
+    try:
+        since = parse_time(args.since)
+        until = parse_time(args.until) if args.until else time.time()
+    except ValueError as e:
+        parser.error(str(e))
+    started = time.perf_counter()
+    source = None if args.source == 'all' else args.source
+    records = read_records(args.dir, since, until, source, args.probe)
+    print('\n'.join(format_report(summarize(records), since, until)))
+    if args.transitions:
+        print("\n  狀態變化:")
+        for timestamp, value, kind, ok, name in records:
+            if kind == TRANSITION:
+                print(f"    {datetime.fromtimestamp(timestamp).strftime('%m-%d %H:%M:%S')}  {name:<20} "
+                      f"{'🟢 恢復' if ok else '🔴 中斷'}")
+    print(f"\n  讀取 {len(records):,} 條記錄，耗時 {(time.perf_counter() - started) * 1000:.0f}ms")
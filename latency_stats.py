@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+延遲環形緩衝區
+
+用固定大小的 array('d') 保存最近 N 個樣本 (延遲和時間戳)，增量維護
+丟包數、抖動總和以及一個已排序的窗口，可以直接讀出 p50/p95/p99。
+緩衝區填滿後不再分配記憶體，長時間運行記憶體保持不變。
+
+StageTimings 用同樣的環形緩衝區記錄監測循環各階段的耗時。
+"""
+import math
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+
+
+NAN = float('nan')
+
+
+class LatencyRing:
+    def __init__(self, size=300):
+        self.size = size
+        self.values = array('d', [NAN] * size)      # 延遲 (毫秒)，NaN 表示失敗
+        self.times = array('d', [0.0] * size)       # 樣本時間戳
+        self.diffs = array('d', [NAN] * size)       # 與上一個成功樣本的差值絕對值
+        self.sorted_values = array('d')             # 窗口內成功樣本的排序副本
+        self.index = 0
+        self.count = 0
+        self.losses = 0
+        self.diff_sum = 0.0
+        self.diff_count = 0
+        self.last_value = None
+        self.lock = threading.Lock()
+
+    def add(self, value, timestamp=None):
+        """加入一個樣本，value 為 None 表示失敗 (丟包)"""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            if self.count == self.size:
+                self.evict(self.index)
+            else:
+                self.count += 1
+
+            if value is None:
+                self.values[self.index] = NAN
+                self.diffs[self.index] = NAN
+                self.losses += 1
+            else:
+                value = float(value)
+                self.values[self.index] = value
+                insort(self.sorted_values, value)
+                if self.last_value is not None:
+                    diff = abs(value - self.last_value)
+                    self.diffs[self.index] = diff
+                    self.diff_sum += diff
+                    self.diff_count += 1
+                else:
+                    self.diffs[self.index] = NAN
+                self.last_value = value
+            self.times[self.index] = timestamp
+            self.index = (self.index + 1) % self.size
+            if self.index == 0:
+                # 每輪重新求和一次，避免浮點誤差長期累積
+                self.diff_sum = math.fsum(d for d in self.diffs if not math.isnan(d))
+
+    def evict(self, slot):
+        """移除即將被覆蓋的最舊樣本的貢獻"""
+        old = self.values[slot]
+        if math.isnan(old):
+            self.losses -= 1
+        else:
+            del self.sorted_values[bisect_left(self.sorted_values, old)]
+        diff = self.diffs[slot]
+        if not math.isnan(diff):
+            self.diff_sum -= diff
+            self.diff_count -= 1
+
+    def percentile(self, p):
+        """返回第 p 百分位的延遲 (最近秩法)，沒有成功樣本時返回 None"""
+        with self.lock:
+            n = len(self.sorted_values)
+            if not n:
+                return None
+            rank = max(1, math.ceil(p / 100 * n))
+            return self.sorted_values[rank - 1]
+
+    def summary(self):
+        """返回窗口統計: 樣本數、丟包率、p50/p95/p99、抖動、最新值"""
+        p50, p95, p99 = self.percentile(50), self.percentile(95), self.percentile(99)
+        with self.lock:
+            return {
+                'count': self.count,
+                'loss_rate': self.losses / self.count if self.count else None,
+                'p50': p50,
+                'p95': p95,
+                'p99': p99,
+                'jitter': self.diff_sum / self.diff_count if self.diff_count else None,
+                'last': self.last_value
+            }
+
+
+class StageTimings:
+    """每個階段 (探測、渲染等) 最近 N 次耗時 (毫秒) 的滾動統計"""
+
+    def __init__(self, size=120):
+        self.size = size
+        self.stages = {}
+
+    def record(self, stage, duration_ms):
+        ring = self.stages.get(stage)
+        if ring is None:
+            ring = self.stages[stage] = LatencyRing(self.size)
+        ring.add(duration_ms)
+
+    def summary(self):
+        """返回 {階段: {'count', 'last', 'p50', 'p95', 'max'}}"""
+        result = {}
+        for stage, ring in list(self.stages.items()):
+            stats = ring.summary()
+            result[stage] = {
+                'count': stats['count'],
+                'last': stats['last'],
+                'p50': stats['p50'],
+                'p95': stats['p95'],
+                'max': ring.percentile(100)
+            }
+        return result
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+本機監測服務
+
+在 localhost 上提供最新的監測狀態，讓多個終端介面共用同一組探測:
+  /status.json  完整狀態 (JSON)
+  /metrics      Prometheus 文字格式
+
+服務和探測運行在同一個事件循環中，不另外啟動線程。
+"""
+import asyncio
+import json
+import urllib.request
+from urllib.parse import urlsplit
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8787
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_prometheus(status):
+    """把狀態轉為 Prometheus 文字格式"""
+    lines = []
+
+    def metric(name, help_text, kind, samples):
+        samples = [(labels, value) for labels, value in samples if value is not None]
+        if not samples:
+            return
+        lines.append(f"# HELP claude_monitor_{name} {help_text}")
+        lines.append(f"# TYPE claude_monitor_{name} {kind}")
+        for labels, value in samples:
+            label_text = ''
+            if labels:
+                label_text = '{' + ','.join(f'{k}="{escape_label(v)}"' for k, v in labels.items()) + '}'
+            lines.append(f"claude_monitor_{name}{label_text} {float(value)}")
+
+    network = status.get('network', {})
+    session = status.get('session', {})
+    connected = network.get('connected')
+    metric('network_up', 'Whether the network probes succeeded (1) or failed (0).', 'gauge',
+           [({}, None if connected is None else int(connected))])
+    metric('ping_latency_ms', 'Latest ping latency in milliseconds.', 'gauge',
+           [({}, network.get('latency_ms'))])
+    metric('http_response_ms', 'Latest HTTP response time in milliseconds.', 'gauge',
+           [({}, network.get('response_ms'))])
+    phases = network.get('http_phases') or {}
+    metric('http_phase_ms', 'Duration of each phase of the latest HTTP probe in milliseconds.', 'gauge',
+           [({'phase': phase}, phases.get(phase)) for phase in ('dns', 'connect', 'tls', 'ttfb', 'total')])
+    metric('http_connection_reused', 'Whether the latest HTTP probe reused a kept-alive connection.', 'gauge',
+           [({}, int(phases['reused']) if 'reused' in phases else None)])
+    latency_stats = status.get('latency_stats', {})
+    for probe, label in (('ping', 'ping'), ('http', 'HTTP')):
+        summary = latency_stats.get(probe) or {}
+        metric(f'{probe}_latency_quantile_ms', f'Windowed {label} latency percentiles in milliseconds.', 'gauge',
+               [({'quantile': q}, summary.get(key)) for q, key in (('0.5', 'p50'), ('0.95', 'p95'), ('0.99', 'p99'))])
+        metric(f'{probe}_jitter_ms', f'Mean absolute difference between consecutive {label} samples.', 'gauge',
+               [({}, summary.get('jitter'))])
+        metric(f'{probe}_loss_ratio', f'Fraction of failed {label} samples in the window.', 'gauge',
+               [({}, summary.get('loss_rate'))])
+    targets = status.get('targets') or []
+    metric('target_up', 'Whether the latest probe of each configured target succeeded.', 'gauge',
+           [({'target': t['name']}, None if not t.get('count') else int(t.get('last_ms') is not None))
+            for t in targets])
+    metric('target_latency_ms', 'Latest latency of each configured target in milliseconds.', 'gauge',
+           [({'target': t['name']}, t.get('last_ms')) for t in targets])
+    metric('target_latency_quantile_ms', 'Windowed latency percentiles of each configured target.', 'gauge',
+           [({'target': t['name'], 'quantile': q}, t.get(key)) for t in targets
+            for q, key in (('0.5', 'p50'), ('0.95', 'p95'))])
+    metric('target_loss_ratio', 'Fraction of failed probes of each configured target in the window.', 'gauge',
+           [({'target': t['name']}, t.get('loss_rate')) for t in targets])
+    stages = status.get('stage_timings') or {}
+    metric('stage_duration_ms', 'Rolling percentiles of the duration of each monitor stage in milliseconds.', 'gauge',
+           [({'stage': stage, 'quantile': q}, stats.get(key)) for stage, stats in sorted(stages.items())
+            for q, key in (('0.5', 'p50'), ('0.95', 'p95'), ('1', 'max'))])
+    metric('session_tokens', 'Tokens used in the current 5-hour block.', 'gauge',
+           [({}, session.get('tokens'))])
+    metric('session_cost_usd', 'Cost of the current 5-hour block in USD.', 'gauge',
+           [({}, session.get('cost'))])
+    metric('session_active', 'Whether a 5-hour block is currently active.', 'gauge',
+           [({}, int(session.get('active', False)))])
+    burn = status.get('burn_rate') or {}
+    metric('session_burn_tokens_per_minute', 'Decayed average token rate of the current 5-hour block.', 'gauge',
+           [({}, burn.get('tokens_per_minute'))])
+    metric('session_burn_cost_usd_per_hour', 'Decayed average cost rate of the current 5-hour block.', 'gauge',
+           [({}, burn.get('cost_per_hour'))])
+    metric('session_projected_tokens', 'Projected tokens at the end of the current 5-hour block.', 'gauge',
+           [({}, burn.get('projected_tokens'))])
+    metric('session_projected_cost_usd', 'Projected cost at the end of the current 5-hour block in USD.', 'gauge',
+           [({}, burn.get('projected_cost'))])
+    metric('session_budget_hit_timestamp_seconds', 'Unix time at which each block budget is projected to run out.',
+           'gauge', [({'budget': budget['kind']}, budget['hit_time']) for budget in burn.get('budgets', ())])
+    metric('daily_cost_usd', 'Cost per day in USD.', 'gauge',
+           [({'date': day}, cost) for day, cost in sorted(status.get('daily_costs', {}).items())])
+    metric('total_cost_usd', 'Total cost over the recorded history in USD.', 'gauge',
+           [({}, status.get('total_cost'))])
+    probes = status.get('probes', {})
+    metric('probe_duration_seconds', 'Duration of the latest run of each probe.', 'gauge',
+           [({'probe': name}, probe.get('duration')) for name, probe in sorted(probes.items())])
+    metric('probe_last_run_timestamp_seconds', 'Unix time of the latest run of each probe.', 'gauge',
+           [({'probe': name}, probe.get('time')) for name, probe in sorted(probes.items())])
+    metric('probe_error', 'Whether the latest run of each probe raised an error.', 'gauge',
+           [({'probe': name}, int(probe.get('error') is not None)) for name, probe in sorted(probes.items())])
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """在事件循環中運行的極簡 HTTP 服務，只處理 GET 請求"""
+
+    def __init__(self, get_status, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.get_status = get_status
+        self.host = host
+        self.port = port
+        self.server = None
+
+    @property
+    def url(self):
+        host, port = self.server.sockets[0].getsockname()[:2] if self.server else (self.host, self.port)
+        return f"http://{host}:{port}"
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    def respond(self, path):
+        """返回 (狀態碼, Content-Type, 內容)"""
+        if path == '/status.json':
+            return 200, 'application/json; charset=utf-8', json.dumps(self.get_status(), ensure_ascii=False)
+        if path == '/metrics':
+            return 200, 'text/plain; version=0.0.4; charset=utf-8', format_prometheus(self.get_status())
+        return 404, 'text/plain; charset=utf-8', 'Not Found\n'
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            # 忽略請求標頭
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) < 2:
+                return
+            if parts[0] not in ('GET', 'HEAD'):
+                code, content_type, text = 405, 'text/plain; charset=utf-8', 'Method Not Allowed\n'
+            else:
+                code, content_type, text = self.respond(parts[1].split('?', 1)[0])
+            body = text.encode('utf-8')
+            reason = {200: 'OK', 404: 'Not Found', 405: 'Method Not Allowed'}[code]
+            writer.write((f"HTTP/1.1 {code} {reason}\r\n"
+                          f"Content-Type: {content_type}\r\n"
+                          f"Content-Length: {len(body)}\r\n"
+                          "Connection: close\r\n\r\n").encode('latin-1'))
+            if parts[0] != 'HEAD':
+                writer.write(body)
+            await writer.drain()
+        except (OSError, EOFError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+
+def fetch_status(url, timeout=2):
+    """從監測服務讀取 /status.json，失敗時返回 None"""
+    try:
+        with urllib.request.urlopen(f"{url.rstrip('/')}/status.json", timeout=timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+async def fetch_status_async(url, timeout=2):
+    """fetch_status 的非阻塞版本，在事件循環中使用"""
+    parts = urlsplit(url)
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parts.hostname, parts.port or 80), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    try:
+        writer.write((f"GET {parts.path.rstrip('/')}/status.json HTTP/1.0\r\n"
+                      f"Host: {parts.netloc}\r\n\r\n").encode('latin-1'))
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+        head, _, body = response.partition(b'\r\n\r\n')
+        if head.split(None, 2)[1:2] != [b'200']:
+            return None
+        return json.loads(body.decode('utf-8'))
+    except (OSError, ValueError, asyncio.TimeoutError):
+        return None
+    finally:
+        writer.close()
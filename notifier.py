@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+桌面通知
+
+通知交給後台線程發送，調用者只把事件放入有上限的佇列，不會因為啟動
+osascript / notify-send 而阻塞；佇列已滿時丟棄新事件。
+
+同一類事件 (例如 'network') 的處理:
+  合併  第一個事件到達後等待 debounce 秒，期間的事件合併成一個通知
+  限速  同一類事件兩次通知至少間隔 min_interval 秒，期間的事件繼續合併
+網絡反覆斷開又恢復時只發出一個摘要，例如 "網絡連接已恢復 (30 秒內 6 次變化)"。
+
+後端:
+  osascript    macOS 通知中心 (標題和內容作為參數傳入，不拼接 AppleScript)
+  notify-send  Linux 桌面通知
+  msg          Windows
+  none         不發送
+  file:PATH    每個通知追加一行到檔案，用於無介面運行和測試
+"""
+import os
+import platform
+import queue
+import subprocess
+import threading
+import time
+from collections import namedtuple
+
+
+DEFAULT_TITLE = 'Claude Code 監測器'
+BACKENDS = ('auto', 'osascript', 'notify-send', 'msg', 'none', 'file:PATH')
+
+Event = namedtuple('Event', 'kind title message time')
+STOP = object()
+
+
+class CommandBackend:
+    """每個通知運行一次外部命令"""
+
+    def __init__(self, build, timeout=10):
+        self.build = build              # (標題, 內容) -> 命令參數列表
+        self.timeout = timeout
+
+    def send(self, title, message):
+        subprocess.run(self.build(title, message), timeout=self.timeout,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+
+
+def osascript_command(title, message):
+    # 通過 argv 傳入文字，引號和反斜線不會被當作 AppleScript 解析
+    return ['osascript',
+            '-e', 'on run argv',
+            '-e', 'display notification (item 2 of argv) with title (item 1 of argv) sound name "Glass"',
+            '-e', 'end run',
+            title, message]
+
+
+class FileBackend:
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, title, message):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')}\t{title}\t{message}\n")
+
+
+class NoopBackend:
+    def send(self, title, message):
+        pass
+
+
+def create_backend(name='auto'):
+    """根據名稱建立後端，名稱無效時拋出 ValueError"""
+    if name == 'auto':
+        system = platform.system().lower()
+        name = {'darwin': 'osascript', 'linux': 'notify-send', 'windows': 'msg'}.get(system, 'none')
+    if name == 'osascript':
+        return CommandBackend(osascript_command)
+    if name == 'notify-send':
+        return CommandBackend(lambda title, message: ['notify-send', title, message])
+    if name == 'msg':
+        return CommandBackend(lambda title, message: ['msg', '*', f"{title}: {message}"])
+    if name == 'none':
+        return NoopBackend()
+    if name.startswith('file:') and len(name) > 5:
+        return FileBackend(os.path.expanduser(name[5:]))
+    raise ValueError(f"未知的通知方式 {name} (可用: {', '.join(BACKENDS)})")
+
+
+class Notifier:
+    def __init__(self, backend=None, debounce=3.0, min_interval=30.0, max_queue=100):
+        self.backend = backend or create_backend()
+        self.debounce = debounce
+        self.min_interval = min_interval
+        self.queue = queue.Queue(max_queue)
+        self.pending = {}               # 事件類別 -> 等待合併的事件列表
+        self.last_sent = {}             # 事件類別 -> 上次發送的時間 (monotonic)
+        self.thread = None
+        self.flush_on_close = True
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.coalesced = 0              # 被合併到其他通知中的事件數
+        self.dropped = 0                # 佇列已滿時丟棄的事件數
+        self.errors = 0
+
+    def post(self, kind, message, title=DEFAULT_TITLE):
+        """放入一個事件並立即返回，需要時啟動後台線程"""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='notifier', daemon=True)
+                self.thread.start()
+        try:
+            self.queue.put_nowait(Event(kind, title, message, time.monotonic()))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, flush=True, timeout=2.0):
+        """停止後台線程；flush 為 True 時先發出還在等待的通知"""
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is None:
+            return
+        self.flush_on_close = flush
+        try:
+            self.queue.put(STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+
+    def due_time(self, kind):
+        events = self.pending[kind]
+        return max(events[0].time + self.debounce, self.last_sent.get(kind, float('-inf')) + self.min_interval)
+
+    def run(self):
+        while True:
+            now = time.monotonic()
+            timeout = min((self.due_time(kind) for kind in self.pending), default=None)
+            try:
+                item = self.queue.get(timeout=None if timeout is None else max(0.0, timeout - now))
+            except queue.Empty:
+                item = None
+            if item is STOP:
+                if self.flush_on_close:
+                    for kind in list(self.pending):
+                        self.flush(kind)
+                return
+            if item is not None:
+                self.pending.setdefault(item.kind, []).append(item)
+            now = time.monotonic()
+            for kind in [kind for kind in self.pending if self.due_time(kind) <= now]:
+                self.flush(kind)
+
+    def flush(self, kind):
+        events = self.pending.pop(kind)
+        last = events[-1]
+        message = last.message
+        if len(events) > 1:
+            span = max(1, round(last.time - events[0].time))
+            message = f"{message} ({span} 秒內 {len(events)} 次變化)"
+            self.coalesced += len(events) - 1
+        self.last_sent[kind] = time.monotonic()
+        try:
+            self.backend.send(last.title, message)
+            self.sent += 1
+        except (OSError, subprocess.SubprocessError):
+            self.errors += 1
+
+    def stats(self):
+        return {'sent': self.sent, 'coalesced': self.coalesced, 'dropped': self.dropped, 'errors': self.errors}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="發送一個測試通知")
+    parser.add_argument('message', nargs='?', default='通知測試')
+    parser.add_argument('--notify', default='auto', help=f"通知方式: {', '.join(BACKENDS)}")
+    args = parser.parse_args()
+
+    notifier = Notifier(create_backend(args.notify), debounce=0)
+    notifier.post('test', args.message)
+    notifier.close()
+    print(f"🔔 {notifier.stats()}")
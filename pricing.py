@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+模型價格表和費用計算
+
+價格來自本機的 model_prices.json: 每個模型按輸入、輸出、快取寫入、快取
+讀取四類 Token 定價 (美元 / 百萬 Token)，不需要網絡，也不依賴 ccusage
+--mode calculate。價格表帶有版本號，版本變化時用 bulk_costs() 一次重新
+計算全部歷史: 安裝了 NumPy 時用矩陣運算，否則用純 Python，結果相同。
+"""
+import json
+import os
+import re
+from functools import lru_cache
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+DEFAULT_PRICES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_prices.json')
+TOKEN_CLASSES = ('input', 'output', 'cache_creation', 'cache_read')
+
+
+@lru_cache(maxsize=256)
+def short_model_name(model):
+    """把完整模型名稱轉為簡稱，例如 claude-opus-4-20250514 -> opus-4"""
+    if not model:
+        return None
+    match = re.search(r'(opus|sonnet|haiku)-(\d)(?!\d)(?:-(\d)(?!\d))?', model)
+    if match:
+        family, major, minor = match.groups()
+        return f"{family}-{major}-{minor}" if minor else f"{family}-{major}"
+    # 舊式命名: claude-3-5-sonnet-20241022
+    match = re.search(r'(\d)(?:-(\d))?-(opus|sonnet|haiku)', model)
+    if match:
+        major, minor, family = match.groups()
+        return f"{family}-{major}-{minor}" if minor else f"{family}-{major}"
+    return model
+
+
+class PriceTable:
+    def __init__(self, prices, version=None):
+        self.prices = prices            # 模型簡稱前綴 -> (輸入, 輸出, 快取寫入, 快取讀取)
+        self.version = version
+        # 越長的前綴優先，例如 opus-4-5 優先於 opus
+        self.prefixes = sorted(prices, key=len, reverse=True)
+        self.cache = {}
+
+    @classmethod
+    def load(cls, path=DEFAULT_PRICES):
+        """讀取價格表，檔案不存在或格式錯誤時拋出 ValueError"""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ValueError(f"無法讀取價格表 {path}: {e}")
+        prices = {}
+        for name, item in data.get('models', {}).items():
+            try:
+                prices[name] = tuple(float(item[key]) for key in TOKEN_CLASSES)
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"價格表中 {name} 必須包含 {', '.join(TOKEN_CLASSES)}")
+        return cls(prices, str(data.get('version')))
+
+    def lookup(self, model):
+        """查找模型價格，找不到時返回 None"""
+        if model not in self.cache:
+            name = short_model_name(model) or ''
+            self.cache[model] = next((self.prices[prefix] for prefix in self.prefixes
+                                      if name.startswith(prefix)), None)
+        return self.cache[model]
+
+    def cost(self, model, input_tokens, output_tokens, cache_create, cache_read):
+        """根據 Token 數量計算一筆用量的費用"""
+        prices = self.lookup(model)
+        if not prices:
+            return 0.0
+        return (input_tokens * prices[0] + output_tokens * prices[1] +
+                cache_create * prices[2] + cache_read * prices[3]) / 1_000_000
+
+    def bulk_costs(self, models, tokens):
+        """計算多筆用量的費用
+
+        models 為模型名稱列表，tokens 為對應的 (輸入, 輸出, 快取寫入, 快取讀取)
+        列表，返回費用列表。
+        """
+        if numpy is None or not models:
+            return [self.cost(model, *counts) for model, counts in zip(models, tokens)]
+        names = sorted(set(models))
+        position = {name: index for index, name in enumerate(names)}
+        matrix = numpy.array([self.lookup(name) or (0.0, 0.0, 0.0, 0.0) for name in names], dtype=numpy.float64)
+        rows = numpy.fromiter((position[model] for model in models), dtype=numpy.intp, count=len(models))
+        counts = numpy.array(tokens, dtype=numpy.float64).reshape(-1, len(TOKEN_CLASSES))
+        return (numpy.einsum('ij,ij->i', counts, matrix[rows]) / 1_000_000).tolist()
+
+
+@lru_cache(maxsize=None)
+def default_table():
+    """程式目錄下 model_prices.json 的價格表 (只讀取一次)"""
+    return PriceTable.load()
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from checkpoint import CheckpointStore
+    from usage_reader import UsageReader, COST
+
+    parser = argparse.ArgumentParser(description="用本機價格表重新計算全部歷史費用")
+    parser.add_argument('--prices', default=DEFAULT_PRICES, help="價格表 (預設為程式目錄下的 model_prices.json)")
+    args = parser.parse_args()
+
+    table = PriceTable.load(args.prices)
+    reader = UsageReader()
+    # 從檢查點載入已有的統計，只讀取新的記錄
+    store = CheckpointStore()
+    store.load(reader)
+    reader.refresh()
+    store.close()
+
+    started = time.perf_counter()
+    buckets = reader.recompute_costs(table)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"💲 價格表 {table.version}: 重新計算 {buckets:,} 個 (小時, 模型) 統計，"
+          f"耗時 {elapsed:.1f}ms ({'NumPy' if numpy is not None else '純 Python'})")
+
+    totals = {}
+    for bucket in reader.hourly.values():
+        for model, stats in bucket['models'].items():
+            name = short_model_name(model)
+            totals[name] = totals.get(name, 0.0) + stats[COST]
+    for name, cost in sorted(totals.items(), key=lambda item: item[1], reverse=True):
+        flag = '' if table.lookup(name) else '  (價格表中沒有這個模型)'
+        print(f"  {name:<16} ${cost:>10.2f}{flag}")
+    print(f"  {'總計':<14} ${sum(totals.values()):>10.2f}")
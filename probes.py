@@ -0,0 +1,583 @@
+#!/usr/bin/env python3
+"""
+進程內延遲探測
+
+不再每次啟動 `ping` 並解析其文字輸出，而是直接在進程內計時:
+- 作業系統允許時使用非特權 ICMP 數據報套接字 (SOCK_DGRAM + IPPROTO_ICMP)
+- 否則測量 TCP 連接 (三次握手) 的時間
+每個周期連續發送幾個探測，使用 perf_counter_ns 精確計時。
+
+HTTP 探測保持一個 keep-alive 連接重複使用，分別記錄 DNS、TCP 連接、
+TLS 握手、首字節和總時間，並使用 HEAD (或只取一個字節的 Range 請求)
+避免下載整個頁面。
+
+每種探測都有同步的 probe() 和在事件循環中運行的 probe_async()，
+後者使用非阻塞套接字，監測器的所有探測因此可以共用一個線程。
+"""
+import asyncio
+import http.client
+import os
+import socket
+import ssl
+import struct
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+
+DNS_TTL = 300  # 解析結果快取時間 (秒)，避免每次探測都計入 DNS 查詢
+ICMP_FALLBACK_AFTER = 3     # 連續這麼多個周期收不到 ICMP 回覆時檢查 TCP 是否可達
+ICMP_RETRY_INTERVAL = 600   # 改用 TCP 後隔這麼久 (秒) 再嘗試 ICMP
+
+
+def icmp_checksum(data):
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+class LatencyProbe:
+    def __init__(self, host='google.com', port=443, burst=3, timeout=2.0, use_icmp=True):
+        self.host = host
+        self.port = port
+        self.burst = burst
+        self.timeout = timeout
+        self.use_icmp = use_icmp
+        self.icmp_available = None      # None 表示尚未檢查
+        self.address = None
+        self.resolved_at = 0
+        self.sequence = 0
+        self.identifier = os.getpid() & 0xFFFF
+        self.icmp_misses = 0            # 連續收不到任何 ICMP 回覆的周期數
+        self.icmp_paused_until = 0      # ICMP 回覆被過濾時，在這之前 (monotonic) 改用 TCP
+        self.cpu_time_ns = 0            # 探測本身消耗的 CPU 時間
+        self.probe_count = 0
+
+    @property
+    def icmp_paused(self):
+        return time.monotonic() < self.icmp_paused_until
+
+    @property
+    def method(self):
+        return 'icmp' if self.use_icmp and self.icmp_available and not self.icmp_paused else 'tcp'
+
+    def charge(self, cpu_started):
+        """把從 cpu_started 起本線程消耗的 CPU 時間計入探測，返回新的起點"""
+        now = time.thread_time_ns()
+        self.cpu_time_ns += now - cpu_started
+        return now
+
+    def resolve(self):
+        """解析目標地址並快取一段時間"""
+        if self.address is None or time.time() - self.resolved_at > DNS_TTL:
+            self.set_address(socket.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM))
+        return self.address
+
+    async def resolve_async(self):
+        if self.address is None or time.time() - self.resolved_at > DNS_TTL:
+            loop = asyncio.get_running_loop()
+            self.set_address(await loop.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM))
+        return self.address
+
+    def set_address(self, infos):
+        # ICMP 只支持 IPv4，優先選擇 IPv4 地址
+        infos.sort(key=lambda info: info[0] != socket.AF_INET)
+        self.address = infos[0][0], infos[0][4]
+        self.resolved_at = time.time()
+
+    def open_icmp_socket(self):
+        """嘗試建立非特權 ICMP 套接字，不允許時返回 None"""
+        if not self.use_icmp or self.icmp_available is False or self.icmp_paused:
+            return None
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+        except (OSError, AttributeError):
+            self.icmp_available = False
+            return None
+        self.icmp_available = True
+        return sock
+
+    def echo_request(self):
+        """構建下一個 ICMP echo 請求封包"""
+        self.sequence = (self.sequence + 1) & 0xFFFF
+        payload = struct.pack('!Q', time.perf_counter_ns())
+        header = struct.pack('!BBHHH', 8, 0, 0, self.identifier, self.sequence)
+        return struct.pack('!BBHHH', 8, 0, icmp_checksum(header + payload),
+                           self.identifier, self.sequence) + payload
+
+    def is_echo_reply(self, data):
+        """檢查收到的封包是否為當前請求的回覆"""
+        # macOS 會附帶 IP 標頭，Linux 不會
+        if data and data[0] >> 4 == 4:
+            data = data[(data[0] & 0x0F) * 4:]
+        if len(data) < 8:
+            return False
+        kind, _, _, _, sequence = struct.unpack('!BBHHH', data[:8])
+        return kind == 0 and sequence == self.sequence
+
+    def icmp_once(self, sock, address):
+        """發送一個 ICMP echo 請求並等待回覆，返回延遲 (毫秒) 或 None"""
+        packet = self.echo_request()
+        started = time.perf_counter_ns()
+        deadline = started + int(self.timeout * 1e9)
+        sock.sendto(packet, (address[0], 0))
+        while True:
+            remaining = (deadline - time.perf_counter_ns()) / 1e9
+            if remaining <= 0:
+                return None
+            sock.settimeout(remaining)
+            try:
+                data = sock.recv(1024)
+            except socket.timeout:
+                return None
+            received = time.perf_counter_ns()
+            if self.is_echo_reply(data):
+                return (received - started) / 1e6
+
+    async def icmp_once_async(self, sock, address):
+        """icmp_once 的非阻塞版本，sock 必須是非阻塞套接字
+
+        只有兩次 await 之間的部分計入 cpu_time_ns，等待期間同一線程上
+        其他協程消耗的 CPU 不算在內。
+        """
+        cpu = time.thread_time_ns()
+        loop = asyncio.get_running_loop()
+        packet = self.echo_request()
+        started = time.perf_counter_ns()
+        deadline = started + int(self.timeout * 1e9)
+        # 數據報套接字的發送緩衝區不會滿，直接發送不會阻塞
+        sock.sendto(packet, (address[0], 0))
+        while True:
+            remaining = (deadline - time.perf_counter_ns()) / 1e9
+            if remaining <= 0:
+                self.charge(cpu)
+                return None
+            receiving = loop.sock_recv(sock, 1024)
+            self.charge(cpu)
+            try:
+                data = await asyncio.wait_for(receiving, remaining)
+            except asyncio.TimeoutError:
+                return None
+            received = time.perf_counter_ns()
+            cpu = time.thread_time_ns()
+            if self.is_echo_reply(data):
+                self.charge(cpu)
+                return (received - started) / 1e6
+
+    def tcp_once(self, family, address):
+        """測量一次 TCP 連接時間，返回延遲 (毫秒) 或 None"""
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            started = time.perf_counter_ns()
+            sock.connect(address)
+            return (time.perf_counter_ns() - started) / 1e6
+        except OSError:
+            return None
+        finally:
+            sock.close()
+
+    async def tcp_once_async(self, family, address):
+        """tcp_once 的非阻塞版本，同樣只計算兩次 await 之間的 CPU 時間"""
+        cpu = time.thread_time_ns()
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            started = time.perf_counter_ns()
+            connecting = loop.sock_connect(sock, address)
+            self.charge(cpu)
+            try:
+                await asyncio.wait_for(connecting, self.timeout)
+            finally:
+                cpu = time.thread_time_ns()
+            return (time.perf_counter_ns() - started) / 1e6
+        except (OSError, asyncio.TimeoutError):
+            return None
+        finally:
+            sock.close()
+            self.charge(cpu)
+
+    def probe(self):
+        """連續發送 burst 個探測，返回每個樣本的延遲 (毫秒)，失敗的樣本為 None"""
+        cpu_started = time.thread_time_ns()
+        try:
+            family, address = self.resolve()
+        except OSError:
+            return [None] * self.burst
+
+        samples = []
+        sock = self.open_icmp_socket() if family == socket.AF_INET else None
+        try:
+            for _ in range(self.burst):
+                if sock is not None:
+                    try:
+                        samples.append(self.icmp_once(sock, address))
+                        continue
+                    except OSError:
+                        # 例如網絡不可達; 這個樣本記為失敗
+                        samples.append(None)
+                        continue
+                samples.append(self.tcp_once(family, address))
+        finally:
+            if sock is not None:
+                sock.close()
+
+        if sock is not None and self.icmp_filtered(samples):
+            tcp = self.tcp_once(family, address)
+            if tcp is not None:
+                samples = [tcp] + [self.tcp_once(family, address) for _ in range(self.burst - 1)]
+                self.fall_back_to_tcp()
+
+        self.cpu_time_ns += time.thread_time_ns() - cpu_started
+        self.probe_count += 1
+        return samples
+
+    def icmp_filtered(self, samples):
+        """記錄一個 ICMP 周期的結果，連續 ICMP_FALLBACK_AFTER 個周期全部超時時返回 True
+
+        套接字可以建立但回覆被防火牆過濾時，ICMP 樣本會一直失敗，
+        這時由調用者檢查 TCP 是否仍可連接。
+        """
+        if any(sample is not None for sample in samples):
+            self.icmp_misses = 0
+            return False
+        self.icmp_misses += 1
+        return self.icmp_misses >= ICMP_FALLBACK_AFTER
+
+    def fall_back_to_tcp(self):
+        """ICMP 被過濾而 TCP 可達: ICMP_RETRY_INTERVAL 秒內改用 TCP 連接計時"""
+        self.icmp_misses = 0
+        self.icmp_paused_until = time.monotonic() + ICMP_RETRY_INTERVAL
+
+    async def probe_async(self):
+        """probe 的非阻塞版本，在事件循環中運行
+
+        監測器只使用這個版本，CPU 時間同樣計入 cpu_time_ns (不含 await 期間)。
+        """
+        try:
+            family, address = await self.resolve_async()
+        except OSError:
+            return [None] * self.burst
+
+        cpu = time.thread_time_ns()
+        samples = []
+        sock = self.open_icmp_socket() if family == socket.AF_INET else None
+        if sock is not None:
+            sock.setblocking(False)
+        self.charge(cpu)
+        try:
+            for _ in range(self.burst):
+                if sock is not None:
+                    try:
+                        samples.append(await self.icmp_once_async(sock, address))
+                    except OSError:
+                        samples.append(None)
+                    continue
+                samples.append(await self.tcp_once_async(family, address))
+        finally:
+            if sock is not None:
+                sock.close()
+
+        if sock is not None and self.icmp_filtered(samples):
+            tcp = await self.tcp_once_async(family, address)
+            if tcp is not None:
+                samples = [tcp] + [await self.tcp_once_async(family, address) for _ in range(self.burst - 1)]
+                self.fall_back_to_tcp()
+
+        self.probe_count += 1
+        return samples
+
+
+def elapsed_ms(started):
+    return (time.perf_counter_ns() - started) / 1e6
+
+
+class HttpProbe:
+    def __init__(self, url='https://www.google.com/', method='HEAD', timeout=5.0, ssl_context=None):
+        parts = urlsplit(url)
+        self.url = url
+        self.scheme = parts.scheme or 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.scheme == 'https' else 80)
+        self.path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        self.method = method            # 'HEAD' 或 'RANGE' (GET + Range: bytes=0-0)
+        self.timeout = timeout
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self.conn = None                # 保持的 keep-alive 連接
+        self.stream = None              # probe_async 使用的 keep-alive 連接 (reader, writer)
+        self.address = None
+        self.resolved_at = 0
+        self.bytes_received = 0
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        if self.stream is not None:
+            self.stream[1].close()
+            self.stream = None
+
+    def connect(self, phases):
+        """建立新連接，分別記錄 DNS、TCP 連接和 TLS 握手時間"""
+        started = time.perf_counter_ns()
+        if self.address is None or time.time() - self.resolved_at > DNS_TTL:
+            infos = socket.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM)
+            self.address = infos[0][0], infos[0][4]
+            self.resolved_at = time.time()
+            phases['dns'] = elapsed_ms(started)
+        else:
+            phases['dns'] = 0.0
+
+        family, address = self.address
+        started = time.perf_counter_ns()
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(address)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            phases['connect'] = elapsed_ms(started)
+
+            if self.scheme == 'https':
+                started = time.perf_counter_ns()
+                sock = self.ssl_context.wrap_socket(sock, server_hostname=self.host)
+                phases['tls'] = elapsed_ms(started)
+        except Exception:
+            sock.close()
+            raise
+
+        if self.scheme == 'https':
+            conn = http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self.ssl_context)
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        conn.sock = sock
+        self.conn = conn
+
+    def request_headers(self):
+        """返回 (請求方法, 標頭)"""
+        headers = {'Connection': 'keep-alive', 'User-Agent': 'claude-code-monitor'}
+        if self.method == 'RANGE':
+            headers['Range'] = 'bytes=0-0'
+            return 'GET', headers
+        return 'HEAD', headers
+
+    def request(self, phases):
+        """在現有連接上發送一個請求，記錄首字節時間"""
+        method, headers = self.request_headers()
+        started = time.perf_counter_ns()
+        self.conn.request(method, self.path, headers=headers)
+        response = self.conn.getresponse()
+        phases['ttfb'] = elapsed_ms(started)
+        body = response.read()
+        self.bytes_received += len(body)
+        if response.will_close:
+            self.close()
+        return response.status
+
+    def probe(self):
+        """探測一次，返回 {'ok', 'status', 'reused', 'dns', 'connect', 'tls', 'ttfb', 'total'} (毫秒)"""
+        started = time.perf_counter_ns()
+        for attempt in range(2):
+            phases = {'dns': None, 'connect': None, 'tls': None, 'ttfb': None}
+            reused = self.conn is not None
+            try:
+                if not reused:
+                    self.connect(phases)
+                status = self.request(phases)
+                if status == 405 and self.method == 'HEAD':
+                    # 不支持 HEAD 的伺服器改用 Range 請求
+                    self.method = 'RANGE'
+                    continue
+                return dict(phases, ok=status < 400, status=status, reused=reused, total=elapsed_ms(started))
+            except (OSError, http.client.HTTPException):
+                self.close()
+                if not reused:
+                    break
+                # 伺服器已關閉閒置的連接，重新連接一次
+                started = time.perf_counter_ns()
+        return dict(phases, ok=False, status=None, reused=False, total=None)
+
+    async def connect_async(self, phases):
+        """connect 的非阻塞版本"""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter_ns()
+        if self.address is None or time.time() - self.resolved_at > DNS_TTL:
+            infos = await loop.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM)
+            self.address = infos[0][0], infos[0][4]
+            self.resolved_at = time.time()
+            phases['dns'] = elapsed_ms(started)
+        else:
+            phases['dns'] = 0.0
+
+        address = self.address[1]
+        started = time.perf_counter_ns()
+        if self.scheme == 'https' and not hasattr(asyncio.StreamWriter, 'start_tls'):
+            # Python 3.11 之前無法在已有連接上升級 TLS，連接和握手只能合併計時
+            reader, writer = await asyncio.open_connection(
+                address[0], address[1], ssl=self.ssl_context, server_hostname=self.host)
+            phases['connect'] = elapsed_ms(started)
+            self.stream = reader, writer
+            return
+
+        reader, writer = await asyncio.open_connection(address[0], address[1])
+        phases['connect'] = elapsed_ms(started)
+        self.stream = reader, writer
+        if self.scheme == 'https':
+            started = time.perf_counter_ns()
+            await writer.start_tls(self.ssl_context, server_hostname=self.host)
+            phases['tls'] = elapsed_ms(started)
+
+    async def request_async(self, phases):
+        """request 的非阻塞版本，自行讀取狀態行、標頭和 (很小的) 回應主體"""
+        reader, writer = self.stream
+        method, headers = self.request_headers()
+        host = self.host if self.port in (80, 443) else f"{self.host}:{self.port}"
+        lines = [f"{method} {self.path} HTTP/1.1", f"Host: {host}"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        started = time.perf_counter_ns()
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('connection closed by server')
+        phases['ttfb'] = elapsed_ms(started)
+        version, status = status_line.split(None, 2)[:2]
+        status = int(status)
+
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip().lower()
+
+        connection = response_headers.get('connection', '')
+        will_close = connection == 'close' or (version == b'HTTP/1.0' and connection != 'keep-alive')
+        body = 0
+        if method != 'HEAD' and status >= 200 and status not in (204, 304):
+            if 'chunked' in response_headers.get('transfer-encoding', ''):
+                while True:
+                    size = int((await reader.readline()).split(b';')[0], 16)
+                    if size == 0:
+                        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                            pass
+                        break
+                    body += len(await reader.readexactly(size + 2)) - 2
+            elif 'content-length' in response_headers:
+                body = len(await reader.readexactly(int(response_headers['content-length'])))
+            else:
+                # 沒有長度資訊，主體一直到連接關閉
+                body = len(await reader.read())
+                will_close = True
+        self.bytes_received += body
+        if will_close:
+            self.close()
+        return status
+
+    async def probe_async(self):
+        """probe 的非阻塞版本，在事件循環中運行，結果格式相同"""
+        started = time.perf_counter_ns()
+        for attempt in range(2):
+            phases = {'dns': None, 'connect': None, 'tls': None, 'ttfb': None}
+            reused = self.stream is not None
+            try:
+                if not reused:
+                    await asyncio.wait_for(self.connect_async(phases), self.timeout)
+                status = await asyncio.wait_for(self.request_async(phases), self.timeout)
+                if status == 405 and self.method == 'HEAD':
+                    self.method = 'RANGE'
+                    continue
+                return dict(phases, ok=status < 400, status=status, reused=reused, total=elapsed_ms(started))
+            except (OSError, EOFError, ValueError, asyncio.TimeoutError):
+                self.close()
+                if not reused:
+                    break
+                started = time.perf_counter_ns()
+        return dict(phases, ok=False, status=None, reused=False, total=None)
+
+
+def subprocess_ping_cpu(host, count):
+    """測量用子進程運行 ping 所消耗的 CPU 時間 (秒，包括子進程)"""
+    import resource
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_started = time.process_time()
+    param = '-n' if sys.platform.startswith('win') else '-c'
+    for _ in range(count):
+        subprocess.run(['ping', param, '1', host], capture_output=True, text=True, timeout=5)
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    children = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return time.process_time() - cpu_started + children
+
+
+def compare_cpu(host='google.com', port=443, count=20):
+    """比較進程內探測和 ping 子進程每個樣本的 CPU 消耗
+
+    進程內探測使用監測器實際運行的 probe_async。
+    """
+    probe = LatencyProbe(host, port, burst=1)
+
+    async def probe_all():
+        for _ in range(count):
+            await probe.probe_async()
+
+    asyncio.run(probe_all())
+    in_process = probe.cpu_time_ns / 1e9 / count
+    try:
+        spawned = subprocess_ping_cpu(host, count) / count
+    except (OSError, subprocess.SubprocessError):
+        spawned = None
+
+    print(f"🎯 目標: {host} ({probe.method})")
+    print(f"⚙️  進程內探測: {in_process * 1000:.3f}ms CPU / 樣本")
+    if spawned is not None:
+        print(f"🐢 ping 子進程: {spawned * 1000:.3f}ms CPU / 樣本")
+        if in_process > 0:
+            print(f"⚡ 節省: {(spawned - in_process) * 1000:.3f}ms CPU / 樣本 ({spawned / in_process:.0f}x)")
+    return in_process, spawned
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="進程內延遲探測")
+    parser.add_argument('host', nargs='?', default='google.com')
+    parser.add_argument('--port', type=int, default=443, help="TCP 探測端口")
+    parser.add_argument('--tcp', action='store_true', help="只使用 TCP 連接計時")
+    parser.add_argument('--burst', type=int, default=3)
+    parser.add_argument('--compare', action='store_true', help="比較與 ping 子進程的 CPU 消耗")
+    parser.add_argument('--http', metavar='URL', help="HTTP 分階段探測指定 URL")
+    parser.add_argument('--insecure', action='store_true', help="HTTP 探測不驗證證書 (本機測試伺服器)")
+    parser.add_argument('--count', type=int, default=3, help="HTTP 探測次數")
+    parser.add_argument('--async', dest='use_async', action='store_true', help="使用事件循環版本的探測")
+    args = parser.parse_args()
+
+    if args.http:
+        context = ssl.create_default_context()
+        if args.insecure:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        probe = HttpProbe(args.http, ssl_context=context)
+
+        async def probe_all():
+            try:
+                return [await probe.probe_async() for _ in range(args.count)]
+            finally:
+                probe.close()
+
+        results = asyncio.run(probe_all()) if args.use_async else [probe.probe() for _ in range(args.count)]
+        for result in results:
+            print("  ".join(f"{key}={value:.2f}ms" if isinstance(value, float) else f"{key}={value}"
+                            for key, value in result.items()))
+        probe.close()
+    elif args.compare:
+        compare_cpu(args.host, args.port)
+    else:
+        probe = LatencyProbe(args.host, args.port, burst=args.burst, use_icmp=not args.tcp)
+        samples = asyncio.run(probe.probe_async()) if args.use_async else probe.probe()
+        print(f"{probe.method}: " + ", ".join(f"{s:.2f}ms" if s is not None else "失敗" for s in samples))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+性能分析
+
+--profile 模式使用的兩種分析器:
+  sample    取樣分析器: 後台線程定時記錄主線程的調用棧，輸出 folded 格式
+            (flamegraph.pl、inferno、speedscope 都可以直接讀取)
+  cprofile  cProfile: 輸出 .pstats (可用 snakeviz 查看，或用 flameprof 轉為火焰圖)
+"""
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.001, thread_id=None):
+        self.interval = interval        # 取樣間隔 (秒)
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='sampling-profiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write_folded(self, path):
+        """寫入 folded 格式: 每行為 "根;...;葉 樣本數" """
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def run_profiled(func, output, mode='sample', interval=0.001):
+    """在分析器下運行 func，把結果寫入 output (不含副檔名)，返回寫入的檔案路徑"""
+    started = time.perf_counter()
+    if mode == 'cprofile':
+        profile = cProfile.Profile()
+        try:
+            profile.runcall(func)
+        finally:
+            path = f"{output}.pstats"
+            profile.dump_stats(path)
+    else:
+        profiler = SamplingProfiler(interval)
+        profiler.start()
+        try:
+            func()
+        finally:
+            profiler.stop()
+            path = f"{output}.folded"
+            profiler.write_folded(path)
+    print(f"🔬 分析完成 ({time.perf_counter() - started:.1f}秒)，結果已寫入 {path}")
+    if mode == 'cprofile':
+        print(f"   查看: python3 -m pstats {path}  或  snakeviz {path}")
+    else:
+        print(f"   火焰圖: flamegraph.pl {path} > profile.svg  或匯入 https://www.speedscope.app")
+    return path
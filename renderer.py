@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+差分終端渲染器
+
+在記憶體中構建整個畫面，和上一幀比較後只用游標定位重寫有變化的行，
+所有輸出合併為一次寫入，避免 os.system('clear') 的進程開銷和閃爍。
+比較使用截斷前的原始行，只有變化的行才計算顯示寬度和截斷。
+"""
+import re
+import shutil
+import sys
+import time
+import unicodedata
+
+
+ANSI_ESCAPE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+
+# 不佔寬度的字元: 零寬連接符、變體選擇符
+ZERO_WIDTH = {'\u200b', '\u200c', '\u200d', '\u2060', '\ufe0e', '\ufe0f'}
+
+
+def char_width(char):
+    """返回單個字元在終端中的顯示寬度"""
+    if char in ZERO_WIDTH or unicodedata.combining(char):
+        return 0
+    if unicodedata.category(char) in ('Mn', 'Me', 'Cf', 'Cc'):
+        return 0
+    if unicodedata.east_asian_width(char) in ('W', 'F'):
+        return 2
+    return 1
+
+
+def display_width(text):
+    """計算文字的顯示寬度，忽略 ANSI 顏色代碼，中文和 emoji 佔兩格"""
+    text = ANSI_ESCAPE.sub('', text)
+    width = 0
+    for i, char in enumerate(text):
+        w = char_width(char)
+        # 帶 VS16 (U+FE0F) 的字元以 emoji 形式顯示，例如 ⏱️
+        if w == 1 and i + 1 < len(text) and text[i + 1] == '\ufe0f':
+            w = 2
+        width += w
+    return width
+
+
+def truncate(text, width):
+    """把文字截斷到指定顯示寬度，保留 ANSI 顏色代碼"""
+    # ASCII 字元 (包括 ANSI 顏色代碼) 的寬度最多為 1，長度不超過寬度時不必逐字計算
+    if len(text) <= width and text.isascii():
+        return text
+    if display_width(text) <= width:
+        return text
+    result = []
+    used = 0
+    index = 0
+    while index < len(text):
+        match = ANSI_ESCAPE.match(text, index)
+        if match:
+            result.append(match.group())
+            index = match.end()
+            continue
+        char = text[index]
+        w = char_width(char)
+        if w == 1 and index + 1 < len(text) and text[index + 1] == '\ufe0f':
+            w = 2
+        if used + w > width:
+            break
+        result.append(char)
+        used += w
+        index += 1
+    return ''.join(result) + '\033[0m'
+
+
+class FrameRenderer:
+    def __init__(self, stream=None, budget_ms=1.0, full_redraw_every=60):
+        self.stream = stream or sys.stdout
+        self.previous = None                        # 上一幀截斷前的原始行
+        self.previous_output = None                 # 上一幀實際輸出的行
+        self.terminal_size = None
+        self.budget_ms = budget_ms                  # 每幀的渲染時間預算
+        self.full_redraw_every = full_redraw_every  # 定期完整重繪，清除其他輸出留下的殘影
+        self.frame_count = 0
+        self.last_render_ms = 0.0
+        self.max_render_ms = 0.0
+        self.total_render_ms = 0.0
+        self.over_budget = 0
+        self.last_changed_lines = 0
+
+    def reset(self):
+        """下一幀完整重繪"""
+        self.previous = None
+        self.previous_output = None
+
+    def render(self, lines):
+        """輸出一幀，只重寫與上一幀不同的行"""
+        started = time.perf_counter()
+        size = shutil.get_terminal_size()
+        columns = max(1, size.columns - 1)
+        lines = list(lines)
+
+        if (self.previous is None or size != self.terminal_size
+                or (self.full_redraw_every and self.frame_count % self.full_redraw_every == 0)):
+            # 完整重繪: 隱藏游標、清屏、輸出所有行
+            shown = [truncate(line, columns) for line in lines]
+            output = ['\033[?25l\033[H\033[2J', '\n'.join(shown)]
+            changed = len(lines)
+        else:
+            # 終端大小不變時，原始行相同則截斷結果也相同，沿用上一幀的輸出
+            previous, shown = self.previous, self.previous_output[:len(lines)]
+            output = []
+            changed = 0
+            for row, line in enumerate(lines):
+                if row < len(previous) and previous[row] == line:
+                    continue
+                text = truncate(line, columns)
+                if row < len(shown):
+                    shown[row] = text
+                else:
+                    shown.append(text)
+                output.append(f'\033[{row + 1};1H{text}\033[K')
+                changed += 1
+            if len(lines) < len(previous):
+                # 新畫面較短，清除多餘的行
+                output.append(f'\033[{len(lines) + 1};1H\033[J')
+
+        if output:
+            self.stream.write(''.join(output))
+            self.stream.flush()
+
+        self.previous = lines
+        self.previous_output = shown
+        self.terminal_size = size
+        self.frame_count += 1
+        self.last_changed_lines = changed
+        self.last_render_ms = (time.perf_counter() - started) * 1000
+        self.max_render_ms = max(self.max_render_ms, self.last_render_ms)
+        self.total_render_ms += self.last_render_ms
+        if self.last_render_ms > self.budget_ms:
+            self.over_budget += 1
+
+    def average_render_ms(self):
+        if not self.frame_count:
+            return 0.0
+        return self.total_render_ms / self.frame_count
+
+    def close(self):
+        """恢復游標並移到畫面下方"""
+        rows = len(self.previous) if self.previous else 0
+        self.stream.write(f'\033[{rows + 1};1H\033[?25h')
+        self.stream.flush()
+        self.reset()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+用量彙總索引
+
+把每小時的費用和 Token 預先彙總成按小時、日、週、月的連續陣列
+(array('d'))。任意範圍 (7 / 30 / 90 / 365 天) 和粒度的查詢只切片
+對應的桶，耗時與桶數成正比，與歷史記錄的長度無關；切換圖表範圍
+不必重新運行 ccusage。
+
+桶的編號: 小時為 epoch 小時數，日為 date.toordinal()，週為所在週一的
+(toordinal() - 1) // 7，月為 年 * 12 + 月 - 1。日、週、月按本地時間劃分。
+"""
+from array import array
+from datetime import date, datetime, timedelta
+
+from usage_reader import IN, OUT, CACHE_CREATE, CACHE_READ, COST
+
+
+LEVELS = ('hour', 'day', 'week', 'month')
+LEVEL_NAMES = {'hour': '按小時', 'day': '按日', 'week': '按週', 'month': '按月'}
+# 範圍 -> (天數, 預設粒度)
+RANGES = {'7d': (7, 'day'), '30d': (30, 'day'), '90d': (90, 'week'), '365d': (365, 'month')}
+
+
+def bucket_index(level, moment):
+    """返回本地時間 moment 所在的桶編號"""
+    if level == 'hour':
+        return int(moment.timestamp()) // 3600
+    ordinal = moment.toordinal()
+    if level == 'day':
+        return ordinal
+    if level == 'week':
+        # 0001-01-01 是週一
+        return (ordinal - 1) // 7
+    return moment.year * 12 + moment.month - 1
+
+
+def bucket_label(level, index):
+    if level == 'hour':
+        return datetime.fromtimestamp(index * 3600).strftime('%m-%d %H時')
+    if level == 'day':
+        return date.fromordinal(index).strftime('%m-%d')
+    if level == 'week':
+        return date.fromordinal(index * 7 + 1).strftime('%m-%d週')
+    return f"{index // 12}-{index % 12 + 1:02d}"
+
+
+def parse_day_key(key, today=None):
+    """解析 daily_costs 的日期鍵 (YYYY-MM-DD、MM-DD 或 MM/DD)，沒有年份時取不晚於今天的年份"""
+    today = today or date.today()
+    parts = key.replace('/', '-').split('-')
+    try:
+        if len(parts) == 3:
+            return date(int(parts[0]), int(parts[1]), int(parts[2]))
+        day = date(today.year, int(parts[0]), int(parts[1]))
+    except (ValueError, IndexError):
+        return None
+    return day if day <= today else day.replace(year=today.year - 1)
+
+
+class Series:
+    """從 first 開始的連續桶，值存放在 array('d') 中"""
+
+    def __init__(self):
+        self.first = None
+        self.values = array('d')
+
+    def add(self, index, value):
+        if self.first is None:
+            self.first = index
+        elif index < self.first:
+            self.values = array('d', bytes(8 * (self.first - index))) + self.values
+            self.first = index
+        offset = index - self.first
+        if offset >= len(self.values):
+            self.values.frombytes(bytes(8 * (offset - len(self.values) + 1)))
+        self.values[offset] += value
+
+    def slice(self, start, stop):
+        """返回編號 start 到 stop (含) 的值，沒有數據的桶為 0"""
+        result = array('d', bytes(8 * (stop - start + 1)))
+        if self.first is None:
+            return result
+        low = max(start, self.first)
+        high = min(stop, self.first + len(self.values) - 1)
+        if low <= high:
+            result[low - start:high - start + 1] = self.values[low - self.first:high - self.first + 1]
+        return result
+
+
+class RollupIndex:
+    def __init__(self):
+        self.cost = {level: Series() for level in LEVELS}
+        self.tokens = {level: Series() for level in LEVELS}
+        self.hours = {}                 # 小時 -> (費用, Token)，用於計算增量
+        self.generation = None          # 已同步的 UsageReader.generation
+
+    def add(self, moment, cost, tokens, levels=LEVELS):
+        for level in levels:
+            index = bucket_index(level, moment)
+            self.cost[level].add(index, cost)
+            self.tokens[level].add(index, tokens)
+
+    def set_hour(self, hour, cost, tokens):
+        """設置某個小時 (epoch 秒) 的總量，只把與舊值的差額加到各級桶中"""
+        old_cost, old_tokens = self.hours.get(hour, (0.0, 0))
+        if cost == old_cost and tokens == old_tokens:
+            return
+        self.hours[hour] = (cost, tokens)
+        self.add(datetime.fromtimestamp(hour), cost - old_cost, tokens - old_tokens)
+
+    def sync(self, reader):
+        """根據 UsageReader 的小時統計更新，只處理上次同步後變化的小時"""
+        touched = reader.take_touched_hours()
+        if reader.generation != self.generation:
+            # 讀取器被重置或從檢查點載入，重新建立
+            self.__init__()
+            self.generation = reader.generation
+            touched = reader.hourly.keys()
+        for hour in touched:
+            bucket = reader.hourly.get(hour)
+            if bucket is None:
+                continue
+            models = bucket['models'].values()
+            self.set_hour(hour, sum(stats[COST] for stats in models),
+                          sum(stats[IN] + stats[OUT] + stats[CACHE_CREATE] + stats[CACHE_READ] for stats in models))
+
+    @classmethod
+    def from_daily_costs(cls, daily_costs, today=None):
+        """從 {日期: 費用} 建立只有日、週、月粒度的索引 (ccusage daily 和監測服務的數據)"""
+        index = cls()
+        for key, cost in daily_costs.items():
+            day = parse_day_key(key, today)
+            if day is not None:
+                index.add(datetime(day.year, day.month, day.day), cost, 0, LEVELS[1:])
+        return index
+
+    def has_level(self, level):
+        return self.cost[level].first is not None
+
+    def bucket_range(self, days, level, now=None):
+        """返回最近 days 天 (含今天) 在 level 粒度下的第一個和最後一個桶編號"""
+        now = now or datetime.now()
+        start = datetime.combine((now - timedelta(days=days - 1)).date(), datetime.min.time())
+        return bucket_index(level, start), bucket_index(level, now)
+
+    def query(self, days, level='day', now=None):
+        """返回最近 days 天內每個桶的 [(標籤, 費用, Token)]"""
+        first, last = self.bucket_range(days, level, now)
+        costs = self.cost[level].slice(first, last)
+        tokens = self.tokens[level].slice(first, last)
+        return [(bucket_label(level, first + offset), costs[offset], int(tokens[offset]))
+                for offset in range(len(costs))]
+
+    def total(self, days, now=None):
+        """最近 days 天的總費用"""
+        first, last = self.bucket_range(days, 'day', now)
+        return sum(self.cost['day'].slice(first, last))
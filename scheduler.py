@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+探測排程器
+
+所有探測 (ping、HTTP、ccusage blocks、daily) 都是同一個 asyncio 事件循環
+中的協程，按各自的間隔運行，每次運行都有獨立的超時。整個監測器只用
+一個線程，空閒時停在事件循環的等待中，幾乎不佔 CPU。顯示只讀取最新
+結果，不會被任何一個緩慢的探測阻塞。
+
+探測間隔可以是固定秒數，也可以是 AdaptiveInterval: 忙碌時使用最快的
+間隔，空閒時每個周期加倍直到上限。wake() 讓等待中的探測立即運行，
+用於活動恢復或外部事件 (例如對話記錄被寫入) 觸發刷新。
+"""
+import asyncio
+import time
+
+
+class AdaptiveInterval:
+    def __init__(self, fast, ceiling, is_busy, factor=2.0):
+        self.fast = fast                # 忙碌時的間隔 (秒)
+        self.ceiling = max(fast, ceiling)
+        self.is_busy = is_busy          # 返回當前是否忙碌的函數
+        self.factor = factor
+        self.current = fast
+
+    def next(self):
+        """返回下一個周期的間隔: 忙碌時回到最快，否則按倍數退避到上限"""
+        if self.is_busy():
+            self.current = self.fast
+        else:
+            self.current = min(self.ceiling, self.current * self.factor)
+        return self.current
+
+
+class ProbeScheduler:
+    def __init__(self, timings=None):
+        self.probes = {}
+        self.results = {}
+        self.tasks = []
+        self.wake_events = {}
+        self.timings = timings          # StageTimings，設置後記錄每次運行的耗時
+
+    def add(self, name, func, interval, timeout=None, limit=None):
+        """註冊一個探測，func 為協程函數，返回值會保存為最新結果
+
+        interval 為固定秒數或 AdaptiveInterval。
+        timeout 為單次運行的上限 (秒)，超時的運行會被取消並記為錯誤。
+        limit 為多個探測共用的 asyncio.Semaphore，限制它們同時運行的數量；
+        等待信號量的時間計入周期，探測間隔不會因此變長。
+        """
+        self.probes[name] = (func, interval, timeout, limit)
+        self.wake_events[name] = asyncio.Event()
+
+    def start(self):
+        """為每個探測建立一個任務，必須在事件循環中調用"""
+        for name in self.probes:
+            self.tasks.append(asyncio.ensure_future(self.run_probe(name)))
+
+    async def stop(self):
+        """取消所有探測並等待它們完成清理 (例如結束子進程)"""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def wake(self, *names):
+        """讓指定的探測結束等待，立即開始下一次運行；不指定時喚醒所有使用 AdaptiveInterval 的探測"""
+        if not names:
+            names = [name for name, probe in self.probes.items() if isinstance(probe[1], AdaptiveInterval)]
+        for name in names:
+            self.wake_events[name].set()
+
+    def current_interval(self, name):
+        """返回某個探測當前使用的間隔 (秒)"""
+        interval = self.probes[name][1]
+        return interval.current if isinstance(interval, AdaptiveInterval) else interval
+
+    async def run_probe(self, name):
+        """探測任務: 執行探測、保存結果、等待下一個周期"""
+        func, interval, timeout, limit = self.probes[name]
+        event = self.wake_events[name]
+        while True:
+            # 運行期間收到的喚醒會讓下一次運行立即開始
+            event.clear()
+            started = time.perf_counter()
+            value, error = None, None
+            try:
+                if limit is None:
+                    value = await asyncio.wait_for(func(), timeout)
+                else:
+                    async with limit:
+                        value = await asyncio.wait_for(func(), timeout)
+            except asyncio.TimeoutError:
+                error = f"TimeoutError: 超過 {timeout} 秒"
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            duration = time.perf_counter() - started
+            if self.timings is not None:
+                self.timings.record(name, duration * 1000)
+
+            self.results[name] = {
+                'value': value,
+                'error': error,
+                'duration': duration,
+                'time': time.time()
+            }
+
+            if isinstance(interval, AdaptiveInterval):
+                delay = max(0.0, interval.next() - duration)
+            else:
+                delay = max(0.0, interval - duration)
+            try:
+                await asyncio.wait_for(event.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def get(self, name, default=None):
+        """返回某個探測的最新結果值"""
+        result = self.results.get(name)
+        if result is None or result['error'] is not None:
+            return default
+        return result['value']
+
+    def snapshot(self):
+        """返回所有探測最新結果的副本"""
+        return {name: dict(result) for name, result in self.results.items()}
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+多目標探測
+
+從設定檔讀取要監測的目標 (Claude API、代理、套件倉庫、VPN 閘道等)，
+每個目標有自己的探測類型、間隔和閾值。所有目標作為探測排程器中的
+協程同時運行，通過一個信號量限制同時進行的探測數量。
+
+設定檔格式見 targets.example.json:
+  primary       主要網絡探測的目標 (預設 google.com)
+  concurrency   同時進行的目標探測上限
+  targets       目標列表，每個目標:
+                  name, type (tcp / icmp / http), host + port 或 url,
+                  interval, timeout, warn_ms, crit_ms, max_loss, insecure,
+                  expect_status (HTTP 目標視為正常的狀態碼列表)
+
+HTTP 目標檢查的是可達性: 預設收到任何 HTTP 回應 (包括 404、405) 都視為
+正常，設置 expect_status 時只有列出的狀態碼才算正常。icmp 目標在系統
+不允許非特權 ICMP 時改為測量 TCP 連接時間，表格中會標明。
+"""
+import asyncio
+import json
+import os
+import ssl
+import time
+
+from latency_stats import LatencyRing
+from probes import LatencyProbe, HttpProbe
+from renderer import display_width, truncate
+from scheduler import ProbeScheduler
+
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'targets.json')
+DEFAULT_PRIMARY = {'host': 'google.com', 'port': 443, 'url': 'https://www.google.com/'}
+PROBE_TYPES = ('tcp', 'icmp', 'http')
+
+# 狀態的顯示順序 (有問題的目標排在前面) 和圖標
+STATE_ORDER = {'down': 0, 'slow': 1, 'warn': 2, None: 3, 'ok': 4}
+STATE_ICONS = {'down': '🔴', 'slow': '🟠', 'warn': '🟡', 'ok': '🟢', None: '⚪'}
+
+
+class Target:
+    def __init__(self, name, kind='tcp', host=None, port=443, url=None, interval=5, timeout=3.0,
+                 warn_ms=100, crit_ms=500, max_loss=0.05, insecure=False, expect_status=None):
+        self.name = name
+        self.kind = kind
+        self.host = host
+        self.port = port
+        self.url = url
+        self.interval = interval
+        self.timeout = timeout
+        self.warn_ms = warn_ms          # p95 超過這個值為 warn
+        self.crit_ms = crit_ms          # p95 超過這個值為 slow
+        self.max_loss = max_loss        # 丟包率超過這個值為 warn
+        self.expect_status = expect_status  # HTTP 正常的狀態碼，None 表示任何回應
+        self.last_status = None         # 最近一次的 HTTP 狀態碼
+        self.stats = LatencyRing(120)
+        self.last = None                # 最近一次的延遲 (毫秒)，失敗為 None
+        self.last_time = None
+        self.history = None             # HistoryLog，設置後記錄每個樣本
+
+        if kind == 'http':
+            context = ssl.create_default_context()
+            if insecure:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            self.probe = HttpProbe(url, method='HEAD', timeout=timeout, ssl_context=context)
+        else:
+            self.probe = LatencyProbe(host, port, burst=1, timeout=timeout, use_icmp=kind == 'icmp')
+
+    @classmethod
+    def from_config(cls, item):
+        """從設定檔的一個項目建立目標，設定不完整時拋出 ValueError"""
+        if not isinstance(item, dict):
+            raise ValueError(f"目標必須是物件: {item!r}")
+        name = item.get('name')
+        kind = item.get('type', 'tcp')
+        if not name:
+            raise ValueError(f"目標缺少 name: {item}")
+        if kind not in PROBE_TYPES:
+            raise ValueError(f"目標 {name} 的 type 必須是 {', '.join(PROBE_TYPES)} 之一")
+        if kind == 'http' and not item.get('url'):
+            raise ValueError(f"HTTP 目標 {name} 缺少 url")
+        if kind != 'http' and not item.get('host'):
+            raise ValueError(f"目標 {name} 缺少 host")
+        expect = item.get('expect_status')
+        if expect is not None and not (isinstance(expect, list) and all(isinstance(code, int) for code in expect)):
+            raise ValueError(f"目標 {name} 的 expect_status 必須是狀態碼列表，例如 [200, 204]")
+        options = {key: item[key] for key in ('host', 'port', 'url', 'interval', 'timeout', 'warn_ms',
+                                              'crit_ms', 'max_loss', 'insecure', 'expect_status') if key in item}
+        return cls(name, kind, **options)
+
+    @property
+    def address(self):
+        return self.url if self.kind == 'http' else f"{self.host}:{self.port}"
+
+    @property
+    def method(self):
+        """實際使用的探測方式: http / icmp / tcp (icmp 目標無法使用 ICMP 時為 tcp)"""
+        return 'http' if self.kind == 'http' else self.probe.method
+
+    def is_up(self, result):
+        """HTTP 目標是否正常: 預設只要收到回應，設置 expect_status 時狀態碼必須在列表中"""
+        if result['status'] is None:
+            return False
+        if self.expect_status is None:
+            return True
+        return result['status'] in self.expect_status
+
+    async def run(self):
+        """探測一次並記錄結果，返回延遲 (毫秒) 或 None"""
+        if self.kind == 'http':
+            result = await self.probe.probe_async()
+            self.last_status = result['status']
+            value = result['total'] if self.is_up(result) else None
+        else:
+            value = (await self.probe.probe_async())[0]
+        self.stats.add(value)
+        self.last = value
+        self.last_time = time.time()
+        if self.history is not None:
+            self.history.record(f"target:{self.name}", value, self.last_time)
+        return value
+
+    def state(self, summary=None):
+        """根據最近的結果和窗口統計返回 ok / warn / slow / down，尚未探測時返回 None"""
+        summary = summary or self.stats.summary()
+        if not summary['count']:
+            return None
+        if self.last is None:
+            return 'down'
+        if summary['p95'] is not None and summary['p95'] >= self.crit_ms:
+            return 'slow'
+        if summary['loss_rate'] > self.max_loss or (summary['p95'] or 0) >= self.warn_ms:
+            return 'warn'
+        return 'ok'
+
+    def status(self):
+        summary = self.stats.summary()
+        return {
+            'name': self.name,
+            'type': self.kind,
+            'method': self.method,
+            'address': self.address,
+            'http_status': self.last_status,
+            'interval': self.interval,
+            'state': self.state(summary),
+            'last_ms': self.last,
+            'p50': summary['p50'],
+            'p95': summary['p95'],
+            'loss_rate': summary['loss_rate'],
+            'count': summary['count'],
+            'time': self.last_time
+        }
+
+    def close(self):
+        if self.kind == 'http':
+            self.probe.close()
+
+
+class TargetSet:
+    def __init__(self, targets=(), concurrency=16, primary=None):
+        self.targets = list(targets)
+        self.concurrency = concurrency
+        self.primary = dict(DEFAULT_PRIMARY, **(primary or {}))
+
+    @classmethod
+    def load(cls, path=DEFAULT_CONFIG):
+        """讀取設定檔；檔案不存在時返回空的目標集合，格式錯誤時拋出 ValueError"""
+        try:
+            with open(path) as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            return cls()
+        except OSError as e:
+            raise ValueError(f"無法讀取 {path}: {e}")
+        if not isinstance(config, dict):
+            raise ValueError(f"{path} 必須是 JSON 物件")
+        if not isinstance(config.get('targets', []), list):
+            raise ValueError(f"{path} 中的 targets 必須是列表")
+        if not isinstance(config.get('primary', {}), dict):
+            raise ValueError(f"{path} 中的 primary 必須是物件")
+        targets = [Target.from_config(item) for item in config.get('targets', [])]
+        names = [target.name for target in targets]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"目標名稱重複: {', '.join(duplicates)}")
+        return cls(targets, config.get('concurrency', 16), config.get('primary'))
+
+    def register(self, scheduler, history=None):
+        """把每個目標註冊為排程器中的探測，共用一個並行上限；history 為 HistoryLog 時記錄每個樣本"""
+        limit = asyncio.Semaphore(self.concurrency)
+        for target in self.targets:
+            target.history = history
+            scheduler.add(f"target:{target.name}", target.run, target.interval,
+                          target.timeout + 1, limit=limit)
+
+    def status(self):
+        return [target.status() for target in self.targets]
+
+    def close(self):
+        for target in self.targets:
+            target.close()
+
+
+def format_ms(value):
+    return f"{value:.1f}ms" if value is not None else "--"
+
+
+def format_table(statuses, max_rows=12, name_width=16):
+    """把目標狀態排成緊湊的表格，問題目標排在前面，超過 max_rows 時省略正常的目標"""
+    def pad(text, width):
+        text = truncate(text, width) if display_width(text) > width else text
+        return text + ' ' * (width - display_width(text))
+
+    ordered = sorted(statuses, key=lambda status: STATE_ORDER.get(status['state'], 3))
+    lines = []
+    for status in ordered[:max_rows]:
+        loss = f"{status['loss_rate'] * 100:.0f}%" if status['loss_rate'] is not None else "--"
+        note = ''
+        if status['type'] == 'icmp' and status.get('method') == 'tcp':
+            note = f"  (ICMP 不可用或被過濾，TCP :{status['address'].rsplit(':', 1)[-1]})"
+        elif status.get('http_status') is not None and status['http_status'] >= 400:
+            note = f"  HTTP {status['http_status']}"
+        lines.append(f"  {STATE_ICONS.get(status['state'], '⚪')} {pad(status['name'], name_width)} "
+                     f"{format_ms(status['last_ms']):>9}  p95 {format_ms(status['p95']):>9}  丟包 {loss:>4}{note}")
+    hidden = ordered[max_rows:]
+    if hidden:
+        healthy = sum(1 for status in hidden if status['state'] == 'ok')
+        lines.append(f"  … 其餘 {len(hidden)} 個目標 ({healthy} 個正常)")
+    return lines
+
+
+async def start_stand_ins(count):
+    """啟動 count 個本機替身伺服器，一半只接受 TCP 連接，一半回應 HTTP，返回 (伺服器列表, 目標列表)"""
+    async def accept_only(reader, writer):
+        writer.close()
+
+    async def http_ok(reader, writer):
+        try:
+            while True:
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                if reader.at_eof():
+                    break
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+                await writer.drain()
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+    servers, targets = [], []
+    for index in range(count):
+        kind = 'http' if index % 2 else 'tcp'
+        server = await asyncio.start_server(http_ok if kind == 'http' else accept_only, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        servers.append(server)
+        if kind == 'http':
+            targets.append(Target(f"stand-in-{index}", 'http', url=f"http://127.0.0.1:{port}/", interval=1))
+        else:
+            targets.append(Target(f"stand-in-{index}", 'tcp', host='127.0.0.1', port=port, interval=1))
+    return servers, targets
+
+
+async def run_targets(target_set, duration, servers=()):
+    """運行所有目標 duration 秒，返回每個目標的實際探測周期"""
+    scheduler = ProbeScheduler()
+    target_set.register(scheduler)
+    started = time.perf_counter()
+    scheduler.start()
+    await asyncio.sleep(duration)
+    await scheduler.stop()
+    elapsed = time.perf_counter() - started
+    target_set.close()
+    if servers:
+        # 讓替身伺服器的連接處理協程讀到連接關閉後自行結束
+        await asyncio.sleep(0.1)
+    for server in servers:
+        server.close()
+        await server.wait_closed()
+    return {target.name: elapsed / target.stats.count if target.stats.count else None
+            for target in target_set.targets}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="多目標探測")
+    parser.add_argument('config', nargs='?', default=DEFAULT_CONFIG, help="目標設定檔")
+    parser.add_argument('--duration', type=float, default=10, help="運行時間 (秒)")
+    parser.add_argument('--stand-in', type=int, metavar='N', help="改為探測 N 個本機替身伺服器 (間隔 1 秒)")
+    parser.add_argument('--concurrency', type=int, help="同時進行的探測上限")
+    args = parser.parse_args()
+
+    async def main():
+        servers = ()
+        if args.stand_in:
+            servers, targets = await start_stand_ins(args.stand_in)
+            target_set = TargetSet(targets, args.concurrency or 16)
+        else:
+            target_set = TargetSet.load(args.config)
+            if args.concurrency:
+                target_set.concurrency = args.concurrency
+        if not target_set.targets:
+            print(f"❌ 沒有監測目標: {args.config}")
+            return
+        print(f"🎯 探測 {len(target_set.targets)} 個目標 {args.duration:.0f} 秒 (並行上限 {target_set.concurrency})...")
+        periods = await run_targets(target_set, args.duration, servers)
+        for line in format_table(target_set.status(), max_rows=len(target_set.targets)):
+            print(line)
+        measured = [period for period in periods.values() if period is not None]
+        if measured:
+            expected = sum(target.interval for target in target_set.targets) / len(target_set.targets)
+            print(f"⏱️  平均探測周期: {sum(measured) / len(measured):.2f}秒 (設定 {expected:.2f}秒)，"
+                  f"最慢 {max(measured):.2f}秒")
+
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""ccusage 客戶端的解析測試 (python3 -m pytest)"""
+import asyncio
+import json
+import subprocess
+import time
+
+import pytest
+
+import ccusage_client
+from ccusage_client import BlockRecord, CcusageLauncher, json_unsupported, parse_current_block
+
+
+def block(start, active=False, gap=False, tokens=1000):
+    return {'startTime': start, 'endTime': start, 'isActive': active, 'isGap': gap,
+            'totalTokens': tokens, 'costUSD': tokens / 1000, 'models': ['claude-sonnet-4-20250514']}
+
+
+def blocks_json(*blocks):
+    return json.dumps({'blocks': list(blocks)}, indent=2)
+
+
+def test_failed_resolve_is_cached_with_backoff(tmp_path, monkeypatch):
+    # 離線首次運行: 有 npx 但無法安裝 ccusage
+    monkeypatch.setattr(ccusage_client, 'find_ccusage_binaries', lambda: [])
+    monkeypatch.setattr(ccusage_client, 'find_npx_path', lambda: '/usr/bin/npx')
+    launcher = CcusageLauncher(cache_path=str(tmp_path / 'ccusage.json'))
+    calls = []
+
+    async def read_version_async(prefix, timeout=30):
+        calls.append(prefix)
+        await asyncio.sleep(0.05)
+        return None
+
+    launcher.read_version_async = read_version_async
+
+    async def main():
+        # 同時調用的協程共用一次解析，之後在退避時間內不再重新解析
+        results = await asyncio.gather(*(launcher.run_async(['blocks']) for _ in range(3)))
+        results.append(await launcher.run_async(['blocks']))
+        return results
+
+    assert asyncio.run(main()) == [None] * 4
+    assert len(calls) == 1
+    assert launcher.resolve() is None
+    assert len(calls) == 1
+
+    launcher.retry_resolve_at = time.monotonic()
+    asyncio.run(launcher.resolve_async())
+    assert len(calls) == 2
+    # 第二次失敗後的等待時間加倍
+    assert launcher.retry_resolve_at - time.monotonic() > ccusage_client.RESOLVE_RETRY_INTERVAL * 1.5
+
+
+def test_current_block_is_active_or_latest_with_usage():
+    text = blocks_json(block('2026-10-17T08:00:00.000Z'),
+                       block('2026-10-17T13:00:00.000Z', active=True, tokens=5),
+                       block('2026-10-17T18:00:00.000Z', gap=True))
+    record = parse_current_block(text)
+    assert isinstance(record, BlockRecord)
+    assert record.is_active and record.tokens == 5
+
+    text = blocks_json(block('2026-10-17T08:00:00.000Z', tokens=7),
+                       block('2026-10-17T13:00:00.000Z', tokens=0),
+                       block('2026-10-17T18:00:00.000Z', gap=True))
+    assert parse_current_block(text).tokens == 7
+    assert parse_current_block(blocks_json()) is None
+
+
+@pytest.mark.parametrize('text', [
+    '[]',
+    '{"blocks": [',
+    blocks_json(block('2026-10-17T08:00:00.000Z'))[:-20],
+    blocks_json(block('2026-10-17T08:00:00.000Z')).rsplit(']', 1)[0],
+])
+def test_truncated_or_unexpected_output_raises_value_error(text):
+    with pytest.raises(ValueError):
+        parse_current_block(text)
+
+
+def test_json_unsupported_only_when_flag_is_rejected_or_ignored():
+    def result(returncode, stdout='', stderr=''):
+        return subprocess.CompletedProcess([], returncode, stdout, stderr)
+
+    assert json_unsupported(result(1, stderr="error: unknown option '--json'"))
+    assert json_unsupported(result(0, stdout='┌──────┐\n│ Block │'))
+    assert not json_unsupported(result(1, stderr='ENOTFOUND registry.npmjs.org'))
+    assert not json_unsupported(result(0, stdout='{"blocks": ['))
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""價格表查找的測試 (python3 -m pytest)"""
+from pricing import PriceTable
+
+
+def test_opus_versions_use_their_own_rates():
+    table = PriceTable.load()
+    assert table.lookup('claude-3-opus-20240229') == (15.0, 75.0, 18.75, 1.5)
+    assert table.lookup('claude-opus-4-1-20250805') == (15.0, 75.0, 18.75, 1.5)
+    assert table.lookup('claude-opus-4-5-20251101') == (5.0, 25.0, 6.25, 0.5)
+
+
+def test_unlisted_opus_falls_back_to_the_higher_rate():
+    table = PriceTable.load()
+    assert table.lookup('claude-opus-9-20300101') == (15.0, 75.0, 18.75, 1.5)
+    assert table.cost('claude-opus-9-20300101', 1_000_000, 0, 0, 0) == 15.0
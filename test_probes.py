@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""進程內探測的測試 (python3 -m pytest)"""
+import asyncio
+import socket
+
+import probes
+from probes import HttpProbe, LatencyProbe
+
+
+def test_filtered_icmp_falls_back_to_tcp(monkeypatch):
+    # ICMP 套接字可以建立，但回覆全部被過濾
+    server = socket.create_server(('127.0.0.1', 0))
+    port = server.getsockname()[1]
+    probe = LatencyProbe('127.0.0.1', port, burst=2, timeout=0.5)
+    monkeypatch.setattr(probe, 'open_icmp_socket',
+                        lambda: None if probe.icmp_paused else socket.socket(socket.AF_INET, socket.SOCK_DGRAM))
+    probe.icmp_available = True
+
+    async def filtered(sock, address):
+        return None
+
+    monkeypatch.setattr(probe, 'icmp_once_async', filtered)
+
+    async def main():
+        return [await probe.probe_async() for _ in range(probes.ICMP_FALLBACK_AFTER + 1)]
+
+    try:
+        results = asyncio.run(main())
+    finally:
+        server.close()
+    assert all(sample is None for samples in results[:-2] for sample in samples)
+    # 第 N 個周期確認 TCP 可達後改用 TCP，之後的周期直接使用 TCP
+    assert all(sample is not None for samples in results[-2:] for sample in samples)
+    assert probe.method == 'tcp'
+    assert probe.cpu_time_ns > 0
+
+
+def test_filtered_icmp_stays_when_tcp_also_fails(monkeypatch):
+    server = socket.create_server(('127.0.0.1', 0))
+    port = server.getsockname()[1]
+    server.close()
+    probe = LatencyProbe('127.0.0.1', port, burst=1, timeout=0.5)
+    monkeypatch.setattr(probe, 'open_icmp_socket', lambda: socket.socket(socket.AF_INET, socket.SOCK_DGRAM))
+    probe.icmp_available = True
+
+    async def filtered(sock, address):
+        return None
+
+    monkeypatch.setattr(probe, 'icmp_once_async', filtered)
+
+    async def main():
+        return [await probe.probe_async() for _ in range(probes.ICMP_FALLBACK_AFTER)]
+
+    assert asyncio.run(main()) == [[None]] * probes.ICMP_FALLBACK_AFTER
+    assert probe.method == 'icmp'
+
+
+def test_http_probe_reuses_keep_alive_connection():
+    connections = []
+
+    async def http_ok(reader, writer):
+        connections.append(writer)
+        while (line := await reader.readline()) != b'':
+            if line == b'\r\n':
+                writer.write(b"HTTP/1.1 204 No Content\r\nContent-Length: 0\r\n\r\n")
+                await writer.drain()
+        writer.close()
+
+    async def main():
+        server = await asyncio.start_server(http_ok, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        probe = HttpProbe(f"http://127.0.0.1:{port}/")
+        try:
+            return [await probe.probe_async() for _ in range(5)]
+        finally:
+            probe.close()
+            await asyncio.sleep(0.05)
+            server.close()
+            await server.wait_closed()
+
+    results = asyncio.run(main())
+    assert [result['status'] for result in results] == [204] * 5
+    # 只建立一次 TCP 連接，之後的探測都重用它
+    assert len(connections) == 1
+    assert [result['reused'] for result in results] == [False] + [True] * 4
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""差分渲染器的測試 (python3 -m pytest)"""
+import io
+
+from renderer import FrameRenderer, truncate
+
+
+def test_diff_rewrites_only_changed_lines_truncated(monkeypatch):
+    monkeypatch.setenv('COLUMNS', '11')
+    monkeypatch.setenv('LINES', '24')
+    stream = io.StringIO()
+    renderer = FrameRenderer(stream=stream, full_redraw_every=0)
+    frame = ['標題標題標題標題', 'a' * 30, 'short']
+    renderer.render(frame)
+    assert renderer.previous_output == [truncate(line, 10) for line in frame]
+
+    stream.truncate(0)
+    stream.seek(0)
+    renderer.render(['標題標題標題標題', 'b' * 30, 'short'])
+    assert renderer.last_changed_lines == 1
+    assert stream.getvalue() == f"\033[2;1H{'b' * 10}\033[0m\033[K"
+    assert renderer.previous_output[0] == truncate('標題標題標題標題', 10)
+
+    # 畫面變短時清除多餘的行
+    stream.truncate(0)
+    stream.seek(0)
+    renderer.render(['標題標題標題標題'])
+    assert renderer.last_changed_lines == 0
+    assert stream.getvalue() == '\033[2;1H\033[J'
+    assert renderer.previous_output == [truncate('標題標題標題標題', 10)]
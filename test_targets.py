@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""多目標探測對本機替身伺服器的測試 (python3 -m pytest)"""
+import asyncio
+
+from targets import TargetSet, run_targets, start_stand_ins
+
+
+def test_sixty_targets_keep_their_interval():
+    reused = []
+
+    async def main():
+        servers, targets = await start_stand_ins(60)
+        for target in targets:
+            if target.kind == 'http':
+                probe_async = target.probe.probe_async
+
+                async def record(probe_async=probe_async):
+                    result = await probe_async()
+                    reused.append(result['reused'])
+                    return result
+
+                target.probe.probe_async = record
+        target_set = TargetSet(targets)
+        return target_set, await run_targets(target_set, 3, servers)
+
+    target_set, periods = asyncio.run(main())
+    # 間隔 1 秒: 60 個目標同時探測時周期仍接近設定值
+    assert all(period is not None and 0.6 <= period <= 1.2 for period in periods.values()), periods
+    assert all(target.stats.count >= 3 for target in target_set.targets)
+    # 每個 HTTP 目標只在第一次探測時建立連接
+    assert reused.count(False) == 30
+    assert all(target.state() == 'ok' for target in target_set.targets)
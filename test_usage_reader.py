@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""UsageReader 的增量讀取測試 (python3 -m pytest)"""
+import asyncio
+import json
+import os
+from datetime import datetime, timezone
+
+from usage_reader import UsageReader, backfill_async
+
+
+def usage_line(timestamp, index, tokens=1000):
+    return json.dumps({
+        'timestamp': datetime.fromtimestamp(timestamp, timezone.utc).isoformat().replace('+00:00', 'Z'),
+        'requestId': f'req-{index}',
+        'message': {
+            'id': f'msg-{index}',
+            'model': 'claude-sonnet-4-20250514',
+            'usage': {'input_tokens': tokens, 'output_tokens': tokens},
+        },
+    }) + '\n'
+
+
+def write_lines(path, lines, mode='w'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, mode) as f:
+        f.writelines(lines)
+
+
+def test_rotating_one_file_keeps_other_files(tmp_path):
+    base = datetime(2026, 10, 18, 12).timestamp()
+    day = 86400
+    files = {
+        'old': str(tmp_path / 'project-a' / 'old.jsonl'),
+        'older': str(tmp_path / 'project-b' / 'older.jsonl'),
+        'current': str(tmp_path / 'project-a' / 'current.jsonl'),
+    }
+    write_lines(files['older'], [usage_line(base - 2 * day, 1)])
+    write_lines(files['old'], [usage_line(base - day, 2)])
+    write_lines(files['current'], [usage_line(base, 3), usage_line(base + 60, 4)])
+
+    reader = UsageReader([str(tmp_path)])
+    reader.refresh()
+    before = reader.get_daily_costs()
+    assert len(before) == 3
+
+    # 目錄監視只傳入被替換 (截斷) 的檔案
+    write_lines(files['current'], [usage_line(base, 3)])
+    reader.refresh([files['current']])
+
+    after = reader.get_daily_costs()
+    # 其他檔案的歷史保留，被替換的檔案按新內容重新計算
+    assert sorted(after) == sorted(before)
+    for key in sorted(before)[:2]:
+        assert after[key] == before[key]
+    assert after[sorted(before)[2]] == before[sorted(before)[2]] / 2
+    assert reader.record_count == 3
+    assert reader.rebuilt
+
+
+def test_refresh_paths_reads_only_appended_lines(tmp_path):
+    base = datetime(2026, 10, 18, 12).timestamp()
+    path = str(tmp_path / 'project' / 'session.jsonl')
+    write_lines(path, [usage_line(base, 1)])
+
+    reader = UsageReader([str(tmp_path)])
+    assert reader.refresh() == 1
+    write_lines(path, [usage_line(base + 60, 2)], mode='a')
+    assert reader.refresh([path]) == 1
+    assert reader.record_count == 2
+
+
+def test_backfill_with_one_worker_keeps_event_loop_running(tmp_path):
+    base = datetime(2026, 10, 18, 12).timestamp()
+    padding = json.dumps({'type': 'tool_result', 'content': 'x' * 2000}) + '\n'
+    lines = []
+    for index in range(3000):
+        lines += [usage_line(base + index, index), padding]
+    write_lines(str(tmp_path / 'project' / 'session.jsonl'), lines)
+
+    expected = UsageReader([str(tmp_path)])
+    expected.refresh()
+    reader = UsageReader([str(tmp_path)])
+    progress = []
+
+    async def main():
+        ticks = 0
+        task = asyncio.ensure_future(backfill_async(reader, 1, lambda done, total: progress.append(done)))
+        while not task.done():
+            # 讀取在事件循環之外進行，期間事件循環繼續運行
+            ticks += 1
+            await asyncio.sleep(0.001)
+        return await task, ticks
+
+    added, ticks = asyncio.run(main())
+    assert added == 3000
+    assert ticks > 1
+    assert reader.record_count == expected.record_count
+    assert reader.get_daily_costs() == expected.get_daily_costs()
+    assert progress and progress[-1] == os.path.getsize(str(tmp_path / 'project' / 'session.jsonl'))
+    # 已有讀取進度時交給正常的增量讀取
+    assert asyncio.run(backfill_async(reader, 1)) == 0
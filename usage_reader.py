@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+Claude Code 用量讀取器
+
+直接讀取 ~/.claude/projects/**/*.jsonl 對話記錄，記住每個檔案已讀取的
+位元組位置，每次刷新只解析新追加的內容，取代每次都要啟動 Node 的
+`npx ccusage blocks`。
+
+對話記錄中大部分行 (工具結果、貼上的大段內容) 沒有用量欄位。讀取時把
+檔案映射到記憶體，用位元組搜索找出包含 "usage" 的行，只對這些行調用
+json.loads，其他行不複製也不解碼。
+
+首次運行 (或清除檢查點後) 的完整彙總可以用 backfill() 分派到多個進程:
+每個進程讀取一組專案目錄，返回按小時、模型彙總的部分結果，最後合併。
+在事件循環中使用 backfill_async()，合併在事件循環線程中進行。
+"""
+import asyncio
+import glob
+import json
+import mmap
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from burn_rate import BurnRate
+from pricing import default_table, short_model_name
+
+
+# 每個對話區塊 (block) 的長度: 5 小時
+BLOCK_DURATION = 5 * 3600
+HOUR = 3600
+
+# 候選行必須包含的位元組，其他行不解析
+USAGE_MARKER = b'"usage"'
+
+# json.loads(bytes) 每次都要檢測編碼，先解碼為 str 再交給共用的解碼器較快
+DECODER = json.JSONDecoder()
+
+# 記錄總量小於這個大小時不啟動進程池，直接在當前進程讀取
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+
+# 每個小時桶中，每個模型的統計欄位索引
+IN, OUT, CACHE_CREATE, CACHE_READ, COST, COUNT = range(6)
+
+
+def default_projects_dirs():
+    """返回 Claude Code 對話記錄可能存放的目錄"""
+    dirs = []
+    config_dir = os.environ.get('CLAUDE_CONFIG_DIR')
+    if config_dir:
+        for path in config_dir.split(','):
+            dirs.append(os.path.join(os.path.expanduser(path.strip()), 'projects'))
+    dirs.append(os.path.expanduser('~/.config/claude/projects'))
+    dirs.append(os.path.expanduser('~/.claude/projects'))
+    return dirs
+
+
+def parse_timestamp(value):
+    """解析 ISO 8601 時間戳，返回 epoch 秒數"""
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+
+class UsageReader:
+    def __init__(self, projects_dirs=None, prices=None):
+        self.projects_dirs = projects_dirs or default_projects_dirs()
+        self.prices = prices or default_table()     # pricing.PriceTable
+        self.burn_rate = BurnRate()                 # 最近的消耗速度，每筆新用量更新一次
+        self.generation = 0
+        self.reset()
+
+    def reset(self):
+        """清空所有已讀取的狀態"""
+        self.offsets = {}       # 檔案路徑 -> 已讀取的位元組位置
+        self.inodes = {}        # 檔案路徑 -> inode，用於偵測檔案被替換
+        self.seen = set()       # 已計算過的 message.id:requestId，避免重複計算
+        # 小時桶: 小時起點 (epoch) -> {'first': ts, 'last': ts, 'models': {model: [in, out, cc, cr, cost, count]}}
+        self.hourly = {}
+        self.record_count = 0
+        # 自上次保存檢查點後的變更
+        self.dirty_hours = set()
+        self.dirty_files = set()
+        self.new_seen = []
+        self.rebuilt = True
+        # 自上次 take_touched_hours() 後變化的小時，供彙總索引增量更新
+        self.touched_hours = set()
+        self.burn_rate.reset()
+        self.generation += 1
+
+    def has_projects_dir(self):
+        """檢查是否存在任何對話記錄目錄"""
+        return any(os.path.isdir(path) for path in self.projects_dirs)
+
+    def find_files(self):
+        """列出所有 JSONL 對話記錄"""
+        files = []
+        for base in self.projects_dirs:
+            if os.path.isdir(base):
+                files.extend(glob.glob(os.path.join(base, '**', '*.jsonl'), recursive=True))
+        return files
+
+    def refresh(self, paths=None):
+        """讀取檔案新追加的內容，返回新增的記錄數
+
+        paths 為已知有變化的檔案 (例如來自目錄監視)，None 時掃描全部檔案。
+        """
+        files = self.find_files() if paths is None else [path for path in paths if os.path.isfile(path)]
+        if any(self.is_rotated(path) for path in files):
+            # 檔案被截斷或替換，已有的統計不再可靠，全部重新計算；
+            # 清空後必須重新讀取所有檔案，而不只是這次有變化的檔案
+            self.reset()
+            files = self.find_files()
+
+        added = 0
+        for path in files:
+            added += self.read_file(path)
+        return added
+
+    def is_rotated(self, path):
+        """檢查檔案是否在上次讀取後被截斷或替換"""
+        if path not in self.offsets:
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        inode = self.inodes.get(path)
+        return stat.st_size < self.offsets[path] or (inode is not None and inode != stat.st_ino)
+
+    def read_file(self, path):
+        """從上次的位置繼續讀取單個檔案，只處理完整的行"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return 0
+
+        size = stat.st_size
+        offset = self.offsets.get(path, 0)
+        if size <= offset:
+            return 0
+
+        with open(path, 'rb') as f:
+            # 只映射 stat 時的長度，之後追加的內容留到下次讀取
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as data:
+                added, end = self.scan(data, offset, size)
+        if end is None:
+            return 0
+        self.offsets[path] = end
+        self.inodes[path] = stat.st_ino
+        self.dirty_files.add(path)
+        return added
+
+    def scan(self, data, start, stop):
+        """掃描 data[start:stop] 中的完整行，返回 (新增記錄數, 已讀取到的位置)
+
+        最後一行可能還沒寫完，只處理到最後一個換行符為止；沒有完整的行時
+        位置為 None。
+        """
+        end = data.rfind(b'\n', start, stop)
+        if end < 0:
+            return 0, None
+        added = 0
+        position = data.find(USAGE_MARKER, start, end)
+        while position >= 0:
+            line_start = data.rfind(b'\n', start, position) + 1 or start
+            line_end = data.find(b'\n', position, end + 1)
+            if self.add_line(data[line_start:line_end]):
+                added += 1
+            position = data.find(USAGE_MARKER, line_end + 1, end)
+        return added, end + 1
+
+    def add_line(self, line):
+        """解析一行 JSON 並加入統計，返回是否為新的用量記錄"""
+        try:
+            entry = DECODER.decode(line.decode('utf-8'))
+        except ValueError:
+            return False
+        return self.add_entry(entry)
+
+    def add_entry(self, entry):
+        """把解析後的一行加入統計，返回是否為新的用量記錄"""
+        if not isinstance(entry, dict):
+            return False
+        message = entry.get('message')
+        if not isinstance(message, dict):
+            return False
+        usage = message.get('usage')
+        if not isinstance(usage, dict):
+            return False
+
+        model = message.get('model')
+        if not model or model == '<synthetic>':
+            return False
+
+        timestamp = parse_timestamp(entry.get('timestamp'))
+        if timestamp is None:
+            return False
+
+        message_id = message.get('id')
+        request_id = entry.get('requestId')
+        if message_id and request_id:
+            key = f"{message_id}:{request_id}"
+            if key in self.seen:
+                return False
+            self.seen.add(key)
+            self.new_seen.append(key)
+
+        input_tokens = usage.get('input_tokens') or 0
+        output_tokens = usage.get('output_tokens') or 0
+        cache_create = usage.get('cache_creation_input_tokens') or 0
+        cache_read = usage.get('cache_read_input_tokens') or 0
+        cost = self.prices.cost(model, input_tokens, output_tokens, cache_create, cache_read)
+
+        self.add_usage(timestamp, model, input_tokens, output_tokens, cache_create, cache_read, cost)
+        return True
+
+    def add_usage(self, timestamp, model, input_tokens, output_tokens, cache_create, cache_read, cost):
+        """把一筆用量加入所屬的小時桶"""
+        hour = int(timestamp // HOUR) * HOUR
+        bucket = self.hourly.get(hour)
+        if bucket is None:
+            bucket = {'first': timestamp, 'last': timestamp, 'models': {}}
+            self.hourly[hour] = bucket
+        else:
+            bucket['first'] = min(bucket['first'], timestamp)
+            bucket['last'] = max(bucket['last'], timestamp)
+
+        stats = bucket['models'].get(model)
+        if stats is None:
+            stats = [0, 0, 0, 0, 0.0, 0]
+            bucket['models'][model] = stats
+        stats[IN] += input_tokens
+        stats[OUT] += output_tokens
+        stats[CACHE_CREATE] += cache_create
+        stats[CACHE_READ] += cache_read
+        stats[COST] += cost
+        stats[COUNT] += 1
+        self.record_count += 1
+        self.dirty_hours.add(hour)
+        self.touched_hours.add(hour)
+        self.burn_rate.add(timestamp, input_tokens + output_tokens + cache_create + cache_read, cost)
+
+    def get_blocks(self, now=None):
+        """把小時桶組合成 5 小時區塊 (與 ccusage blocks 相同規則)"""
+        now = now or time.time()
+        blocks = []
+        current = None
+        for hour in sorted(self.hourly):
+            bucket = self.hourly[hour]
+            if (current is None or hour >= current['start'] + BLOCK_DURATION
+                    or bucket['first'] - current['last'] > BLOCK_DURATION):
+                current = {
+                    'start': hour,
+                    'end': hour + BLOCK_DURATION,
+                    'first': bucket['first'],
+                    'last': bucket['last'],
+                    'tokens': 0,
+                    'cost': 0.0,
+                    'models': [],
+                }
+                blocks.append(current)
+            current['last'] = max(current['last'], bucket['last'])
+            for model, stats in bucket['models'].items():
+                current['tokens'] += stats[IN] + stats[OUT] + stats[CACHE_CREATE] + stats[CACHE_READ]
+                current['cost'] += stats[COST]
+                name = short_model_name(model)
+                if name not in current['models']:
+                    current['models'].append(name)
+
+        for block in blocks:
+            block['is_active'] = now - block['last'] < BLOCK_DURATION and now < block['end']
+        return blocks
+
+    def get_session_summary(self, now=None):
+        """返回最近一個區塊的摘要 (與 ccusage_data 欄位一致，block 為原始數值)，沒有數據時返回 None"""
+        blocks = self.get_blocks(now)
+        if not blocks:
+            return None
+
+        block = blocks[-1]
+        start = datetime.fromtimestamp(block['start'])
+        return {
+            'latest_session': start.strftime("%Y/%m/%d %H:%M:%S"),
+            'tokens': f"{block['tokens']:,}",
+            'cost': f"${block['cost']:.2f}",
+            'status': 'ACTIVE' if block['is_active'] else 'COMPLETED',
+            'model': ', '.join(block['models']) if block['models'] else '--',
+            'block': block,
+        }
+
+    def get_daily_costs(self):
+        """按本地日期統計每日費用，鍵為 MM-DD"""
+        daily = {}
+        for hour in sorted(self.hourly):
+            day = datetime.fromtimestamp(hour).strftime("%m-%d")
+            cost = sum(stats[COST] for stats in self.hourly[hour]['models'].values())
+            daily[day] = daily.get(day, 0.0) + cost
+        return daily
+
+    def recompute_costs(self, prices=None):
+        """用價格表一次重新計算全部小時桶的費用，返回重新計算的 (小時, 模型) 數
+
+        費用與 Token 數成線性關係，每個桶按累計的 Token 計算即可，不必重新
+        讀取記錄。prices 為新的價格表，None 時使用當前的價格表。
+        """
+        if prices is not None:
+            self.prices = prices
+        entries = [(model, stats) for bucket in self.hourly.values() for model, stats in bucket['models'].items()]
+        costs = self.prices.bulk_costs([model for model, _ in entries], [stats[:COST] for _, stats in entries])
+        for (_, stats), cost in zip(entries, costs):
+            stats[COST] = cost
+        self.dirty_hours.update(self.hourly)
+        self.touched_hours.update(self.hourly)
+        self.rebuild_burn_rate()
+        return len(entries)
+
+    def add_bucket_rate(self, bucket):
+        """把整個小時桶加入消耗速度，沒有逐筆記錄時按桶內均勻分佈近似"""
+        models = bucket['models'].values()
+        self.burn_rate.add_span(bucket['first'], bucket['last'],
+                           sum(stats[IN] + stats[OUT] + stats[CACHE_CREATE] + stats[CACHE_READ] for stats in models),
+                           sum(stats[COST] for stats in models))
+
+    def rebuild_burn_rate(self):
+        """從最近幾小時的小時桶重建消耗速度 (載入檢查點或重新計算費用後)"""
+        self.burn_rate.reset()
+        if not self.hourly:
+            return
+        since = max(self.hourly) - self.burn_rate.horizon
+        for hour, bucket in self.hourly.items():
+            if hour >= since:
+                self.add_bucket_rate(bucket)
+
+    def take_touched_hours(self):
+        """返回並清空自上次調用後變化的小時"""
+        touched, self.touched_hours = self.touched_hours, set()
+        return touched
+
+    def clear_dirty(self):
+        """檢查點保存後清除變更記錄"""
+        self.dirty_hours = set()
+        self.dirty_files = set()
+        self.new_seen = []
+        self.rebuilt = False
+
+    def partial(self):
+        """返回可以跨進程傳遞的讀取結果，供 merge() 合併"""
+        return {
+            'offsets': self.offsets,
+            'inodes': self.inodes,
+            'hourly': self.hourly,
+            'seen': list(self.seen),
+            'record_count': self.record_count
+        }
+
+    def merge(self, partial):
+        """合併另一個讀取器 (通常在其他進程中) 的部分結果"""
+        self.offsets.update(partial['offsets'])
+        self.inodes.update(partial['inodes'])
+        self.dirty_files.update(partial['offsets'])
+        for hour, other in partial['hourly'].items():
+            bucket = self.hourly.get(hour)
+            if bucket is None:
+                self.hourly[hour] = other
+            else:
+                bucket['first'] = min(bucket['first'], other['first'])
+                bucket['last'] = max(bucket['last'], other['last'])
+                for model, stats in other['models'].items():
+                    current = bucket['models'].get(model)
+                    if current is None:
+                        bucket['models'][model] = stats
+                    else:
+                        for index, value in enumerate(stats):
+                            current[index] += value
+            self.dirty_hours.add(hour)
+            self.touched_hours.add(hour)
+            self.add_bucket_rate(other)
+        new_keys = [key for key in partial['seen'] if key not in self.seen]
+        self.seen.update(new_keys)
+        self.new_seen.extend(new_keys)
+        self.record_count += partial['record_count']
+
+
+def scan_files(paths, prices=None):
+    """讀取一組檔案，返回部分結果 (在進程池的工作進程中運行)"""
+    reader = UsageReader([], prices)
+    for path in paths:
+        reader.read_file(path)
+    return reader.partial()
+
+
+def plan_shards(files, count):
+    """按專案目錄把檔案分成最多 count 組，各組大小盡量平均
+
+    同一段對話被恢復時會在同一個專案目錄中重複寫入相同的回覆，整個目錄
+    放在同一組，去重才能在工作進程內完成。
+    """
+    projects = {}
+    for path in files:
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            continue
+        group = projects.setdefault(os.path.dirname(path), [0, []])
+        group[0] += size
+        group[1].append(path)
+
+    shards = [[0, []] for _ in range(min(count, len(projects)))]
+    for size, paths in sorted(projects.values(), key=lambda group: group[0], reverse=True):
+        shard = min(shards, key=lambda item: item[0])
+        shard[0] += size
+        shard[1].extend(paths)
+    return [(size, paths) for size, paths in shards if paths]
+
+
+async def backfill_async(reader, workers=None, progress=None):
+    """用進程池完整讀取所有記錄並合併到 reader，返回新增的記錄數
+
+    只用於還沒有讀取進度的 reader (首次運行或清除檢查點後)；已有進度時
+    返回 0，新增內容交給正常的增量讀取。progress(已完成字節, 總字節) 在
+    每組完成後調用。記錄太少、只有一個進程或一個專案目錄時在線程中讀取。
+    讀取都在事件循環之外進行，reader 只在事件循環線程中合併和修改，
+    期間可以照常讀取已合併的部分。工作進程出錯時清空 reader 再拋出。
+    """
+    if reader.offsets:
+        return 0
+    workers = workers or os.cpu_count() or 1
+    loop = asyncio.get_running_loop()
+    # 每個進程分到幾組，讓進度更新更平滑，也減少大小不均的影響
+    shards = await loop.run_in_executor(None, lambda: plan_shards(reader.find_files(), workers * 4))
+    total = sum(size for size, _ in shards)
+    before = reader.record_count
+    if workers == 1 or len(shards) < 2 or total < PARALLEL_MIN_BYTES:
+        paths = [path for _, group in shards for path in group]
+        reader.merge(await loop.run_in_executor(None, scan_files, paths, reader.prices))
+        if progress:
+            progress(total, total)
+        return reader.record_count - before
+
+    pool = ProcessPoolExecutor(workers)
+
+    async def scan(size, paths):
+        return size, await loop.run_in_executor(pool, scan_files, paths, reader.prices)
+
+    done = 0
+    if progress:
+        progress(done, total)
+    try:
+        for next_shard in asyncio.as_completed([scan(size, paths) for size, paths in shards]):
+            size, partial = await next_shard
+            reader.merge(partial)
+            done += size
+            if progress:
+                progress(done, total)
+    except Exception:
+        reader.reset()
+        raise
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return reader.record_count - before
+
+
+def backfill(reader, workers=None, progress=None):
+    """backfill_async() 的同步版本，不能在運行中的事件循環裡調用
+
+    已有讀取進度 (例如從檢查點恢復) 時直接增量讀取。
+    """
+    if reader.offsets:
+        return reader.refresh()
+    return asyncio.run(backfill_async(reader, workers, progress))